@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+
+# Benchmark loading the UI and the logos from files and from the resource bundle
+# Usage: make resources && python3 bench/bench_assets.py [rows]   (needs a display, e.g. xvfb-run)
+#        python3 bench/bench_assets.py --no-display [rows]
+# Without a display (or without Gtk) only the reads are timed: the files for every row
+# against once per asset, and the bundle lookups when Gio and the bundle are available
+
+import sys
+import time
+import tracemalloc
+from os.path import join, abspath, dirname, exists
+
+benchDir = abspath(dirname(__file__))
+sys.path.insert(1, join(benchDir, '../usr/lib/ddm'))
+
+MEDIA_DIR = abspath(join(benchDir, '../usr/share/ddm'))
+RESOURCE_FILE = 'ddm.gresource'
+RESOURCE_PREFIX = '/org/solydxk/ddm'
+LOGOS = ['images/nvidia.png', 'images/ati.png', 'images/broadcom.png', 'images/pae.png']
+
+args = sys.argv[1:]
+noDisplay = '--no-display' in args
+args = [a for a in args if a != '--no-display']
+rows = int(args[0]) if args else 1000
+
+
+def measure(name, function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("{:<40} {:8.3f}s  peak {:8.1f} KiB".format(name, seconds, peak / 1024))
+
+
+def builder_from_file():
+    Gtk.Builder().add_from_file(join(MEDIA_DIR, 'ddm.glade'))
+
+
+def builder_from_resource():
+    assets = Assets()
+    assets.load()
+    assets.get_builder('ddm.glade')
+
+
+# Former row fill: decode (and scale) the logo for every row
+def pixbufs_per_row():
+    for i in range(rows):
+        GdkPixbuf.Pixbuf.new_from_file(join(MEDIA_DIR, LOGOS[i % len(LOGOS)])).scale_simple(
+            32, 32, GdkPixbuf.InterpType.BILINEAR)
+
+
+def pixbufs_cached():
+    assets = Assets()
+    for i in range(rows):
+        assets.get_pixbuf(LOGOS[i % len(LOGOS)], 32)
+
+
+def read_file(name):
+    with open(join(MEDIA_DIR, name), 'rb') as f:
+        return f.read()
+
+
+# Former row fill: read the logo for every row
+def files_per_row():
+    for i in range(rows):
+        read_file(LOGOS[i % len(LOGOS)])
+
+
+def files_cached():
+    cache = {}
+    for i in range(rows):
+        name = LOGOS[i % len(LOGOS)]
+        if name not in cache:
+            cache[name] = read_file(name)
+
+
+def resource_per_row():
+    resource = Gio.Resource.load(join(MEDIA_DIR, RESOURCE_FILE))
+    for i in range(rows):
+        resource.lookup_data(join(RESOURCE_PREFIX, LOGOS[i % len(LOGOS)]), Gio.ResourceLookupFlags.NONE)
+
+
+if noDisplay:
+    measure("ddm.glade read from file", lambda: read_file('ddm.glade'))
+    measure("{} logos read per row".format(rows), files_per_row)
+    measure("{} logos read once".format(rows), files_cached)
+    try:
+        from gi.repository import Gio
+    except ImportError:
+        Gio = None
+    if Gio is None or not exists(join(MEDIA_DIR, RESOURCE_FILE)):
+        print("Resource bundle not timed: Gio or ddm.gresource (make resources) not available")
+    else:
+        measure("{} logos looked up in the bundle".format(rows), resource_per_row)
+    sys.exit(0)
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GdkPixbuf
+from assets import Assets
+
+if not Gtk.init_check(sys.argv)[0]:
+    print("Cannot open a display: run with xvfb-run or use --no-display")
+    sys.exit(1)
+if not exists(join(MEDIA_DIR, RESOURCE_FILE)):
+    print("Resource bundle not found: run make resources")
+    sys.exit(1)
+
+measure("UI from ddm.glade", builder_from_file)
+measure("UI from ddm.gresource", builder_from_resource)
+measure("{} logos decoded per row".format(rows), pixbufs_per_row)
+measure("{} logos from the pixbuf cache".format(rows), pixbufs_cached)
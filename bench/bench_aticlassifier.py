@@ -0,0 +1,26 @@
+#! /usr/bin/env python3
+
+# Benchmark the ATI/AMD classifier on a corpus of lspci device names
+# Usage: python3 bench/bench_aticlassifier.py [corpus] [repeat]
+
+import sys
+import timeit
+from os.path import join, abspath, dirname
+
+benchDir = abspath(dirname(__file__))
+sys.path.insert(1, join(benchDir, '../usr/lib/ddm'))
+from aticlassifier import AtiClassifier
+
+corpus = sys.argv[1] if len(sys.argv) > 1 else join(benchDir, 'ati-names.txt')
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+with open(corpus) as f:
+    names = [line.strip() for line in f if line.strip() and line[:1] != '#']
+
+for debianVersion in (8, 9):
+    classifier = AtiClassifier(debianVersion)
+    seconds = timeit.timeit(lambda: classifier.classify_many(names), number=repeat)
+    counts = {}
+    for card in classifier.classify_many(names):
+        counts[card.status] = counts.get(card.status, 0) + 1
+    print("Debian {}: {} names x {}: {:.3f}s ({:.1f} us/name) {}".format(
+          debianVersion, len(names), repeat, seconds, seconds / (len(names) * repeat) * 1e6, counts))
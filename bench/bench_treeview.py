@@ -0,0 +1,116 @@
+#! /usr/bin/env python3
+
+# Benchmark TreeViewHandler.fillTreeview against the former eval based fill
+# Usage: python3 bench/bench_treeview.py [rows...]   (needs a display, e.g. xvfb-run)
+#        python3 bench/bench_treeview.py --no-display [rows...]
+# Without a display (or without Gtk) only the Python side is timed: building and
+# evaluating the code of each row against converting its values, on a list model
+
+import sys
+import time
+from os.path import join, abspath, dirname
+
+benchDir = abspath(dirname(__file__))
+sys.path.insert(1, join(benchDir, '../usr/lib/ddm'))
+
+COLUMN_TYPES = ['bool', 'GdkPixbuf.Pixbuf', 'str']
+
+
+def make_rows(count):
+    rows = [['Install', '', 'Device']]
+    for i in range(count):
+        rows.append([i % 2 == 0, None, 'Device {} "with quotes"\nand a second line'.format(i)])
+    return rows
+
+
+# The former fill: one eval per row on a model that is attached to the view
+def eval_fill(treeview, rows):
+    liststore = eval('Gtk.ListStore(bool, GdkPixbuf.Pixbuf, str, int, int)')
+    treeview.set_model(liststore)
+    for row in rows[1:]:
+        code = 'liststore.append([%s, None, "%s", 400, 12000])' % (
+               row[0], row[2].replace('\n', ' ').replace('"', '\\"'))
+        eval(code)
+
+
+def typed_fill(treeview, rows):
+    TreeViewHandler(treeview).fillTreeview(rows, COLUMN_TYPES, firstItemIsColName=True, fontSize=12000)
+
+
+# Stand-in for Gtk.ListStore: keeps the rows in a list
+class ListModel(list):
+
+    def insert_with_valuesv(self, position, columns, values):
+        self.append(values)
+
+
+# Python side of the former fill: the code of each row as fillTreeview built it
+def eval_rows(rows):
+    liststore = ListModel()
+    for row in rows[1:]:
+        code = 'liststore.append(['
+        for j, value in enumerate(row):
+            val = str(value).strip()
+            if COLUMN_TYPES[j] == 'str':
+                val = '"' + val.replace('\n', ' ').replace('\r', '').replace('"', '\\"') + '"'
+            elif COLUMN_TYPES[j] == 'GdkPixbuf.Pixbuf':
+                val = None
+            code += '%s, ' % val
+        code += '%s, %s])' % (400, 12000)
+        eval(code)
+    return liststore
+
+
+# Python side of the typed fill: the conversions of get_column_value for these columns
+def typed_rows(rows):
+    liststore = ListModel()
+    columns = list(range(len(COLUMN_TYPES) + 2))
+    for row in rows[1:]:
+        values = [bool(row[0]), row[1], str(row[2]).strip().replace('\n', ' ').replace('\r', '')]
+        liststore.insert_with_valuesv(-1, columns, values + [400, 12000])
+    return liststore
+
+
+def bench_without_display(counts):
+    for count in counts:
+        rows = make_rows(count)
+        results = {}
+        for name, fill in (('eval', eval_rows), ('typed', typed_rows)):
+            start = time.perf_counter()
+            results[name] = fill(rows)
+            seconds = time.perf_counter() - start
+            print("{:>7} rows {:>5}: {:8.3f}s ({:.1f} us/row)".format(count, name, seconds, seconds / count * 1e6))
+        assert results['eval'] == results['typed']
+
+
+args = sys.argv[1:]
+noDisplay = '--no-display' in args
+counts = [int(c) for c in args if c != '--no-display'] or [10, 1000, 100000]
+if noDisplay:
+    bench_without_display(counts)
+    sys.exit(0)
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GdkPixbuf
+from treeview import TreeViewHandler
+
+if not Gtk.init_check(sys.argv)[0]:
+    print("Cannot open a display: run with xvfb-run or use --no-display")
+    sys.exit(1)
+
+window = Gtk.Window()
+treeview = Gtk.TreeView()
+window.add(treeview)
+window.show_all()
+for count in counts:
+    rows = make_rows(count)
+    for name, fill in (('eval', eval_fill), ('typed', typed_fill)):
+        treeview.set_model(None)
+        start = time.perf_counter()
+        fill(treeview, rows)
+        # Let the view handle the new model
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+        seconds = time.perf_counter() - start
+        print("{:>7} rows {:>5}: {:8.3f}s ({:.1f} us/row)".format(count, name, seconds, seconds / count * 1e6))
@@ -0,0 +1,5 @@
+import sys
+from os.path import join, abspath, dirname
+
+# The modules of DDM import each other by name, as in /usr/lib/ddm
+sys.path.insert(1, join(abspath(dirname(__file__)), '../usr/lib/ddm'))
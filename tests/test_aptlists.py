@@ -0,0 +1,170 @@
+import os
+import gzip
+import lzma
+import shutil
+import subprocess
+import pytest
+import aptlists
+from aptlists import AptListsIndex, compare_versions, get_list_origin, parse_deb822_sources, \
+                     parse_sources_list, get_backports_suites
+
+# (lower, higher) pairs in dpkg order
+ORDERED = [
+    ('1.0~rc1', '1.0'),
+    ('1.0~~', '1.0~'),
+    ('1.0~', '1.0'),
+    ('1.0', '1.0a'),
+    ('1.0', '1.0+b1'),
+    ('1.0', '1.0-1'),
+    ('1.0-1', '1.0-1.1'),
+    ('1.0-1', '1.0-2'),
+    ('2.4', '2.30'),
+    ('9', '10'),
+    ('2.0', '1:0.1'),
+    ('1:2.0', '2:0.1'),
+    ('375.82-1~deb9u1', '375.82-1'),
+    ('375.82-1~deb9u1', '375.82-1+deb10u1'),
+    ('390.87-8~bpo9+1', '390.87-8'),
+    ('1.0-2-3', '1.0-2-4'),
+    ('1.0a', '1.0b'),
+    # Letters sort before the other characters
+    ('1.0a', '1.0+'),
+]
+
+
+@pytest.mark.parametrize('lower, higher', ORDERED)
+def test_compare_versions(lower, higher):
+    assert compare_versions(lower, higher) < 0
+    assert compare_versions(higher, lower) > 0
+    assert compare_versions(lower, lower) == 0
+
+
+def test_equal_versions():
+    assert compare_versions('0:1.0', '1.0') == 0
+    assert compare_versions('1.0-0', '1.0-0') == 0
+    assert compare_versions('1.00', '1.0') == 0
+
+
+@pytest.mark.skipif(shutil.which('dpkg') is None, reason='dpkg is not installed')
+@pytest.mark.parametrize('lower, higher', ORDERED)
+def test_compare_versions_like_dpkg(lower, higher):
+    assert subprocess.call(['dpkg', '--compare-versions', lower, 'lt', higher]) == 0
+
+
+PACKAGES_MAIN = b"""Package: nvidia-driver
+Version: 375.82-1~deb9u1
+Installed-Size: 100
+Size: 1234
+
+Package: broadcom-sta-dkms
+Version: 6.30.223.271-6
+Size: 555
+"""
+
+PACKAGES_BACKPORTS = b"""Package: nvidia-driver
+Version: 390.87-8~bpo9+1
+Size: 2345
+"""
+
+PACKAGES_SECURITY = b"""Package: nvidia-driver
+Version: 375.82-1~deb9u2
+Size: 1240
+"""
+
+
+def make_lists(listsDir):
+    listsDir.mkdir()
+    (listsDir / 'deb.debian.org_debian_dists_stretch_InRelease').write_text('')
+    (listsDir / 'deb.debian.org_debian_dists_stretch-backports_InRelease').write_text('')
+    (listsDir / 'security.debian.org_dists_stretch_updates_InRelease').write_text('')
+    (listsDir / 'deb.debian.org_debian_dists_stretch_non-free_binary-amd64_Packages').write_bytes(PACKAGES_MAIN)
+    with gzip.open(str(listsDir / 'deb.debian.org_debian_dists_stretch-backports_non-free_binary-amd64_Packages.gz'), 'wb') as f:
+        f.write(PACKAGES_BACKPORTS)
+    with lzma.open(str(listsDir / 'security.debian.org_dists_stretch_updates_non-free_binary-amd64_Packages.xz'), 'wb') as f:
+        f.write(PACKAGES_SECURITY)
+    # Not a package list
+    (listsDir / 'deb.debian.org_debian_dists_stretch_non-free_i18n_Translation-en').write_text('')
+
+
+def test_list_origin(tmp_path):
+    make_lists(tmp_path / 'lists')
+    assert get_list_origin(str(tmp_path / 'lists/security.debian.org_dists_stretch_updates_non-free_binary-amd64_Packages.xz')) \
+        == ('stretch/updates', 'non-free')
+    assert get_list_origin(str(tmp_path / 'lists/deb.debian.org_debian_dists_stretch-backports_non-free_binary-amd64_Packages.gz')) \
+        == ('stretch-backports', 'non-free')
+    assert get_list_origin(str(tmp_path / 'lists/not_a_list')) == ('', '')
+
+
+def test_index(tmp_path):
+    make_lists(tmp_path / 'lists')
+    index = AptListsIndex(str(tmp_path / 'lists'), str(tmp_path / 'cache/aptlists.pickle'))
+    assert sorted(index.get_versions('nvidia-driver')) == [
+        ('375.82-1~deb9u1', 'stretch', 'non-free', 1234),
+        ('375.82-1~deb9u2', 'stretch/updates', 'non-free', 1240),
+        ('390.87-8~bpo9+1', 'stretch-backports', 'non-free', 2345)]
+    assert index.get_candidate('nvidia-driver', backports=['stretch-backports']) == '375.82-1~deb9u2'
+    assert index.get_candidate('nvidia-driver', backports=[]) == '390.87-8~bpo9+1'
+    assert index.get_candidate('not-a-package', backports=[]) == ''
+    assert index.is_available('nvidia-driver', 'stretch-backports')
+    assert not index.is_available('broadcom-sta-dkms', 'stretch-backports')
+    assert index.errors == []
+
+
+def test_persisted_index_and_changed_lists(tmp_path):
+    make_lists(tmp_path / 'lists')
+    indexPath = str(tmp_path / 'cache/aptlists.pickle')
+    AptListsIndex(str(tmp_path / 'lists'), indexPath).refresh()
+    assert os.path.exists(indexPath)
+
+    # A new index reuses the persisted lists that did not change
+    mainList = tmp_path / 'lists/deb.debian.org_debian_dists_stretch_non-free_binary-amd64_Packages'
+    index = AptListsIndex(str(tmp_path / 'lists'), indexPath)
+    assert index.get_highest('broadcom-sta-dkms') == '6.30.223.271-6'
+
+    mainList.write_bytes(PACKAGES_MAIN.replace(b'6.30.223.271-6', b'6.30.223.271-10'))
+    assert index.get_highest('broadcom-sta-dkms') == '6.30.223.271-10'
+
+
+def test_damaged_persisted_index(tmp_path):
+    make_lists(tmp_path / 'lists')
+    (tmp_path / 'cache').mkdir()
+    (tmp_path / 'cache/aptlists.pickle').write_bytes(b'not a pickle')
+    index = AptListsIndex(str(tmp_path / 'lists'), str(tmp_path / 'cache/aptlists.pickle'))
+    assert index.get_highest('broadcom-sta-dkms') == '6.30.223.271-6'
+
+
+def test_backports_suites_from_sources(tmp_path):
+    sourcesList = tmp_path / 'sources.list'
+    sourcesList.write_text("deb http://deb.debian.org/debian stretch main\n"
+                           "deb [arch=amd64] http://deb.debian.org/debian stretch-backports main # comment\n"
+                           "# deb http://deb.debian.org/debian buster-backports main\n")
+    deb822 = tmp_path / 'extra.sources'
+    deb822.write_text("Types: deb\nURIs: http://deb.debian.org/debian\nSuites: buster-backports\nComponents: main\n\n"
+                      "Types: deb\nURIs: http://deb.debian.org/debian\nSuites: bullseye-backports\nEnabled: no\n")
+    sources = parse_sources_list(str(sourcesList)) + parse_deb822_sources(str(deb822))
+    assert get_backports_suites(sources) == ['stretch-backports', 'buster-backports']
+
+
+def test_index_reads_the_sources_once(tmp_path, monkeypatch):
+    make_lists(tmp_path / 'lists')
+    sourcesList = tmp_path / 'sources.list'
+    sourcesList.write_text("deb http://deb.debian.org/debian stretch main non-free\n")
+    index = AptListsIndex(str(tmp_path / 'lists'), str(tmp_path / 'cache/aptlists.pickle'),
+                          str(sourcesList), [str(tmp_path / 'sources.list.d/*.list')])
+    reads = []
+    realGetSources = aptlists.get_sources
+    monkeypatch.setattr(aptlists, 'get_sources', lambda *args: reads.append(args) or realGetSources(*args))
+
+    # Without backports in the sources the backports version is the candidate
+    assert index.get_candidate('nvidia-driver') == '390.87-8~bpo9+1'
+    assert index.get_candidate('broadcom-sta-dkms') == '6.30.223.271-6'
+    assert len(reads) == 1
+
+    # A new sources file is read once
+    (tmp_path / 'sources.list.d').mkdir()
+    (tmp_path / 'sources.list.d/backports.list').write_text(
+        "deb http://deb.debian.org/debian stretch-backports main non-free\n")
+    assert index.get_backports_suites() == ['stretch-backports']
+    assert index.get_candidate('nvidia-driver') == '375.82-1~deb9u2'
+    assert index.has_newer('nvidia-driver', 'stretch-backports')
+    assert len(reads) == 2
@@ -0,0 +1,73 @@
+from os.path import join, abspath, dirname
+import pytest
+from aticlassifier import AtiClassifier, PROPRIETARY, RADEON, UNSUPPORTED
+
+CORPUS = join(abspath(dirname(__file__)), '../bench/ati-names.txt')
+
+# Card part of the name: (status on Jessie (8), status on Stretch (9))
+EXPECTED = {
+    'Radeon R9 285': (PROPRIETARY, PROPRIETARY),
+    'FirePro W5100': (PROPRIETARY, PROPRIETARY),
+    'FirePro W4100': (PROPRIETARY, PROPRIETARY),
+    'FireGL V5700': (PROPRIETARY, PROPRIETARY),
+    'Radeon 3000': (RADEON, RADEON),
+    'Radeon HD 4350': (RADEON, RADEON),
+    'Radeon HD 2600 PRO': (RADEON, RADEON),
+    'Radeon X300': (RADEON, RADEON),
+    # Dropped by AMD in Stretch (codename in the device name)
+    'Radeon HD 5870': (PROPRIETARY, RADEON),
+    'Radeon HD 6970': (PROPRIETARY, RADEON),
+    'Radeon HD 7660D': (PROPRIETARY, RADEON),
+    'Radeon HD 7970': (PROPRIETARY, PROPRIETARY),
+    'Radeon HD 6310': (PROPRIETARY, PROPRIETARY),
+    'Radeon R9 290X': (PROPRIETARY, PROPRIETARY),
+    'Radeon R7 Graphics': (PROPRIETARY, PROPRIETARY),
+}
+
+
+def read_corpus():
+    with open(CORPUS) as f:
+        return [line.strip() for line in f if line.strip() and line[:1] != '#']
+
+
+@pytest.mark.parametrize('debianVersion, column', [(8, 0), (9, 1)])
+def test_corpus_statuses(debianVersion, column):
+    cards = dict((c.card.strip(), c) for c in AtiClassifier(debianVersion).classify_many(read_corpus()))
+    for card, statuses in EXPECTED.items():
+        assert cards[card].status == statuses[column], (card, cards[card].rule)
+
+
+def test_every_radeon_or_fire_name_gets_a_driver():
+    for debianVersion in (8, 9):
+        for c in AtiClassifier(debianVersion).classify_many(read_corpus()):
+            if c.card:
+                assert c.status in (PROPRIETARY, RADEON)
+                assert c.driver and c.module
+            else:
+                assert c.status == UNSUPPORTED and c.driver == ''
+
+
+def test_drivers_by_debian_version():
+    name = 'Advanced Micro Devices, Inc. [AMD/ATI] Tonga PRO [Radeon R9 285]'
+    assert AtiClassifier(8).classify(name).driver == 'fglrx-driver'
+    assert AtiClassifier(9).classify(name).driver == 'xserver-xorg-video-amdgpu'
+    radeon = AtiClassifier(9).classify('Advanced Micro Devices, Inc. [AMD/ATI] RS780L [Radeon 3000]')
+    assert (radeon.driver, radeon.module) == ('xserver-xorg-video-radeon', 'radeon')
+
+
+def test_fire_cards_ignore_case():
+    card = AtiClassifier(9).classify('Advanced Micro Devices, Inc. [AMD/ATI] Tahiti PRO GL [FirePro Series]')
+    assert card.status == PROPRIETARY
+    assert card.is_fire()
+
+
+def test_no_card_in_name():
+    card = AtiClassifier(9).classify('Advanced Micro Devices, Inc. [AMD/ATI] Rage XL PCI')
+    assert card.status == UNSUPPORTED
+    assert card.card == ''
+
+
+def test_custom_rules_first_match_decides():
+    rules = [('Everything', 'default', None, RADEON),
+             ('Never reached', 'pattern', r'.', PROPRIETARY)]
+    assert AtiClassifier(9, rules=rules).classify('[Radeon R9 285]').rule == 'Everything'
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import logging
+import command
+import utils
+from command import run, run_many, LatencyHistogram
+
+
+def test_output_and_exit_code():
+    result = run(['sh', '-c', 'echo out; echo err >&2; exit 3'])
+    assert (result.returncode, result.stdout, result.stderr) == (3, 'out\n', 'err\n')
+    assert not result.ok
+    assert run(['true']).ok
+
+
+def test_environment_and_input():
+    result = run(['sh', '-c', 'echo "$DDM_TEST"; cat'], env={'DDM_TEST': 'value'}, input='from stdin\n')
+    assert result.lines() == ['value', 'from stdin']
+
+
+def test_command_not_found():
+    result = run(['/nonexistent/ddm-command'])
+    assert result.returncode == 127
+    assert not result.ok
+
+
+def test_run_many_keeps_the_order():
+    start = time.time()
+    results = run_many([['sh', '-c', 'sleep 0.3; echo first'], ['sh', '-c', 'echo second']])
+    assert [r.stdout for r in results] == ['first\n', 'second\n']
+    # Concurrent, not one after the other
+    assert time.time() - start < 0.6
+
+
+def is_running(pid):
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            return 'zombie' not in f.read()
+    except (IOError, OSError):
+        return False
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    pidFile = tmp_path / 'pid'
+    result = run(['sh', '-c', 'sleep 60 & echo $! > {}; wait'.format(pidFile)], timeout=0.5)
+    assert result.timedOut and not result.ok
+    assert result.seconds < 5
+    pid = int(pidFile.read_text())
+    # The child of the command was killed as well
+    for i in range(50):
+        if not is_running(pid):
+            break
+        time.sleep(0.1)
+    assert not is_running(pid)
+
+
+def test_getoutput_keeps_the_output_of_a_failed_command(caplog):
+    with caplog.at_level(logging.WARNING):
+        assert utils.getoutput(['sh', '-c', 'echo nvidia-driver; exit 1']) == ['nvidia-driver']
+    assert 'exit code 1' in caplog.text
+    assert utils.getoutput(['sh', '-c', 'exit 2']) == []
+    assert utils.getoutput('/nonexistent/ddm-command') == []
+    assert utils.getoutput('echo "one two" three') == ['one two three']
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram([0.1, 1])
+    for seconds in (0.05, 0.1, 0.5, 2):
+        histogram.add(seconds)
+    histogram.add(30, timedOut=True)
+    stats = histogram.get_stats()
+    assert stats['buckets'] == [('<=0.1s', 2), ('<=1s', 1), ('>1s', 2)]
+    assert (stats['count'], stats['max'], stats['timeouts']) == (5, 30, 1)
@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+from debcache import DebCache, DebFile, parse_print_uris, verify, get_download_bytes
+
+
+def make_deb(directory, filename, data):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / filename).write_bytes(data)
+    return DebFile('http://deb.debian.org/debian/pool/' + filename, filename, len(data),
+                   'SHA256', hashlib.sha256(data).hexdigest())
+
+
+def make_cache(tmp_path, localDirs=()):
+    (tmp_path / 'archives').mkdir(exist_ok=True)
+    return DebCache(str(tmp_path / 'cache'), 10, [str(d) for d in localDirs], str(tmp_path / 'archives'))
+
+
+def test_parse_print_uris():
+    lines = ["'http://deb.debian.org/debian/pool/non-free/n/nvidia/nvidia-driver_375.82-1~deb9u1_amd64.deb' "
+             "nvidia-driver_375.82-1~deb9u1_amd64.deb 1418638 SHA256:4F2AB0\n",
+             "'file:/lib/live/mount/medium/pool/b/broadcom-sta-dkms_6.30_all.deb' broadcom-sta-dkms_6.30_all.deb 555 MD5Sum:ab12\n",
+             "'http://deb.debian.org/debian/pool/main/l/libfoo/libfoo_1_amd64.deb' libfoo_1_amd64.deb 10\n",
+             "Reading package lists...\n",
+             "'http://deb.debian.org/debian/dists/stretch/InRelease' stretch_InRelease 0\n",
+             "\n"]
+    debs = parse_print_uris(lines)
+    assert [(d.filename, d.size, d.hashType, d.hashValue) for d in debs] == [
+        ('nvidia-driver_375.82-1~deb9u1_amd64.deb', 1418638, 'SHA256', '4f2ab0'),
+        ('broadcom-sta-dkms_6.30_all.deb', 555, 'MD5Sum', 'ab12'),
+        ('libfoo_1_amd64.deb', 10, '', '')]
+    assert debs[0].uri.startswith('http://deb.debian.org/')
+
+
+def test_verify(tmp_path):
+    deb = make_deb(tmp_path, 'a_1_all.deb', b'package a')
+    path = str(tmp_path / 'a_1_all.deb')
+    assert verify(path, deb)
+    assert not verify(str(tmp_path / 'missing.deb'), deb)
+    (tmp_path / 'a_1_all.deb').write_bytes(b'package b')
+    # Same size, other checksum
+    assert not verify(path, deb)
+    # Without a checksum only the size is checked
+    assert verify(path, DebFile('', 'a_1_all.deb', 9))
+    assert not verify(path, DebFile('', 'a_1_all.deb', 0))
+
+
+def test_prime_sources(tmp_path):
+    inArchives = make_deb(tmp_path / 'archives', 'a_1_all.deb', b'in the archives')
+    inCache = make_deb(tmp_path / 'cache', 'b_1_all.deb', b'in the cache')
+    local = make_deb(tmp_path / 'medium/pool/main/c', 'c_1_all.deb', b'on the medium')
+    damaged = make_deb(tmp_path / 'medium/pool/main/d', 'd_1_all.deb', b'damaged')
+    (tmp_path / 'medium/pool/main/d/d_1_all.deb').write_bytes(b'DAMAGED')
+    missing = DebFile('', 'e_1_all.deb', 5, 'SHA256', '00')
+
+    cache = make_cache(tmp_path, [tmp_path / 'medium'])
+    sources = cache.prime([inArchives, inCache, local, damaged, missing])
+    assert sources == {'a_1_all.deb': 'archives', 'b_1_all.deb': 'cache', 'c_1_all.deb': 'local',
+                       'd_1_all.deb': 'network', 'e_1_all.deb': 'network'}
+    assert (tmp_path / 'archives/b_1_all.deb').read_bytes() == b'in the cache'
+    assert (tmp_path / 'archives/c_1_all.deb').read_bytes() == b'on the medium'
+    assert not (tmp_path / 'archives/d_1_all.deb').exists()
+    # No partial copies are left behind
+    assert sorted(os.listdir(str(tmp_path / 'archives'))) == ['a_1_all.deb', 'b_1_all.deb', 'c_1_all.deb']
+    # Only the packages that were not found are downloaded
+    assert get_download_bytes([inArchives, inCache, local, damaged, missing], sources) == damaged.size + 5
+
+
+def test_store_and_index(tmp_path):
+    downloaded = make_deb(tmp_path / 'archives', 'a_1_all.deb', b'downloaded')
+    damaged = make_deb(tmp_path / 'archives', 'b_1_all.deb', b'damaged')
+    (tmp_path / 'archives/b_1_all.deb').write_bytes(b'DAMAGED')
+    cache = make_cache(tmp_path)
+    assert cache.store([downloaded, damaged]) == ['a_1_all.deb']
+    assert (tmp_path / 'cache/a_1_all.deb').read_bytes() == b'downloaded'
+    with open(str(tmp_path / 'cache/index.json')) as f:
+        assert list(json.load(f)) == ['a_1_all.deb']
+    # Stored once
+    assert cache.store([downloaded]) == []
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path)
+    (tmp_path / 'cache').mkdir()
+    index = {}
+    for used, name in enumerate(['old_1_all.deb', 'new_1_all.deb', 'newer_1_all.deb']):
+        (tmp_path / 'cache' / name).write_bytes(b'x' * 100)
+        index[name] = {'size': 100, 'used': used}
+    index['removed_1_all.deb'] = {'size': 100, 'used': 10}
+    cache.maxSize = 250
+    cache.evict(index)
+    assert sorted(index) == ['new_1_all.deb', 'newer_1_all.deb']
+    assert sorted(os.listdir(str(tmp_path / 'cache'))) == ['new_1_all.deb', 'newer_1_all.deb']
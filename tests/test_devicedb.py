@@ -0,0 +1,53 @@
+import pytest
+from devicedb import DeviceDatabase, DEVICE_DB, DB_VERSION
+
+
+def make_db(tmp_path, text):
+    path = tmp_path / 'devices.db'
+    path.write_text(text)
+    return DeviceDatabase(str(path))
+
+
+def test_shipped_database_is_valid():
+    db = DeviceDatabase(DEVICE_DB)
+    assert db.errors == []
+    assert db.version == DB_VERSION
+    assert db.lookup('14e4', '4311').family == 'b43'
+
+
+def test_lookup(tmp_path):
+    db = make_db(tmp_path, "# comment\nversion 1\n\n14E4:4311\tb43\tsupported\n14e4:4360 wldebian unsupported\n")
+    assert db.errors == []
+    entry = db.lookup('14e4', '4311')
+    assert (entry.vendorId, entry.deviceId, entry.family) == ('14e4', '4311', 'b43')
+    assert entry.is_supported()
+    # Ids are matched in any case
+    assert not db.lookup('14E4', '4360').is_supported()
+    assert db.lookup('14e4', '0000') is None
+    assert db.get_device_ids('wldebian') == ['4360']
+    assert db.get_device_ids('b43', '8086') == []
+
+
+@pytest.mark.parametrize('text, error', [
+    ("14e4:4311 b43 supported\n", "missing version line"),
+    ("version 2\n", "1: unsupported version: version 2"),
+    ("version one\n", "1: unsupported version: version one"),
+])
+def test_version_check(tmp_path, text, error):
+    assert error in make_db(tmp_path, text).errors
+
+
+@pytest.mark.parametrize('line, error', [
+    ("14e4:4311 b43", "expected 'vendor:device family status': 14e4:4311 b43"),
+    ("14e4:431 b43 supported", "invalid device id: 14e4:431"),
+    ("14e4-4311 b43 supported", "invalid device id: 14e4-4311"),
+    ("14e4:431g b43 supported", "invalid device id: 14e4:431g"),
+    ("14e4:4311 nvidia supported", "unknown driver family: nvidia"),
+    ("14e4:4311 b43 maybe", "unknown status: maybe"),
+    ("14E4:4312 b43 supported", "duplicate device id: 14e4:4312"),
+])
+def test_validation_errors(tmp_path, line, error):
+    db = make_db(tmp_path, "version 1\n14e4:4312 b43 supported\n" + line + "\n")
+    assert db.errors == ["3: " + error]
+    # The valid entries are kept
+    assert list(db.entries) == ['14e4:4312']
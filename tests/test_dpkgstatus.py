@@ -0,0 +1,108 @@
+import os
+from dpkgstatus import DpkgStatus, parse_status_file
+
+STATUS = """Package: nvidia-driver
+Status: install ok installed
+Priority: optional
+Architecture: amd64
+Version: 375.82-1~deb9u1
+Description: NVIDIA metapackage
+ This metapackage depends on the NVIDIA binary driver
+ Version: not a field
+
+Package: libgl1-nvidia-glx
+Status: install ok installed
+Architecture: i386
+Version: 375.82-1~deb9u1
+
+Package: libgl1-nvidia-glx
+Status: install ok installed
+Architecture: amd64
+Version: 375.82-1~deb9u1
+
+Package: linux-image-686-pae
+Status: deinstall ok config-files
+Architecture: i386
+Version: 4.9+80
+
+Package: broadcom-sta-dkms
+Status: install ok unpacked
+Architecture: all
+Version: 6.30.223.271-6
+"""
+
+
+def make_dpkg_dir(tmp_path, status=STATUS, updates=None):
+    (tmp_path / 'status').write_text(status)
+    (tmp_path / 'arch').write_text('amd64\n')
+    (tmp_path / 'updates').mkdir()
+    for name, text in (updates or {}).items():
+        (tmp_path / 'updates' / name).write_text(text)
+    return DpkgStatus(str(tmp_path))
+
+
+def test_parse_status_file(tmp_path):
+    path = tmp_path / 'status'
+    path.write_text(STATUS)
+    packages = parse_status_file(str(path))
+    assert [(p.name, p.arch) for p in packages] == [
+        ('nvidia-driver', 'amd64'), ('libgl1-nvidia-glx', 'i386'), ('libgl1-nvidia-glx', 'amd64'),
+        ('linux-image-686-pae', 'i386'), ('broadcom-sta-dkms', 'all')]
+    # Continuation lines are not fields
+    assert packages[0].version == '375.82-1~deb9u1'
+
+
+def test_parse_empty_file(tmp_path):
+    path = tmp_path / 'status'
+    path.write_text('')
+    assert parse_status_file(str(path)) == []
+
+
+def test_installed_versions(tmp_path):
+    dpkg = make_dpkg_dir(tmp_path)
+    assert dpkg.get_version('nvidia-driver') == '375.82-1~deb9u1'
+    # Config files only: not installed
+    assert dpkg.get_version('linux-image-686-pae') == ''
+    # Unpacked counts as installed
+    assert dpkg.is_installed('broadcom-sta-dkms')
+    assert dpkg.get_version('not-a-package') == ''
+    assert dpkg.get('libgl1-nvidia-glx').arch == 'amd64'
+    assert dpkg.get('libgl1-nvidia-glx:i386').arch == 'i386'
+
+
+def test_match_patterns(tmp_path):
+    dpkg = make_dpkg_dir(tmp_path)
+    names = [dpkg.get_package_name(p) for p in dpkg.match(['*nvidia*'])]
+    assert names == ['libgl1-nvidia-glx', 'libgl1-nvidia-glx:i386', 'nvidia-driver']
+    names = [dpkg.get_package_name(p) for p in dpkg.match(['*nvidia*'], exclude=['*:i386'])]
+    assert names == ['libgl1-nvidia-glx', 'nvidia-driver']
+    assert dpkg.match(['*-pae']) == []
+    assert len(dpkg.match(['*-pae'], installed=False)) == 1
+
+
+def test_updates_override_status_in_numeric_order(tmp_path):
+    updates = {
+        '0002': "Package: nvidia-driver\nStatus: install ok installed\nArchitecture: amd64\nVersion: 390.87-8\n",
+        '0010': "Package: nvidia-driver\nStatus: deinstall ok config-files\nArchitecture: amd64\nVersion: 390.87-8\n",
+        '0001': "Package: linux-image-686-pae\nStatus: install ok installed\nArchitecture: i386\nVersion: 4.9+80\n",
+        'tmp.i': "Package: ignored\nStatus: install ok installed\nArchitecture: amd64\nVersion: 1\n",
+    }
+    dpkg = make_dpkg_dir(tmp_path, updates=updates)
+    # 0010 comes after 0002: nvidia-driver is removed
+    assert dpkg.get_version('nvidia-driver') == ''
+    assert dpkg.get_version('linux-image-686-pae') == '4.9+80'
+    assert dpkg.get('ignored') is None
+
+
+def test_reload_when_a_file_changes(tmp_path):
+    dpkg = make_dpkg_dir(tmp_path)
+    assert dpkg.get_version('nvidia-driver') == '375.82-1~deb9u1'
+    (tmp_path / 'updates' / '0000').write_text(
+        "Package: nvidia-driver\nStatus: install ok installed\nArchitecture: amd64\nVersion: 390.87-8\n")
+    assert dpkg.get_version('nvidia-driver') == '390.87-8'
+
+
+def test_status_old_when_status_is_missing(tmp_path):
+    dpkg = make_dpkg_dir(tmp_path)
+    os.rename(str(tmp_path / 'status'), str(tmp_path / 'status-old'))
+    assert dpkg.get_version('nvidia-driver') == '375.82-1~deb9u1'
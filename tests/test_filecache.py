@@ -0,0 +1,105 @@
+import os
+import utils
+from utils import FileCache, cached, format_cache_stats
+
+
+class Calls(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, value):
+        self.count += 1
+        return value * 2
+
+
+def test_hit():
+    cache = FileCache('test')
+    calls = Calls()
+    assert cache.get(1, calls, 1) == 2
+    assert cache.get(1, calls, 1) == 2
+    assert calls.count == 1
+    assert cache.get_stats() == {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+
+
+def touch(path, text, mtimeNs=None):
+    path.write_text(text)
+    if mtimeNs is not None:
+        os.utime(str(path), ns=(mtimeNs, mtimeNs))
+
+
+def test_invalidated_by_the_files(tmp_path):
+    path = tmp_path / 'status'
+    touch(path, 'one', 10 ** 18)
+    cache = FileCache('test', files=[str(path)])
+    calls = Calls()
+    cache.get('key', calls, 1)
+    cache.get('key', calls, 1)
+    assert calls.count == 1
+    # Changed mtime
+    touch(path, 'one', 10 ** 18 + 1)
+    cache.get('key', calls, 1)
+    assert calls.count == 2
+    # Changed size, same mtime
+    touch(path, 'one two', 10 ** 18 + 1)
+    cache.get('key', calls, 1)
+    assert calls.count == 3
+    # Removed
+    path.unlink()
+    cache.get('key', calls, 1)
+    cache.get('key', calls, 1)
+    assert calls.count == 4
+
+
+def test_invalidated_by_new_files(tmp_path):
+    touch(tmp_path / 'Xorg.0.log', 'log')
+    cache = FileCache('test', files=[str(tmp_path / 'Xorg.*.log')])
+    calls = Calls()
+    cache.get('key', calls, 1)
+    cache.get('key', calls, 1)
+    touch(tmp_path / 'Xorg.1.log', 'log')
+    cache.get('key', calls, 1)
+    assert calls.count == 2
+
+
+def test_time_to_live(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, 'time', lambda: now[0])
+    cache = FileCache('test', ttl=10)
+    calls = Calls()
+    cache.get('key', calls, 1)
+    now[0] += 9
+    cache.get('key', calls, 1)
+    assert calls.count == 1
+    now[0] += 2
+    cache.get('key', calls, 1)
+    assert calls.count == 2
+
+
+def test_least_recently_used_is_evicted():
+    cache = FileCache('test', maxSize=2)
+    calls = Calls()
+    cache.get('a', calls, 1)
+    cache.get('b', calls, 2)
+    # a is used again: b is the least recently used
+    cache.get('a', calls, 1)
+    cache.get('c', calls, 3)
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.get_stats()['evictions'] == 1
+    cache.get('b', calls, 2)
+    assert calls.count == 4
+
+
+def test_cached_decorator():
+    calls = Calls()
+
+    @cached(maxSize=4)
+    def double_for_test(value, extra=0):
+        return calls(value) + extra
+
+    assert double_for_test(2) == 4
+    assert double_for_test(2) == 4
+    assert double_for_test(2, extra=1) == 5
+    assert calls.count == 2
+    assert double_for_test.cache.get_stats()['hits'] == 1
+    assert 'double_for_test: 1 hits, 2 misses, 0 evictions, 2 entries' in format_cache_stats()
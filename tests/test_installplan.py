@@ -0,0 +1,101 @@
+import os
+import json
+import pytest
+import installplan
+from installplan import InstallPlan, PlanError, PLAN_VERSION
+
+
+def make_sysfs(root, devices):
+    for slot, (vendorId, deviceId) in devices.items():
+        devDir = root / 'bus/pci/devices' / slot
+        devDir.mkdir(parents=True)
+        (devDir / 'vendor').write_text('0x{}\n'.format(vendorId))
+        (devDir / 'device').write_text('0x{}\n'.format(deviceId))
+    return str(root)
+
+
+def make_plan():
+    plan = InstallPlan(backports=True)
+    plan.add('install', '10de', '0000:01:00.0', '1c03', 'nvidia', 'nvidia-driver')
+    plan.add('install', '14e4', '0000:03:00.0', '43b1', 'wl', 'broadcom-sta-dkms')
+    plan.add('purge', '1002', '0000:02:00.0', '6649')
+    return plan
+
+
+def test_round_trip(tmp_path):
+    plan = make_plan()
+    path = plan.save(str(tmp_path))
+    loaded = InstallPlan.load(path)
+    assert loaded.to_dict() == plan.to_dict()
+    assert [(a.action, a.family, a.package) for a in loaded.actions] == [
+        ('install', 'nvidia', 'nvidia-driver'), ('install', 'broadcom', 'broadcom-sta-dkms'), ('purge', 'ati', '')]
+
+
+def test_unknown_manufacturer():
+    with pytest.raises(PlanError):
+        InstallPlan().add('install', '8086', '0000:00:02.0', '1912')
+
+
+@pytest.mark.parametrize('data', [
+    None,
+    [],
+    {'version': PLAN_VERSION + 1, 'actions': []},
+    {'version': PLAN_VERSION, 'actions': [{'action': 'install', 'family': 'nvidia', 'unknown': 1}]},
+    {'version': PLAN_VERSION, 'actions': [{'action': 'reinstall', 'family': 'nvidia'}]},
+    {'version': PLAN_VERSION, 'actions': [{'action': 'install', 'family': 'intel'}]},
+])
+def test_from_dict_rejects(data):
+    with pytest.raises(PlanError):
+        InstallPlan.from_dict(data)
+
+
+def test_load_damaged_file(tmp_path):
+    path = tmp_path / 'plan.json'
+    path.write_text('{"version": 1, ')
+    with pytest.raises(PlanError):
+        InstallPlan.load(str(path))
+    with pytest.raises(PlanError):
+        InstallPlan.load(str(tmp_path / 'missing.json'))
+
+
+def test_validate_matching_hardware(tmp_path):
+    sysfs = make_sysfs(tmp_path, {'0000:01:00.0': ('10de', '1c03'), '0000:03:00.0': ('14e4', '43b1')})
+    # The purged device does not need to be present
+    assert make_plan().validate(sysfs) == []
+
+
+def test_validate_changed_hardware(tmp_path):
+    sysfs = make_sysfs(tmp_path, {'0000:01:00.0': ('10de', '1b80')})
+    errors = make_plan().validate(sysfs)
+    assert errors == ['Device 0000:01:00.0 is 10de:1b80, planned for 10de:1c03',
+                      'Device not found: 0000:03:00.0']
+
+
+def test_validate_test_plan(tmp_path):
+    plan = make_plan()
+    plan.test = True
+    assert plan.validate(str(tmp_path)) == []
+
+
+def test_validate_without_sysfs(tmp_path, monkeypatch):
+    # Without sysfs the lspci backend is asked
+    monkeypatch.setattr(installplan, 'get_lspci_ids',
+                        lambda: {'0000:01:00.0': ['10de', '1c03'], '0000:03:00.0': ['14e4', '4360']})
+    errors = make_plan().validate(str(tmp_path))
+    assert errors == ['Device 0000:03:00.0 is 14e4:4360, planned for 14e4:43b1']
+
+
+def test_validate_pae(tmp_path, monkeypatch):
+    plan = InstallPlan()
+    plan.add('install', 'pae')
+    monkeypatch.setattr(os, 'uname', lambda: ('Linux', 'host', '4.9', '#1', 'i686'))
+    assert plan.validate(str(tmp_path)) == []
+    monkeypatch.setattr(os, 'uname', lambda: ('Linux', 'host', '4.9', '#1', 'x86_64'))
+    assert plan.validate(str(tmp_path)) == ['PAE kernel planned on a x86_64 machine']
+
+
+def test_saved_plan_is_private(tmp_path):
+    path = make_plan().save(str(tmp_path))
+    assert os.stat(path).st_mode & 0o077 == 0
+    with open(path) as f:
+        assert json.load(f)['version'] == PLAN_VERSION
@@ -0,0 +1,59 @@
+from pci import PciDevice
+from inventory import HardwareInventory
+
+DEVICES = [
+    PciDevice('0000:00:00.0', '8086', '191f', '0600'),
+    PciDevice('0000:00:02.0', '8086', '1912', '0300', bootVga=True, driver='i915'),
+    PciDevice('0000:01:00.0', '10de', '1c82', '0302', driver='nouveau'),
+    PciDevice('0000:03:00.0', '14e4', '43b1', '0280'),
+    PciDevice('0000:04:00.0', '10de', '0fbc', '0403', driver='snd_hda_intel'),
+]
+
+
+def make_inventory(devices=DEVICES, modules=()):
+    return HardwareInventory(devices, modules, machine='x86_64', release='4.9.0-3-amd64')
+
+
+def slots(devices):
+    return [d.slot for d in devices]
+
+
+def test_lookup_by_slot():
+    inventory = make_inventory()
+    assert inventory.get_device('0000:03:00.0').vendorId == '14e4'
+    assert inventory.get_device('0000:09:00.0') is None
+
+
+def test_lookup_by_vendor():
+    inventory = make_inventory()
+    assert slots(inventory.get_devices('10de')) == ['0000:01:00.0', '0000:04:00.0']
+    assert slots(inventory.get_devices('10de', ['0300', '0302'])) == ['0000:01:00.0']
+    assert inventory.get_devices('1002') == []
+
+
+def test_lookup_by_class():
+    inventory = make_inventory()
+    # Sorted by slot, whatever the order of the classes
+    assert slots(inventory.get_devices(classIds=['0302', '0300'])) == ['0000:00:02.0', '0000:01:00.0']
+    assert slots(inventory.get_devices()) == slots(DEVICES)
+
+
+def test_lookups_return_copies():
+    inventory = make_inventory()
+    inventory.get_devices('10de').clear()
+    inventory.get_devices().clear()
+    assert len(inventory.get_devices('10de')) == 2
+    assert len(inventory.get_devices()) == len(DEVICES)
+
+
+def test_optimus():
+    assert slots(make_inventory().get_optimus_devices()) == ['0000:00:02.0', '0000:01:00.0']
+    assert make_inventory(DEVICES[:2]).get_optimus_devices() == []
+    assert make_inventory(DEVICES[2:]).get_optimus_devices() == []
+
+
+def test_machine_and_release():
+    inventory = make_inventory()
+    assert (inventory.machine, inventory.release) == ('x86_64', '4.9.0-3-amd64')
+    # The running system by default
+    assert HardwareInventory([]).release
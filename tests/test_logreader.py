@@ -0,0 +1,125 @@
+import os
+import gzip
+from logreader import reverse_lines, find_last_match, get_rotated_logs, LogIndex
+
+
+def write(path, text, mode='w'):
+    with open(str(path), mode) as f:
+        f.write(text)
+
+
+def test_reverse_lines(tmp_path):
+    path = tmp_path / 'log'
+    lines = ['line {}'.format(i) * (i % 7 + 1) for i in range(200)]
+    write(path, '\n'.join(lines) + '\n')
+    # Block sizes smaller than a line, around a line and larger than the file
+    for blockSize in (1, 5, 17, 64 * 1024):
+        assert list(reverse_lines(str(path), blockSize)) == lines[::-1]
+
+
+def test_reverse_lines_without_trailing_newline(tmp_path):
+    path = tmp_path / 'log'
+    write(path, 'first\n\nsecond')
+    assert list(reverse_lines(str(path), 3)) == ['second', 'first']
+    write(path, '')
+    assert list(reverse_lines(str(path))) == []
+
+
+def test_find_last_match_in_rotations(tmp_path):
+    logPath = str(tmp_path / 'Xorg.log')
+    write(logPath, 'nothing here\n')
+    write(logPath + '.1', 'driver: nouveau\n')
+    with gzip.open(logPath + '.2.gz', 'wt') as f:
+        f.write('driver: nvidia\ndriver: radeon\n')
+    write(logPath + '.old', 'driver: intel\n')
+    logs = get_rotated_logs(logPath)
+    assert logs == [logPath, logPath + '.1', logPath + '.2.gz']
+    assert find_last_match(logs, [r'driver: (\w+)']).group(1) == 'nouveau'
+    assert find_last_match(logs[2:], [r'driver: (\w+)']).group(1) == 'radeon'
+    assert find_last_match(logs, [r'no such driver']) is None
+
+
+def lines_of(index):
+    return index.get_lines(0, len(index))
+
+
+def test_index_growing_file(tmp_path):
+    path = tmp_path / 'ddm.log'
+    write(path, '[run_plan] one\n[run_plan] tw')
+    index = LogIndex(str(path))
+    assert not index.is_done()
+    assert index.update() == 1
+    # The last line is still being written
+    assert lines_of(index) == ['[run_plan] one']
+    assert index.is_done()
+    write(path, 'o\nddm.scanner INFO three\n', 'a')
+    assert index.update() == 2
+    assert lines_of(index) == ['[run_plan] one', '[run_plan] two', 'ddm.scanner INFO three']
+    assert index.sections == {'run_plan', 'ddm.scanner'}
+    assert index.update() == 0
+    index.close()
+
+
+def test_index_in_chunks(tmp_path):
+    path = tmp_path / 'ddm.log'
+    lines = ['[section] line {}'.format(i) for i in range(100)]
+    write(path, '\n'.join(lines) + '\n')
+    index = LogIndex(str(path))
+    updates = 0
+    while not index.is_done():
+        index.update(maxBytes=50)
+        updates += 1
+    assert updates > 10
+    assert lines_of(index) == lines
+    assert index.get_lines(98, 10) == lines[98:]
+    index.close()
+
+
+def test_index_line_longer_than_chunk(tmp_path):
+    path = tmp_path / 'ddm.log'
+    longLine = '[nvidia] ' + 'x' * 500
+    write(path, 'short\n' + longLine + '\nend\n')
+    index = LogIndex(str(path))
+    while not index.is_done():
+        assert index.update(maxBytes=32) > 0
+    assert lines_of(index) == ['short', longLine, 'end']
+    index.close()
+
+
+def test_index_truncated_file(tmp_path):
+    path = tmp_path / 'ddm.log'
+    write(path, '[a] one\n[a] two\n[a] three\n')
+    index = LogIndex(str(path))
+    index.update()
+    assert len(index) == 3
+    # Truncated in place (copytruncate): same inode, smaller file
+    write(path, '[b] new\n')
+    assert index.update() == 1
+    assert lines_of(index) == ['[b] new']
+    assert index.sections == {'b'}
+    os.remove(str(path))
+    assert index.update() == 0
+    assert len(index) == 0
+    index.close()
+
+
+def test_index_filters(tmp_path):
+    path = tmp_path / 'ddm.log'
+    write(path, '[nvidia] Install nvidia-driver\n'
+                '[nvidia] <<ERROR>> apt-get failed\n'
+                'ddm.ddm WARNING no connection\n'
+                '[broadcom] <<ERROR>> [nvidia] mentioned\n'
+                'ddm.ddm ERROR failed\n')
+    index = LogIndex(str(path), level='error')
+    index.update()
+    assert lines_of(index) == ['[nvidia] <<ERROR>> apt-get failed', '[broadcom] <<ERROR>> [nvidia] mentioned',
+                               'ddm.ddm ERROR failed']
+    index.close()
+    index = LogIndex(str(path), section='nvidia')
+    index.update()
+    assert lines_of(index) == ['[nvidia] Install nvidia-driver', '[nvidia] <<ERROR>> apt-get failed']
+    index.close()
+    index = LogIndex(str(path), level='warning', section='ddm.ddm')
+    index.update()
+    assert lines_of(index) == ['ddm.ddm WARNING no connection', 'ddm.ddm ERROR failed']
+    index.close()
@@ -0,0 +1,82 @@
+import io
+import queue
+import logging
+from logging.handlers import QueueHandler
+from logwriter import LogWriter, BatchStreamHandler
+
+
+class CountingStream(io.StringIO):
+
+    def __init__(self):
+        io.StringIO.__init__(self)
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return io.StringIO.write(self, text)
+
+    def flush(self):
+        self.flushes += 1
+
+
+def make_logger(name, logQueue):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [QueueHandler(logQueue)]
+    return logger
+
+
+def make_handler(level=logging.DEBUG):
+    stream = CountingStream()
+    handler = BatchStreamHandler(stream)
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter('%(name)s %(levelname)s %(message)s'))
+    return handler, stream
+
+
+def test_queued_records_are_written_in_batches():
+    logQueue = queue.Queue()
+    logger = make_logger('ddm.test.batch', logQueue)
+    handler, stream = make_handler()
+    # Queue all records before the writer starts: they are written in batches of maxBatch
+    for i in range(25):
+        logger.debug('message %d', i)
+    writer = LogWriter(logQueue, [handler], maxBatch=10)
+    writer.start()
+    writer.stop(5)
+    assert not writer.is_alive()
+    lines = stream.getvalue().splitlines()
+    assert lines == ['ddm.test.batch DEBUG message {}'.format(i) for i in range(25)]
+    assert writer.records == 25
+    assert writer.batches == 3
+    assert stream.writes == 3 and stream.flushes == 3
+
+
+def test_stop_writes_everything_that_was_queued():
+    logQueue = queue.Queue()
+    logger = make_logger('ddm.test.stop', logQueue)
+    handler, stream = make_handler()
+    writer = LogWriter(logQueue, [handler])
+    writer.start()
+    for i in range(1000):
+        logger.info('message %d', i)
+    writer.stop(5)
+    assert len(stream.getvalue().splitlines()) == 1000
+    assert writer.batches <= 1000
+
+
+def test_handler_levels():
+    logQueue = queue.Queue()
+    logger = make_logger('ddm.test.level', logQueue)
+    fileHandler, fileStream = make_handler()
+    console, consoleStream = make_handler(logging.INFO)
+    logger.debug('debug only in the file')
+    logger.warning('warning everywhere')
+    writer = LogWriter(logQueue, [fileHandler, console])
+    writer.start()
+    writer.stop(5)
+    assert fileStream.getvalue().splitlines() == ['ddm.test.level DEBUG debug only in the file',
+                                                  'ddm.test.level WARNING warning everywhere']
+    assert consoleStream.getvalue().splitlines() == ['ddm.test.level WARNING warning everywhere']
@@ -0,0 +1,160 @@
+import os
+import pci
+from pci import SysfsPciBackend, LspciPciBackend, PciIds, get_pci_backend
+from inventory import HardwareInventory
+
+# Two display controllers (Optimus), a wireless card without a driver and a bridge
+DEVICES = [
+    # slot, class, vendor, device, subvendor, subdevice, driver
+    ('0000:00:00.0', '060000', '8086', '191f', '1043', '8614', ''),
+    ('0000:00:02.0', '030000', '8086', '1912', '1043', '8614', 'i915'),
+    ('0000:01:00.0', '030200', '10de', '1c82', '1043', '8613', 'nouveau'),
+    ('0000:03:00.0', '028000', '14e4', '43b1', '1043', '85ab', ''),
+]
+
+PCI_IDS = '''# pci.ids
+10de  NVIDIA Corporation
+\t1c82  GP107 [GeForce GTX 1050 Ti]
+14e4  Broadcom Limited
+\t43b1  BCM4352 802.11ac Wireless Network Adapter
+8086  Intel Corporation
+\t1912  HD Graphics 530
+\t191f  Xeon E3-1200 v5/E3-1500 v5/6th Gen Core Processor Host Bridge/DRAM Registers
+C 00  Unclassified device
+'''
+
+LSPCI = '''Slot:\t0000:00:00.0
+Class:\tHost bridge [0600]
+Vendor:\tIntel Corporation [8086]
+Device:\tXeon E3-1200 v5/E3-1500 v5/6th Gen Core Processor Host Bridge/DRAM Registers [191f]
+SVendor:\tASUSTeK Computer Inc. [1043]
+SDevice:\tDevice [8614]
+Rev:\t07
+
+Slot:\t0000:00:02.0
+Class:\tVGA compatible controller [0300]
+Vendor:\tIntel Corporation [8086]
+Device:\tHD Graphics 530 [1912]
+SVendor:\tASUSTeK Computer Inc. [1043]
+SDevice:\tDevice [8614]
+Rev:\t06
+Driver:\ti915
+Module:\ti915
+
+Slot:\t0000:01:00.0
+Class:\t3D controller [0302]
+Vendor:\tNVIDIA Corporation [10de]
+Device:\tGP107 [GeForce GTX 1050 Ti] [1c82]
+SVendor:\tASUSTeK Computer Inc. [1043]
+SDevice:\tDevice [8613]
+Rev:\ta1
+Driver:\tnouveau
+Module:\tnouveau
+
+Slot:\t0000:03:00.0
+Class:\tNetwork controller [0280]
+Vendor:\tBroadcom Limited [14e4]
+Device:\tBCM4352 802.11ac Wireless Network Adapter [43b1]
+SVendor:\tASUSTeK Computer Inc. [1043]
+SDevice:\tDevice [85ab]
+Rev:\t03
+Module:\tbcma
+Module:\twl
+'''
+
+
+def make_sysfs(root, devices=DEVICES):
+    devicesDir = root / 'bus/pci/devices'
+    driversDir = root / 'bus/pci/drivers'
+    devicesDir.mkdir(parents=True)
+    for slot, classId, vendorId, deviceId, subVendorId, subDeviceId, driver in devices:
+        devDir = devicesDir / slot
+        devDir.mkdir()
+        for attr, value in (('class', classId), ('vendor', vendorId), ('device', deviceId),
+                            ('subsystem_vendor', subVendorId), ('subsystem_device', subDeviceId)):
+            (devDir / attr).write_text('0x{}\n'.format(value))
+        (devDir / 'boot_vga').write_text('1\n' if slot == '0000:00:02.0' else '0\n')
+        if driver:
+            (driversDir / driver).mkdir(parents=True, exist_ok=True)
+            os.symlink(str(driversDir / driver), str(devDir / 'driver'))
+    return str(root)
+
+
+def make_pci_ids(root):
+    path = root / 'pci.ids'
+    path.write_text(PCI_IDS)
+    return PciIds([str(root / 'missing.ids'), str(path)])
+
+
+def fields(device):
+    return (device.slot, device.classId, device.vendorId, device.deviceId,
+            device.subVendorId, device.subDeviceId, device.name, device.driver)
+
+
+def test_sysfs_backend(tmp_path):
+    backend = SysfsPciBackend(make_sysfs(tmp_path), make_pci_ids(tmp_path))
+    assert backend.available()
+    devices = backend.enumerate()
+    assert [d.slot for d in devices] == [d[0] for d in DEVICES]
+    nvidia = devices[2]
+    assert fields(nvidia) == ('0000:01:00.0', '0302', '10de', '1c82', '1043', '8613',
+                              'NVIDIA Corporation GP107 [GeForce GTX 1050 Ti]', 'nouveau')
+    assert [d.bootVga for d in devices] == [False, True, False, False]
+
+
+def test_lspci_backend(monkeypatch):
+    monkeypatch.setattr(pci, 'getoutput', lambda command: LSPCI.split('\n'))
+    devices = LspciPciBackend().enumerate()
+    assert fields(devices[3]) == ('0000:03:00.0', '0280', '14e4', '43b1', '1043', '85ab',
+                                  'Broadcom Limited BCM4352 802.11ac Wireless Network Adapter', '')
+
+
+def test_backends_agree(tmp_path, monkeypatch):
+    monkeypatch.setattr(pci, 'getoutput', lambda command: LSPCI.split('\n'))
+    sysfsDevices = SysfsPciBackend(make_sysfs(tmp_path), make_pci_ids(tmp_path)).enumerate()
+    lspciDevices = LspciPciBackend().enumerate()
+    assert [fields(d) for d in sysfsDevices] == [fields(d) for d in lspciDevices]
+
+
+def test_unknown_names(tmp_path):
+    backend = SysfsPciBackend(make_sysfs(tmp_path), PciIds([str(tmp_path / 'missing.ids')]))
+    assert backend.enumerate()[2].name == 'Vendor 10de Device 1c82'
+
+
+def test_backend_choice(tmp_path):
+    assert isinstance(get_pci_backend(make_sysfs(tmp_path)), SysfsPciBackend)
+    assert isinstance(get_pci_backend(str(tmp_path / 'nosys')), LspciPciBackend)
+
+
+def test_driver_from_sysfs(tmp_path):
+    backend = SysfsPciBackend(make_sysfs(tmp_path), make_pci_ids(tmp_path))
+    assert [d.driver for d in backend.enumerate()] == ['', 'i915', 'nouveau', '']
+    # Binding another driver changes the symlink
+    link = tmp_path / 'bus/pci/devices/0000:01:00.0/driver'
+    link.unlink()
+    os.symlink('../../../../bus/pci/drivers/nvidia', str(link))
+    assert backend.enumerate()[2].driver == 'nvidia'
+
+
+def test_driver_from_lspci_without_sysfs(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(pci, 'getoutput', lambda command: commands.append(command) or LSPCI.split('\n'))
+    backend = get_pci_backend(str(tmp_path / 'nosys'))
+    assert [d.driver for d in backend.enumerate()] == ['', 'i915', 'nouveau', '']
+    # The kernel driver in use is listed by -k
+    assert '-Dvmmnnk' in commands[0]
+
+
+def test_loaded_modules_and_display_driver(tmp_path):
+    (tmp_path / 'modules').write_text('nouveau 1630208 3 - Live 0x0000000000000000\n'
+                                      'snd_hda_intel 36864 5 - Live 0x0000000000000000\n')
+    modules = pci.get_loaded_modules(str(tmp_path))
+    assert modules == {'nouveau', 'snd_hda_intel'}
+    assert pci.get_loaded_modules(str(tmp_path / 'noproc')) == set()
+
+    inventory = HardwareInventory.scan(SysfsPciBackend(make_sysfs(tmp_path / 'sys'), make_pci_ids(tmp_path)),
+                                       str(tmp_path))
+    assert inventory.is_module_loaded('snd-hda-intel')
+    assert not inventory.is_module_loaded('nvidia')
+    # The driver of the boot VGA device comes first
+    assert inventory.get_display_driver() == 'i915'
@@ -0,0 +1,108 @@
+import json
+import pytest
+from progress import parse_apt_status, EventReader, ProgressTracker, AptSpans
+
+
+def test_download_status():
+    event = parse_apt_status('dlstatus:1:42.5:Downloading nvidia-driver\n', 'transaction', 1000)
+    assert event == {'event': 'download', 'phase': 'transaction', 'percent': 42.5,
+                     'bytes': 425, 'total': 1000, 'message': 'Downloading nvidia-driver'}
+
+
+def test_dpkg_status():
+    event = parse_apt_status('pmstatus:nvidia-driver:61.2:Unpacking nvidia-driver (375.66-1)')
+    assert event['event'] == 'dpkg'
+    assert event['package'] == 'nvidia-driver'
+    assert event['step'] == 'unpack'
+    assert event['percent'] == 61.2
+    # Messages can contain colons
+    event = parse_apt_status('pmstatus:dpkg-exec:90:Running dpkg: triggers')
+    assert event['step'] == 'trigger'
+    assert event['message'] == 'Running dpkg: triggers'
+
+
+def test_dpkg_error():
+    event = parse_apt_status('pmerror:nvidia-kernel-dkms:75:subprocess installed post-installation script returned error exit status 10')
+    assert event == {'event': 'dpkg-error', 'package': 'nvidia-kernel-dkms',
+                     'message': 'subprocess installed post-installation script returned error exit status 10'}
+
+
+@pytest.mark.parametrize('line', ['', 'dlstatus:1', 'media-change:cdrom:0:Insert disc', 'Reading package lists...'])
+def test_lines_without_progress(line):
+    assert parse_apt_status(line) is None
+
+
+def test_percent_is_clamped():
+    assert parse_apt_status('pmstatus:a:150:Configuring a')['percent'] == 100.0
+    assert parse_apt_status('pmstatus:a:abc:Configuring a')['percent'] == 0.0
+
+
+def test_reader_joins_split_lines():
+    reader = EventReader()
+    line = json.dumps({'event': 'status', 'message': 'Install drivers for: nvidia'}).encode() + b'\n'
+    assert reader.feed(line[:10]) == []
+    assert reader.feed(line[10:] + b'{"event": "exit",') == [{'event': 'status', 'message': 'Install drivers for: nvidia'}]
+    assert reader.feed(b' "code": 0}\n') == [{'event': 'exit', 'code': 0}]
+
+
+def test_reader_skips_other_output():
+    reader = EventReader()
+    data = b'not json\n[1, 2]\n{"no": "event"}\n{"event": "phase", "phase": "plan", "state": "start"}\n'
+    assert reader.feed(data) == [{'event': 'phase', 'phase': 'plan', 'state': 'start'}]
+
+
+def test_fraction_never_moves_back():
+    tracker = ProgressTracker()
+    fractions = []
+    for event in [{'event': 'phase', 'phase': 'update', 'state': 'start'},
+                  {'event': 'download', 'phase': 'update', 'percent': 50},
+                  {'event': 'phase', 'phase': 'update', 'state': 'end'},
+                  {'event': 'download', 'phase': 'transaction', 'percent': 80},
+                  {'event': 'dpkg', 'package': 'a', 'percent': 40},
+                  # Old APT versions restart the percentage per package
+                  {'event': 'dpkg', 'package': 'b', 'percent': 10},
+                  {'event': 'exit', 'code': 0}]:
+        assert tracker.update(event)
+        fractions.append(tracker.fraction)
+    assert fractions == sorted(fractions)
+    assert fractions[-1] == 1.0
+    assert not tracker.update({'event': 'unknown'})
+
+
+def test_failure_code():
+    tracker = ProgressTracker()
+    tracker.update({'event': 'exit', 'code': 0})
+    assert tracker.get_failure_code() == 0
+
+    # A dpkg error alone does not set the code: apt-get reports it with an error event
+    tracker = ProgressTracker()
+    tracker.update({'event': 'dpkg-error', 'package': 'a', 'message': 'failed'})
+    assert tracker.dpkgErrors and tracker.get_failure_code() == 0
+    tracker.update({'event': 'error', 'code': 100, 'message': 'apt-get failed'})
+    assert tracker.get_failure_code() == 100
+    tracker.update({'event': 'exit', 'code': 5})
+    assert tracker.get_failure_code() == 5
+
+
+class FakeTracer(object):
+
+    def __init__(self):
+        self.spans = []
+
+    def add(self, name, start, end, **attrs):
+        self.spans.append((name, start, end, attrs))
+
+
+def test_apt_spans():
+    tracer = FakeTracer()
+    spans = AptSpans(tracer, 'transaction')
+    spans.start = 0.0
+    spans.update({'event': 'download', 'percent': 50}, 1.0)
+    spans.update({'event': 'dpkg', 'package': 'nvidia-kernel-dkms:amd64', 'step': 'unpack'}, 2.0)
+    spans.update({'event': 'dpkg', 'package': 'nvidia-kernel-dkms:amd64', 'step': 'configure'}, 3.0)
+    spans.close(9.0)
+    assert tracer.spans == [('apt download', 0.0, 2.0, {'phase': 'transaction'}),
+                            ('dpkg unpack', 2.0, 3.0, {'package': 'nvidia-kernel-dkms'}),
+                            ('dpkg configure', 3.0, 9.0, {'package': 'nvidia-kernel-dkms'}),
+                            ('dkms build', 3.0, 9.0, {'package': 'nvidia-kernel-dkms'}),
+                            ('dpkg', 2.0, 9.0, {})]
@@ -0,0 +1,103 @@
+import os
+import json
+import pytest
+import scancache
+from scancache import ScanCache, get_scan_key, CACHE_VERSION
+from pci import PciDevice
+from inventory import HardwareInventory
+
+
+def make_inventory(driver='nouveau', release='4.9.0-3-amd64', deviceId='1c03'):
+    devices = [PciDevice('0000:00:02.0', '8086', '1912', '0300', driver='i915'),
+               PciDevice('0000:01:00.0', '10de', deviceId, '0302', '1043', '85ab', driver=driver)]
+    return HardwareInventory(devices, machine='x86_64', release=release)
+
+
+@pytest.fixture
+def apt(tmp_path):
+    status = tmp_path / 'status'
+    status.write_text('Package: base-files\n')
+    lists = tmp_path / 'lists'
+    lists.mkdir()
+    return str(status), str(lists)
+
+
+def key_of(inventory, apt):
+    return get_scan_key(inventory, *apt)
+
+
+def test_key_is_stable(apt):
+    assert key_of(make_inventory(), apt) == key_of(make_inventory(), apt)
+
+
+@pytest.mark.parametrize('changed', [
+    make_inventory(driver='nvidia'),
+    make_inventory(release='4.9.0-4-amd64'),
+    make_inventory(deviceId='1b80'),
+])
+def test_key_follows_the_hardware(apt, changed):
+    assert key_of(changed, apt) != key_of(make_inventory(), apt)
+
+
+def test_key_follows_the_slots(apt):
+    moved = make_inventory()
+    moved.devices[1].slot = '0000:02:00.0'
+    assert key_of(moved, apt) != key_of(make_inventory(), apt)
+
+
+def test_key_follows_the_packages(apt):
+    status, lists = apt
+    key = key_of(make_inventory(), apt)
+    stat = os.stat(status)
+    os.utime(status, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    statusKey = key_of(make_inventory(), apt)
+    assert statusKey != key
+    stat = os.stat(lists)
+    os.utime(lists, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert key_of(make_inventory(), apt) not in (key, statusKey)
+
+
+def test_key_without_package_files(tmp_path):
+    missing = str(tmp_path / 'missing')
+    assert get_scan_key(make_inventory(), missing, missing) == get_scan_key(make_inventory(), missing, missing)
+
+
+def test_round_trip(tmp_path):
+    cache = ScanCache(str(tmp_path / 'ddm' / 'scan.json'))
+    assert cache.load('key') is None
+    data = [{'slot': '0000:01:00.0', 'driver': 'nvidia', 'selected': True}]
+    cache.save('key', data)
+    assert cache.load('key') == data
+    # Another key: the hardware or the packages changed
+    assert cache.load('other') is None
+    cache.clear()
+    assert cache.load('key') is None
+    cache.clear()
+
+
+@pytest.mark.parametrize('content', [
+    '{"version": 2, "key": "key", "data": [',
+    '',
+    '[1, 2]',
+    json.dumps({'version': CACHE_VERSION - 1, 'key': 'key', 'data': []}),
+])
+def test_rejects_corrupt_or_old_cache(tmp_path, content):
+    path = tmp_path / 'scan.json'
+    path.write_text(content)
+    assert ScanCache(str(path)).load('key') is None
+
+
+def test_save_is_atomic(tmp_path, monkeypatch):
+    path = tmp_path / 'scan.json'
+    cache = ScanCache(str(path))
+    cache.save('key', ['old'])
+
+    def fail(*args):
+        raise OSError('disk full')
+
+    # A failed write keeps the previous cache and leaves no temporary file
+    monkeypatch.setattr(scancache.os, 'replace', fail)
+    with pytest.raises(OSError):
+        cache.save('key', ['new'])
+    assert cache.load('key') == ['old']
+    assert os.listdir(str(tmp_path)) == ['scan.json']
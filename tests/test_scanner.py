@@ -0,0 +1,93 @@
+import time
+import threading
+from os.path import join, abspath, dirname
+import scanner
+from scanner import HardwareScanner, HARDWARE_EVENT
+from inventory import HardwareInventory
+from pci import PciDevice, VGA_CLASS
+
+MEDIA_DIR = join(abspath(dirname(__file__)), '../usr/share/ddm')
+WIRELESS_CLASS = '0280'
+
+
+class FakeLog(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, message, loggerName='log', logLevel='debug', showErrorDialog=True):
+        self.lines.append(message)
+
+
+def make_scanner(devices, modules=None, machine='x86_64'):
+    hw = HardwareScanner(MEDIA_DIR, FakeLog())
+    hw.inventory = HardwareInventory(devices, modules, machine, '4.9.0-8-amd64')
+    hw.graphicalDriver = None
+    hw.wirelessDriver = None
+    return hw
+
+
+def test_merge_order_does_not_depend_on_finish_order():
+    hw = make_scanner([])
+    events = []
+    hw.set_listener(lambda event, index, key, data: events.append((event, index, key)))
+
+    def make_detector(name, seconds):
+        def detector(result):
+            time.sleep(seconds)
+            result.add_hardware(name, [False, '', name, name, '', '', name])
+            result.warnings.append(name)
+        detector.__name__ = name
+        return detector
+
+    # The first detector finishes last
+    names = ['slow', 'medium', 'fast', 'instant']
+    hw.run_detectors([make_detector(name, seconds) for name, seconds in zip(names, [0.3, 0.2, 0.1, 0])])
+    assert [row[6] for row in hw.hardware] == names
+    assert hw.warnings == names
+    # The events carry the detector index to order the rows
+    assert sorted((index, key) for event, index, key in events if event == HARDWARE_EVENT) == \
+        list(enumerate(names))
+
+
+def test_broadcom_selected_by_loaded_module():
+    # wldebian is driven by the wl module, b43 by b43
+    wl = PciDevice('0000:02:00.0', '14e4', '4365', WIRELESS_CLASS, driver='wl', name='BCM43142')
+    b43 = PciDevice('0000:03:00.0', '14e4', '4311', WIRELESS_CLASS, name='BCM4311')
+    hw = make_scanner([wl, b43], ['wl'])
+    hw.run_detectors([hw.get_broadcom])
+    assert [(row[3], row[0]) for row in hw.hardware] == [('wldebian', True), ('b43', False)]
+
+    hw = make_scanner([b43], ['b43', 'ssb'])
+    hw.run_detectors([hw.get_broadcom])
+    assert [(row[3], row[0]) for row in hw.hardware] == [('b43', True)]
+
+
+def test_nvidia_detect_is_installed_before_the_detectors(monkeypatch):
+    nvidia = PciDevice('0000:01:00.0', '10de', '1401', VGA_CLASS, name='NVIDIA Corporation Device')
+    hw = make_scanner([nvidia])
+    calls = []
+    monkeypatch.setattr(scanner, 'has_newer_in_backports', lambda package: True)
+    monkeypatch.setattr(scanner, 'get_apt_options', lambda: '')
+    monkeypatch.setattr(scanner, 'shell_exec',
+                        lambda argv: calls.append(('install', argv[-1], threading.current_thread())))
+    monkeypatch.setattr(scanner, 'get_nvidia_detect_driver',
+                        lambda: calls.append(('detect', '', threading.current_thread())) or 'nvidia-driver')
+
+    hw.install_detector_packages()
+    hw.run_detectors([hw.get_nvidia])
+    assert [(call[0], call[1]) for call in calls] == [('install', 'nvidia-detect'), ('detect', '')]
+    # Not installed from a detector thread
+    assert calls[0][2] is threading.current_thread()
+    assert [row[3] for row in hw.hardware] == ['nvidia-driver']
+
+
+def test_nvidia_detect_is_not_installed_for_optimus(monkeypatch):
+    intel = PciDevice('0000:00:02.0', '8086', '0a16', VGA_CLASS, bootVga=True, name='Intel Corporation')
+    nvidia = PciDevice('0000:01:00.0', '10de', '0fe4', '0302', name='NVIDIA Corporation GK107M')
+    calls = []
+    monkeypatch.setattr(scanner, 'has_newer_in_backports', lambda package: True)
+    monkeypatch.setattr(scanner, 'shell_exec', lambda argv: calls.append(argv))
+    make_scanner([intel, nvidia]).install_detector_packages()
+    make_scanner([intel]).install_detector_packages()
+    assert calls == []
@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import subprocess
+from os.path import join, abspath, dirname
+import tracing
+from tracing import Tracer, RUN_VARIABLE, read_spans, percentile, get_span_stats, format_span_stats
+
+TRACING_PY = join(abspath(dirname(__file__)), '../usr/lib/ddm/tracing.py')
+
+
+def write_spans(path, spans):
+    with open(str(path), 'a') as f:
+        for run, name, dur in spans:
+            f.write(json.dumps({'run': run, 'src': 'gui', 'name': name, 'start': 0, 'dur': dur, 'attrs': {}}) + '\n')
+
+
+def test_run_id_is_set_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.delenv(RUN_VARIABLE, raising=False)
+    tracer = Tracer(str(tmp_path / 'ddm.trace'))
+    assert RUN_VARIABLE not in os.environ
+    tracer.add('first', 1, 2)
+    assert os.environ[RUN_VARIABLE] == tracer.get_run()
+
+    # The backend started by the GUI uses the run id of the GUI
+    monkeypatch.setenv(RUN_VARIABLE, '1700000000-4242')
+    assert Tracer(str(tmp_path / 'ddm.trace')).get_run() == '1700000000-4242'
+
+
+def test_write_spans(tmp_path, monkeypatch):
+    monkeypatch.setenv(RUN_VARIABLE, '1700000000-4242')
+    monkeypatch.setattr(tracing, 'FLUSH_SPANS', 3)
+    path = tmp_path / 'ddm.trace'
+    tracer = Tracer(str(path), source='ddm')
+    tracer.add('one', 10, 10.5, code=0)
+    with tracer.span('two') as attrs:
+        attrs['devices'] = 2
+    # Kept in memory until FLUSH_SPANS spans are recorded
+    assert not path.exists()
+    tracer.add('three', 20, 21)
+    lines = path.read_text().splitlines()
+    assert len(lines) == 3
+    first = json.loads(lines[0])
+    assert first == {'run': '1700000000-4242', 'src': 'ddm', 'name': 'one', 'start': 10, 'dur': 0.5, 'attrs': {'code': 0}}
+    assert json.loads(lines[1])['attrs'] == {'devices': 2}
+
+    tracer.add('four', 30, 31)
+    tracer.flush()
+    assert [span['name'] for span in read_spans(str(path))] == ['one', 'two', 'three', 'four']
+
+
+def test_no_trace_file(tmp_path):
+    tracer = Tracer(str(tmp_path / 'ddm.trace'))
+    tracer.configure('')
+    tracer.add('dropped', 1, 2)
+    tracer.flush()
+    assert tracer.spans == []
+    assert os.listdir(str(tmp_path)) == []
+    # Without write access the spans are dropped
+    tracer = Tracer(str(tmp_path / 'missing/ddm.trace'))
+    tracer.add('dropped', 1, 2)
+    tracer.flush()
+    assert tracer.path == ''
+
+
+def test_read_spans_with_old_file_and_damaged_lines(tmp_path):
+    path = tmp_path / 'ddm.trace'
+    write_spans(str(path) + '.old', [('1', 'old', 1)])
+    write_spans(path, [('2', 'new', 1)])
+    with open(str(path), 'a') as f:
+        f.write('{"run": "2", "name": "cut off\n[1, 2]\n')
+    assert [span['name'] for span in read_spans(str(path))] == ['old', 'new']
+
+
+def test_percentile():
+    values = list(range(1, 21))
+    assert percentile(values, 50) == 10
+    assert percentile(values, 95) == 19
+    assert percentile(values, 100) == 20
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) == 0
+
+
+def test_span_stats():
+    spans = [('run1', 'scan', d) for d in range(1, 11)] + [('run1', 'install', 30)]
+    stats, runCount = get_span_stats([{'run': r, 'name': n, 'dur': d} for r, n, d in spans])
+    assert runCount == 1
+    assert stats['scan'] == {'count': 10, 'p50': 5, 'p95': 10, 'max': 10, 'total': 55}
+    assert stats['install']['p50'] == 30
+    lines = format_span_stats(stats, runCount)
+    assert lines[0] == 'Spans of the last 1 runs'
+    # Largest total first
+    assert lines[2].startswith('scan') and lines[3].startswith('install')
+
+
+def test_span_stats_of_recent_runs():
+    spans = [{'run': str(run), 'name': 'scan', 'dur': run} for run in range(1, 6)]
+    stats, runCount = get_span_stats(spans, runs=2)
+    assert runCount == 2
+    assert stats['scan']['count'] == 2 and stats['scan']['p50'] == 4
+    stats, runCount = get_span_stats(spans, runs=0)
+    assert runCount == 5
+    assert stats['scan']['count'] == 5 and stats['scan']['p50'] == 3
+
+
+def test_stats_command(tmp_path):
+    path = tmp_path / 'ddm.trace'
+    write_spans(path, [('1', 'scan', 1), ('2', 'scan', 2), ('3', 'scan', 3)])
+    output = subprocess.check_output([sys.executable, TRACING_PY, '--stats', '--runs', '2',
+                                      '--file', str(path), '--json'])
+    data = json.loads(output.decode())
+    assert data['runs'] == 2
+    assert data['spans']['scan'] == {'count': 2, 'p50': 2, 'p95': 3, 'max': 3, 'total': 5}
+
+    output = subprocess.check_output([sys.executable, TRACING_PY, '--stats', '--file', str(path)])
+    assert output.decode().startswith('Spans of the last 3 runs')
+
+    output = subprocess.check_output([sys.executable, TRACING_PY, '--stats', '--file', str(tmp_path / 'missing')])
+    assert output.decode().startswith('No spans')
@@ -0,0 +1,440 @@
+#! /usr/bin/env python3
+
+import os
+import re
+import sys
+import gzip
+import lzma
+import mmap
+import pickle
+import argparse
+import tempfile
+import threading
+from glob import glob
+from os.path import join, basename, dirname, exists
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Downloaded package lists and the persisted index
+APT_LISTS = '/var/lib/apt/lists'
+APT_INDEX = '/var/cache/ddm/aptlists.pickle'
+INDEX_VERSION = 1
+
+# One-line and deb822 style sources
+SOURCES_LIST = '/etc/apt/sources.list'
+SOURCES_PATTERNS = ['/etc/apt/sources.list.d/*.list', '/etc/apt/sources.list.d/*.sources']
+
+# Fields of a Packages stanza: a new Package field starts a new stanza
+FIELD_PATTERN = re.compile(rb'^(Package|Version|Size): *(.*?) *$', flags=re.MULTILINE)
+
+
+# ===============================================
+# Debian version comparison (deb-version(7))
+# ===============================================
+
+def order(c):
+    if c.isdigit():
+        return 0
+    if c.isalpha():
+        return ord(c)
+    if c == '~':
+        return -1
+    return ord(c) + 256 if c else 0
+
+
+def compare_part(a, b):
+    while a or b:
+        # Non-digit prefix
+        i = 0
+        while i < len(a) and not a[i].isdigit():
+            i += 1
+        j = 0
+        while j < len(b) and not b[j].isdigit():
+            j += 1
+        prefixA, a = a[:i], a[i:]
+        prefixB, b = b[:j], b[j:]
+        for k in range(max(len(prefixA), len(prefixB))):
+            diff = order(prefixA[k] if k < len(prefixA) else '') - order(prefixB[k] if k < len(prefixB) else '')
+            if diff:
+                return diff
+        # Numeric part
+        i = 0
+        while i < len(a) and a[i].isdigit():
+            i += 1
+        j = 0
+        while j < len(b) and b[j].isdigit():
+            j += 1
+        diff = int(a[:i] or 0) - int(b[:j] or 0)
+        if diff:
+            return diff
+        a, b = a[i:], b[j:]
+    return 0
+
+
+def split_version(version):
+    epoch, sep, rest = version.partition(':')
+    if not sep:
+        epoch, rest = '0', version
+    upstream, sep, revision = rest.rpartition('-')
+    if not sep:
+        upstream, revision = rest, ''
+    return int(epoch) if epoch.isdigit() else 0, upstream, revision
+
+
+# Return < 0, 0 or > 0 like dpkg --compare-versions
+def compare_versions(a, b):
+    epochA, upstreamA, revisionA = split_version(a)
+    epochB, upstreamB, revisionB = split_version(b)
+    if epochA != epochB:
+        return epochA - epochB
+    return compare_part(upstreamA, upstreamB) or compare_part(revisionA, revisionB)
+
+
+# ===============================================
+# Sources
+# ===============================================
+
+class SourceEntry(object):
+
+    def __init__(self, type, uri, suite, components, path=''):
+        self.type = type
+        self.uri = uri
+        self.suite = suite
+        self.components = components
+        self.path = path
+
+    def is_backports(self):
+        return self.suite.endswith('-backports')
+
+    def __repr__(self):
+        return "SourceEntry({} {} {} {})".format(self.type, self.uri, self.suite, ' '.join(self.components))
+
+
+# deb [options] uri suite [component...]
+def parse_sources_list(path):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            line = re.sub(r'\[[^\]]*\]', '', line)
+            fields = line.split()
+            if len(fields) >= 3 and fields[0] in ('deb', 'deb-src'):
+                entries.append(SourceEntry(fields[0], fields[1], fields[2], fields[3:], path))
+    return entries
+
+
+# deb822: stanzas with Types, URIs, Suites, Components (and Enabled)
+def parse_deb822_sources(path):
+    entries = []
+    with open(path) as f:
+        stanzas = re.split(r'\n\s*\n', f.read())
+    for stanza in stanzas:
+        fields = {}
+        key = None
+        for line in stanza.split('\n'):
+            if line.startswith('#') or not line.strip():
+                continue
+            if line[:1] in (' ', '\t') and key:
+                fields[key] += ' ' + line.strip()
+            elif ':' in line:
+                key, value = line.split(':', 1)
+                key = key.strip().lower()
+                fields[key] = value.strip()
+        if fields.get('enabled', 'yes').lower() == 'no':
+            continue
+        for type in fields.get('types', '').split():
+            for uri in fields.get('uris', '').split():
+                for suite in fields.get('suites', '').split():
+                    entries.append(SourceEntry(type, uri, suite, fields.get('components', '').split(), path))
+    return entries
+
+
+def get_sources(sourcesList=SOURCES_LIST, patterns=SOURCES_PATTERNS):
+    entries = []
+    paths = [sourcesList]
+    for pattern in patterns:
+        paths.extend(sorted(glob(pattern)))
+    for path in paths:
+        try:
+            if path.endswith('.sources'):
+                entries.extend(parse_deb822_sources(path))
+            else:
+                entries.extend(parse_sources_list(path))
+        except (IOError, OSError, UnicodeDecodeError):
+            continue
+    return entries
+
+
+# Suites of the enabled Debian backports repositories
+def get_backports_suites(sources=None):
+    suites = []
+    for entry in sources if sources is not None else get_sources():
+        if entry.type == 'deb' and entry.is_backports() and 'debian' in entry.uri and entry.suite not in suites:
+            suites.append(entry.suite)
+    return suites
+
+
+# ===============================================
+# Package lists
+# ===============================================
+
+# Return (suite, component) of a list file name, e.g.:
+#   deb.debian.org_debian_dists_stretch-backports_main_binary-amd64_Packages.xz
+#   security.debian.org_dists_stretch_updates_main_binary-amd64_Packages
+# Slashes in suite and component are stored as underscores: the Release
+# file of the suite tells where the suite ends
+def get_list_origin(path):
+    name = basename(path)
+    prefix, sep, rest = name.partition('_dists_')
+    if not sep:
+        return '', ''
+    parts = rest.split('_')
+    try:
+        end = [i for i, p in enumerate(parts) if p.startswith('binary-')][0]
+    except IndexError:
+        return '', ''
+    listDir = dirname(path)
+    suiteLen = 1
+    for n in range(end - 1, 0, -1):
+        base = join(listDir, "{}_dists_{}".format(prefix, '_'.join(parts[:n])))
+        if exists(base + '_InRelease') or exists(base + '_Release'):
+            suiteLen = n
+            break
+    return '/'.join(parts[:suiteLen]), '/'.join(parts[suiteLen:end])
+
+
+def read_list(path):
+    if path.endswith('.gz'):
+        opener = gzip.open
+    elif path.endswith('.xz'):
+        opener = lzma.open
+    elif lz4 is not None:
+        opener = lz4.frame.open
+    else:
+        raise IOError("lz4 module not available: {}".format(path))
+    with opener(path, 'rb') as f:
+        return f.read()
+
+
+# Return {package: [(version, size)]} of a Packages file
+def parse_packages(data):
+    packages = {}
+    name = version = None
+    size = 0
+
+    def add():
+        if name and version:
+            packages.setdefault(name, []).append((version, size))
+
+    for matchObj in FIELD_PATTERN.finditer(data):
+        field, value = matchObj.group(1), matchObj.group(2).decode('utf-8', errors='replace')
+        if field == b'Package':
+            add()
+            name, version, size = value, None, 0
+        elif field == b'Version':
+            version = value
+        else:
+            size = int(value) if value.isdigit() else 0
+    add()
+    return packages
+
+
+# Uncompressed lists are parsed through mmap, compressed lists in memory
+def parse_list(path):
+    if re.search(r'\.(gz|xz|lz4)$', path):
+        return parse_packages(read_list(path))
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse_packages(mm)
+
+
+def get_list_files(listsDir=APT_LISTS):
+    return sorted(p for p in glob(join(listsDir, '*_Packages*'))
+                  if re.search(r'_Packages(\.gz|\.xz|\.lz4)?$', p))
+
+
+class AptListsIndex(object):
+    """ Index of the downloaded package lists:
+    package -> [(version, suite, component, size)]
+
+    Each list file is parsed once and kept in the persisted index until
+    its mtime or size changes. The persisted index is a pickle that the
+    first query of a process loads in full. The backports suites of the
+    sources are read again only when a sources file changes.
+    """
+    def __init__(self, listsDir=APT_LISTS, indexPath=APT_INDEX, sourcesList=SOURCES_LIST, sourcesPatterns=SOURCES_PATTERNS):
+        self.listsDir = listsDir
+        self.indexPath = indexPath
+        self.sourcesList = sourcesList
+        self.sourcesPatterns = sourcesPatterns
+        # path -> (mtime_ns, size, suite, component, {package: [(version, size)]})
+        self.files = {}
+        self.packages = {}
+        self.state = None
+        self.backportsSuites = []
+        self.sourcesState = None
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def get_state(self):
+        state = []
+        for path in get_list_files(self.listsDir):
+            try:
+                st = os.stat(path)
+                state.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                continue
+        return state
+
+    def get_sources_state(self):
+        state = []
+        paths = [self.sourcesList]
+        for pattern in self.sourcesPatterns:
+            paths.extend(sorted(glob(pattern)))
+        for path in paths:
+            try:
+                st = os.stat(path)
+                state.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                continue
+        return state
+
+    def load_persisted(self):
+        try:
+            with open(self.indexPath, 'rb') as f:
+                index = pickle.load(f)
+        except (IOError, OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return {}
+        if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+            return {}
+        return index.get('files', {})
+
+    def save(self):
+        indexDir = dirname(self.indexPath)
+        if not os.path.isdir(indexDir):
+            os.makedirs(indexDir)
+        fd, tmpPath = tempfile.mkstemp(prefix='.aptlists-', dir=indexDir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump({'version': INDEX_VERSION, 'files': self.files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpPath, self.indexPath)
+        except Exception:
+            os.remove(tmpPath)
+            raise
+
+    # Bring the index up to date: only changed list files are parsed
+    def refresh(self):
+        state = self.get_state()
+        sourcesState = self.get_sources_state()
+        with self.lock:
+            if sourcesState != self.sourcesState:
+                self.backportsSuites = get_backports_suites(get_sources(self.sourcesList, self.sourcesPatterns))
+                self.sourcesState = sourcesState
+            if state == self.state:
+                return
+            if not self.files:
+                self.files = self.load_persisted()
+            files = {}
+            changed = len(self.files) != len(state)
+            self.errors = []
+            for path, mtime, size in state:
+                cached = self.files.get(path)
+                if cached is not None and cached[0] == mtime and cached[1] == size:
+                    files[path] = cached
+                    continue
+                try:
+                    suite, component = get_list_origin(path)
+                    files[path] = (mtime, size, suite, component, parse_list(path))
+                    changed = True
+                except (IOError, OSError, EOFError, lzma.LZMAError) as detail:
+                    self.errors.append(str(detail))
+            self.files = files
+
+            self.packages = {}
+            for path, (mtime, size, suite, component, packages) in sorted(files.items()):
+                for name, versions in packages.items():
+                    entries = self.packages.setdefault(name, [])
+                    for version, pkgSize in versions:
+                        entries.append((version, suite, component, pkgSize))
+            self.state = state
+
+            if changed:
+                try:
+                    self.save()
+                except (IOError, OSError):
+                    pass
+
+    def get_versions(self, package):
+        self.refresh()
+        return list(self.packages.get(package, []))
+
+    def get_highest(self, package, suites=None, exclude=()):
+        highest = ''
+        for version, suite, component, size in self.get_versions(package):
+            if (suites is None or suite in suites) and suite not in exclude:
+                if not highest or compare_versions(version, highest) > 0:
+                    highest = version
+        return highest
+
+    # Suites of the enabled Debian backports repositories
+    def get_backports_suites(self):
+        self.refresh()
+        return list(self.backportsSuites)
+
+    # Candidate as apt picks it without pinning: backports are not installed automatically
+    def get_candidate(self, package, backports=None):
+        if backports is None:
+            backports = self.get_backports_suites()
+        return self.get_highest(package, exclude=backports)
+
+    def is_available(self, package, suite):
+        return any(s == suite for version, s, component, size in self.get_versions(package))
+
+    # True if a backports suite has a newer version than the candidate
+    def has_newer(self, package, suite):
+        version = self.get_highest(package, suites=[suite])
+        if not version:
+            return False
+        candidate = self.get_candidate(package, self.get_backports_suites() + [suite])
+        return not candidate or compare_versions(version, candidate) > 0
+
+
+# Shared index
+APT_LISTS_INDEX = AptListsIndex()
+
+
+# Query the package lists from the ddm backend
+#   aptlists.py --candidate package     candidate version (empty line if not available)
+#   aptlists.py --backports package...  package/suite if a backports suite has the package, else package
+#   aptlists.py --compare a b           <0, 0 or >0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the APT package lists")
+    parser.add_argument('--candidate', metavar='PACKAGE')
+    parser.add_argument('--backports', nargs='+', metavar='PACKAGE')
+    parser.add_argument('--compare', nargs=2, metavar='VERSION')
+    parser.add_argument('--lists-dir', default=APT_LISTS)
+    parser.add_argument('--index', default=APT_INDEX)
+    args = parser.parse_args()
+    if args.compare:
+        print(compare_versions(*args.compare))
+        sys.exit(0)
+    index = AptListsIndex(args.lists_dir, args.index)
+    if args.candidate:
+        print(index.get_candidate(args.candidate))
+    if args.backports:
+        suites = index.get_backports_suites()
+        for package in args.backports:
+            target = package
+            for suite in suites:
+                if index.is_available(package, suite):
+                    target = "{}/{}".format(package, suite)
+                    break
+            print(target)
+    sys.exit(0)
@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+
+import logging
+
+# Make sure the right Gtk version is loaded
+import gi
+gi.require_version('Gtk', '3.0')
+
+from gi.repository import Gtk, Gio, GLib, GdkPixbuf
+from os.path import join, abspath, dirname, relpath, exists, isabs
+
+# Compiled resource bundle with the UI definition and the images (make resources)
+MEDIA_DIR = abspath(join(dirname(__file__), '../../share/ddm'))
+RESOURCE_FILE = 'ddm.gresource'
+RESOURCE_PREFIX = '/org/solydxk/ddm'
+
+
+class Assets(object):
+    """ UI definition and images of DDM.
+
+    The assets come from the compiled resource bundle, which GLib maps
+    into memory, or from the files in the media directory when there is
+    no bundle (source tree). Pixbufs are decoded once per (asset, height)
+    and shared by all views.
+    """
+    def __init__(self, mediaDir=MEDIA_DIR):
+        self.mediaDir = abspath(mediaDir)
+        self.resource = None
+        self.pixbufs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        if self.resource is None:
+            path = join(self.mediaDir, RESOURCE_FILE)
+            if exists(path):
+                try:
+                    self.resource = Gio.Resource.load(path)
+                    Gio.resources_register(self.resource)
+                except GLib.Error as detail:
+                    logging.getLogger('assets').error("Cannot load {}: {}".format(path, detail))
+                    self.resource = False
+            else:
+                self.resource = False
+        return bool(self.resource)
+
+    # Asset name relative to the media directory: images/nvidia.png
+    def get_name(self, asset):
+        if isabs(asset):
+            return relpath(abspath(asset), self.mediaDir)
+        return asset
+
+    def has_resource(self, name):
+        if not self.load():
+            return False
+        try:
+            self.resource.get_info(join(RESOURCE_PREFIX, name), Gio.ResourceLookupFlags.NONE)
+            return True
+        except GLib.Error:
+            return False
+
+    def get_builder(self, name='ddm.glade'):
+        builder = Gtk.Builder()
+        if self.has_resource(name):
+            builder.add_from_resource(join(RESOURCE_PREFIX, name))
+        else:
+            builder.add_from_file(join(self.mediaDir, name))
+        return builder
+
+    # Return the decoded pixbuf of an image (scaled to height), None if it does not exist
+    def get_pixbuf(self, asset, height=None):
+        key = (self.get_name(asset), height)
+        if key in self.pixbufs:
+            self.hits += 1
+            return self.pixbufs[key]
+        self.misses += 1
+        name = key[0]
+        pixbuf = None
+        try:
+            if self.has_resource(name):
+                path = join(RESOURCE_PREFIX, name)
+                if height:
+                    pixbuf = GdkPixbuf.Pixbuf.new_from_resource_at_scale(path, -1, height, True)
+                else:
+                    pixbuf = GdkPixbuf.Pixbuf.new_from_resource(path)
+            else:
+                path = asset if isabs(asset) else join(self.mediaDir, asset)
+                if exists(path):
+                    if height:
+                        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(path, -1, height, True)
+                    else:
+                        pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+        except GLib.Error as detail:
+            logging.getLogger('assets').error("Cannot load image {}: {}".format(asset, detail))
+        self.pixbufs[key] = pixbuf
+        return pixbuf
+
+
+# Shared assets
+ASSETS = Assets()
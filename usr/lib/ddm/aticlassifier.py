@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+
+import re
+import sys
+import argparse
+
+# Classification results
+PROPRIETARY = 'proprietary'
+RADEON = 'radeon'
+UNSUPPORTED = 'unsupported'
+
+# Debian Wiki: https://wiki.debian.org/ATIProprietary
+START_SERIES = 5000
+
+# AMD dropped these in Stretch
+AMD9 = ['Cedar', 'Redwood', 'Juniper', 'Cypress', 'Hemlock', 'Aruba',
+        'Trinity', 'Richland', 'Barts', 'Cayman', 'Caicos', 'Turks']
+
+# The Radeon or FirePro/FireGL part of the lspci device name
+CARD_PATTERN = r'radeon\s+[0-9a-z ]+|fire[a-z]+\s+[0-9a-z -]+'
+
+# Rules are evaluated in order on the card part of the name: the first match decides
+# (description, test, argument, result)
+#   pattern: regular expression found in the card string
+#   series:  [min, max) range of the 4 digit series number in the card string
+#   default: always matches
+ATI_RULES = [
+    ('FirePro/FireGL card', 'pattern', r'(?i)fire', PROPRIETARY),
+    ('Supported Radeon series', 'series', (START_SERIES, 10000), PROPRIETARY),
+    ('Older Radeon series', 'series', (1000, START_SERIES), RADEON),
+    ('Supported Radeon R-series', 'pattern', r' R[3-9] ', PROPRIETARY),
+    ('Older Radeon card', 'default', None, RADEON),
+]
+
+# Rules for a minimum Debian version on the full device name
+# (description, minimum Debian version, pattern, result)
+DEBIAN_RULES = [
+    ('Dropped in Stretch', 9, '|'.join(AMD9), RADEON),
+]
+
+
+class AtiCard(object):
+
+    def __init__(self, name, card='', status=UNSUPPORTED, rule='', driver='', module=''):
+        self.name = name
+        self.card = card
+        self.status = status
+        self.rule = rule
+        # Package to install and the X.org module it provides
+        self.driver = driver
+        self.module = module
+
+    def is_fire(self):
+        return 'fire' in self.card.lower()
+
+    def __repr__(self):
+        return "AtiCard({}: {} ({}))".format(self.name, self.status, self.rule)
+
+
+class AtiClassifier(object):
+
+    def __init__(self, debianVersion, rules=ATI_RULES, debianRules=DEBIAN_RULES):
+        self.debianVersion = debianVersion
+        self.cardPattern = re.compile(CARD_PATTERN, flags=re.IGNORECASE)
+        self.seriesPattern = re.compile('[0-9]{4}')
+        self.rules = [(descr, test, re.compile(arg) if test == 'pattern' else arg, result)
+                      for descr, test, arg, result in rules]
+        self.debianRules = [(descr, re.compile(pattern), result)
+                            for descr, version, pattern, result in debianRules
+                            if debianVersion >= version]
+
+        # Proprietary driver package and X.org module
+        if debianVersion < 9:
+            self.drivers = {PROPRIETARY: ('fglrx-driver', 'fglrx')}
+        else:
+            self.drivers = {PROPRIETARY: ('xserver-xorg-video-amdgpu', 'amdgpu')}
+        self.drivers[RADEON] = ('xserver-xorg-video-radeon', 'radeon')
+        self.drivers[UNSUPPORTED] = ('', '')
+
+    def match_rule(self, test, arg, card):
+        if test == 'pattern':
+            return arg.search(card) is not None
+        if test == 'series':
+            matchObj = self.seriesPattern.search(card)
+            return matchObj is not None and arg[0] <= int(matchObj.group(0)) < arg[1]
+        return test == 'default'
+
+    def classify(self, name):
+        matchObj = self.cardPattern.search(name)
+        if not matchObj:
+            return AtiCard(name, rule='No Radeon or FirePro/FireGL card')
+        card = matchObj.group(0)
+        status = UNSUPPORTED
+        rule = ''
+        for descr, test, arg, result in self.rules:
+            if self.match_rule(test, arg, card):
+                status = result
+                rule = descr
+                break
+        if status == PROPRIETARY:
+            for descr, pattern, result in self.debianRules:
+                if pattern.search(name):
+                    status = result
+                    rule = descr
+                    break
+        driver, module = self.drivers[status]
+        return AtiCard(name, card, status, rule, driver, module)
+
+    def classify_many(self, names):
+        return [self.classify(name) for name in names]
+
+
+# Classify device names (arguments or one per line on stdin)
+# Output per name: status<tab>driver<tab>card<tab>rule<tab>name (empty fields: -)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Classify ATI/AMD cards")
+    parser.add_argument('-d', '--debian-version', type=float, default=9)
+    parser.add_argument('names', nargs='*')
+    args = parser.parse_args()
+    names = args.names or [line.strip() for line in sys.stdin if line.strip()]
+    for c in AtiClassifier(args.debian_version).classify_many(names):
+        print('\t'.join([f or '-' for f in (c.status, c.driver, c.card, c.rule, c.name)]))
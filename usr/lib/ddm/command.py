@@ -0,0 +1,175 @@
+#! /usr/bin/env python3
+
+import os
+import time
+import signal
+import asyncio
+import threading
+from bisect import bisect_left
+from os.path import basename
+from tracing import TRACER
+
+# Seconds before a query is killed (installs pass timeout=None)
+DEFAULT_TIMEOUT = 30
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+class CommandResult(object):
+
+    def __init__(self, argv, returncode, stdout='', stderr='', seconds=0, timedOut=False):
+        self.argv = argv
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.seconds = seconds
+        self.timedOut = timedOut
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timedOut
+
+    # Non-empty, stripped output lines
+    def lines(self):
+        return [line.strip() for line in self.stdout.splitlines() if line.strip()]
+
+    def __repr__(self):
+        return "CommandResult({}: {}{}, {:.3f}s)".format(' '.join(self.argv), self.returncode,
+                                                        ' timed out' if self.timedOut else '', self.seconds)
+
+
+class LatencyHistogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.timeouts = 0
+
+    def add(self, seconds, timedOut=False):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if timedOut:
+            self.timeouts += 1
+
+    def get_stats(self):
+        labels = ["<={}s".format(b) for b in self.buckets] + [">{}s".format(self.buckets[-1])]
+        return {'count': self.count, 'total': self.total, 'max': self.max,
+                'mean': self.total / self.count if self.count else 0,
+                'timeouts': self.timeouts,
+                'buckets': list(zip(labels, self.counts))}
+
+
+# Latency histograms by command name (argv[0])
+HISTOGRAMS = {}
+HISTOGRAMS_LOCK = threading.Lock()
+
+
+def record_latency(name, seconds, timedOut=False):
+    with HISTOGRAMS_LOCK:
+        HISTOGRAMS.setdefault(name, LatencyHistogram()).add(seconds, timedOut)
+
+
+def get_latency_stats():
+    with HISTOGRAMS_LOCK:
+        return dict((name, h.get_stats()) for name, h in HISTOGRAMS.items())
+
+
+# One line per command, e.g.: apt-cache: 3 calls, mean 0.210s, max 0.400s, <=0.25s:2 <=0.5s:1
+def format_latency_stats():
+    lines = []
+    for name, stats in sorted(get_latency_stats().items()):
+        buckets = ' '.join("{}:{}".format(label, count) for label, count in stats['buckets'] if count)
+        lines.append("{}: {} calls, mean {:.3f}s, max {:.3f}s, {} timeouts, {}".format(
+                     name, stats['count'], stats['mean'], stats['max'], stats['timeouts'], buckets))
+    return lines
+
+
+async def run_async(argv, timeout=DEFAULT_TIMEOUT, env=None, input=None, capture=True, passFds=()):
+    """ Run argv without a shell and return a CommandResult.
+
+    env is added to the current environment. Without capture the output
+    goes to the stdout/stderr of this process. The file descriptors in
+    passFds stay open in the command. A command that is still running
+    after timeout seconds is killed together with its children: it runs
+    in its own process group.
+    """
+    argv = [str(arg) for arg in argv]
+    if env is not None:
+        env = dict(os.environ, **env)
+    pipe = asyncio.subprocess.PIPE if capture else None
+    start = time.time()
+    try:
+        proc = await asyncio.create_subprocess_exec(*argv, env=env, stdout=pipe, stderr=pipe,
+                                                    stdin=asyncio.subprocess.PIPE if input is not None else None,
+                                                    pass_fds=passFds, start_new_session=timeout is not None)
+    except OSError as detail:
+        # Command not found or not executable
+        end = time.time()
+        seconds = end - start
+        record_latency(argv[0], seconds)
+        TRACER.add("command {}".format(basename(argv[0])), start, end, code=127)
+        return CommandResult(argv, 127, stderr=str(detail), seconds=seconds)
+
+    timedOut = False
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(input.encode() if input is not None else None), timeout)
+    except asyncio.TimeoutError:
+        timedOut = True
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            # The group is gone: kill the command if it is still running
+            if proc.returncode is None:
+                proc.kill()
+        await proc.wait()
+        stdout, stderr = b'', b''
+    end = time.time()
+    seconds = end - start
+    record_latency(argv[0], seconds, timedOut)
+    TRACER.add("command {}".format(basename(argv[0])), start, end, code=proc.returncode, timedOut=timedOut)
+
+    def decode(data):
+        return data.decode('utf-8', errors='replace') if data else ''
+    return CommandResult(argv, proc.returncode, decode(stdout), decode(stderr), seconds, timedOut)
+
+
+async def run_many_async(argvs, timeout=DEFAULT_TIMEOUT, env=None):
+    return await asyncio.gather(*[run_async(argv, timeout, env) for argv in argvs])
+
+
+# One event loop in a daemon thread runs the commands of all threads
+class CommandLoop(object):
+
+    def __init__(self):
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def get_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self.loop.run_forever, name='command-loop')
+                thread.daemon = True
+                thread.start()
+        return self.loop
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop()).result()
+
+
+COMMAND_LOOP = CommandLoop()
+
+
+def run(argv, timeout=DEFAULT_TIMEOUT, env=None, input=None, capture=True, passFds=()):
+    return COMMAND_LOOP.run(run_async(argv, timeout, env, input, capture, passFds))
+
+
+# Run the commands concurrently: results are in the order of argvs
+def run_many(argvs, timeout=DEFAULT_TIMEOUT, env=None):
+    return COMMAND_LOOP.run(run_many_async(argvs, timeout, env))
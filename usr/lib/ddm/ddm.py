@@ -4,41 +4,40 @@
 import gi
 gi.require_version('Gtk', '3.0')
 
-# from gi.repository import Gtk, GdkPixbuf, GObject, Pango, Gdk, GLib
-from gi.repository import Gtk, GObject
+from gi.repository import Gtk, GObject, GLib
 from os.path import join, abspath, dirname, basename, isdir, exists
-from utils import ExecuteThreadedCommands, hasInternetConnection, \
-                  getoutput, getPackageVersion, get_backports, shell_exec, \
-                  has_newer_in_backports, get_apt_options, get_debian_version
+from bisect import bisect
+from utils import hasInternetConnection, format_cache_stats
 import os
-import re
-from glob import glob
 from dialogs import MessageDialog, WarningDialog, ErrorDialog, QuestionDialog
 from treeview import TreeViewHandler
-from queue import Queue
-from logger import Logger
+from scanner import DEVICE_EVENT, HARDWARE_EVENT, REMOVE_EVENT, DONE_EVENT
+from progress import EventReader, ProgressTracker
+from runner import CommandRunner
+from assets import ASSETS
+from profiler import PROFILER
 
 # i18n: http://docs.python.org/3/library/gettext.html
 import gettext
 from gettext import gettext as _
 gettext.textdomain('ddm')
 
-
 #class for the main window
 class DDM(object):
 
-    def __init__(self, test=False):
+    # The scanner is started by main.py and keeps running in its own thread
+    def __init__(self, scanner):
+        self.scanner = scanner
         # Testing
-        self.test = test
-        # Set to true for testing Optimus
-        self.test_optimus = False
+        self.test = scanner.test
 
         # Load window and widgets
         self.scriptName = basename(__file__)
         self.scriptDir = abspath(dirname(__file__))
         self.mediaDir = join(self.scriptDir, '../../share/ddm')
-        self.builder = Gtk.Builder()
-        self.builder.add_from_file(join(self.mediaDir, 'ddm.glade'))
+        # From the resource bundle when it is installed
+        with PROFILER.span('load Gtk.Builder'):
+            self.builder = ASSETS.get_builder('ddm.glade')
 
         # Main window objects
         go = self.builder.get_object
@@ -49,6 +48,7 @@ class DDM(object):
         self.btnLog = go("btnLog")
         self.btnQuit = go("btnQuit")
         self.pbDDM = go("pbDDM")
+        self.lblStatus = go("lblStatus")
         self.chkBackports = go("chkBackports")
 
         self.window.set_title(_("Device Driver Manager"))
@@ -59,35 +59,44 @@ class DDM(object):
         self.chkBackports.set_label(_("Use Backports"))
 
         # Initiate variables
-        self.queue = Queue(-1)
-        self.threads = {}
+        self.log = scanner.log
+        self.runner = CommandRunner(loggerObject=self.log)
+        # The running backend command (runner.Job)
+        self.job = None
+        self.logViewer = None
         self.hardware = []
+        # Hardware records by device key (PCI slot, 'pae')
+        self.hardwareByKey = {}
         self.loadedDrivers = []
         self.notSupported = []
+        self.warnings = []
         self.paeBooted = False
         self.htmlDir = join(self.mediaDir, "html")
         self.helpFile = join(self.get_language_dir(), "help.html")
-        log = getoutput("cat /usr/bin/ddm | grep 'LOG=' | cut -d'=' -f 2")
-        self.logFile = log[0]
-        self.log = Logger(self.logFile, addLogTime=False, maxSizeKB=5120)
+        self.backports = scanner.backports
         self.tvDDMHandler = TreeViewHandler(self.tvDDM)
         self.tvDDMHandler.connect('checkbox-toggled', self.tv_checkbox_toggled)
-        self.backports = get_backports()
+
+        # Treeview rows by device key (PCI slot, 'pae'): Gtk.TreeRowReference
+        self.rows = {}
+        # Sort keys of the rows: (detector, sequence number, device key)
+        self.rowOrder = []
+        self.rowCount = 0
+        # Device keys of the rows that are still being classified
+        self.scanning = set()
+
+        # Progress events of the backend: IO watch, parser and progress
+        self.eventWatch = None
+        self.eventReader = None
+        self.tracker = None
 
         # Connect builder signals and show window
         self.builder.connect_signals(self)
         self.window.show_all()
 
-        # Fill treeview
+        # Fill treeview while the scanner classifies the devices
         self.fill_treeview_ddm()
 
-        # Check backports
-        if len(self.hardware) < 2 or self.backports == '':
-            self.chkBackports.hide()
-
-        self.get_loaded_graphical_driver()
-        self.get_loaded_wireless_driver()
-
     # ===============================================
     # Language specific functions
     # ===============================================
@@ -118,64 +127,44 @@ class DDM(object):
     # ===============================================
 
     def on_btnSave_clicked(self, widget):
-        # Save selected hardware
-        arguments = []
-
-        model = self.tvDDM.get_model()
-        itr = model.get_iter_first()
-        while itr is not None:
-            action = 'no change'
-            selected = model.get_value(itr, 0)
-            device = model.get_value(itr, 2)
-            manufacturerId = ''
-
-            # Check currently selected state with initial state
-            # This decides whether we should install or purge the drivers
-            for hw in self.hardware:
-                self.log.write("Device = {} in {}".format(device, hw[2]), 'on_btnSave_clicked')
-                if device in hw[2]:
-                    hw_driver = hw[3]
-                    manufacturerId = hw[4]
-                    if hw[0] and not selected:
-                        action = 'purge'
-                    elif not hw[0] and selected:
-                        action = 'install'
-                    break
+        # While the backend runs, this is the cancel button
+        if self.job is not None:
+            self.cancel_command()
+            return True
 
-            self.log.write("{}: {} ({})".format(action, device, manufacturerId), 'on_btnSave_clicked')
-
-            # Install/purge selected driver
-            option = ""
-            if action == 'install':
-                option = "-i"
-            elif action == 'purge':
-                option = "-p"
-
-            if option:
-                driver = ''
-                # Run the manufacturer specific bash script
-                if manufacturerId == '1002':
-                    driver = 'ati'
-                elif manufacturerId == '10de':
-                    driver = 'nvidia '
-                    # If nvidia-detect needs a drivers from the backports repository
-                    # and the user didn't select the backports check box,
-                    # force the use of backports to install the appropriate drivers
-                    if 'backports' in hw_driver and not self.chkBackports.get_active():
-                        option = "-b %s" % option
-                elif manufacturerId == '14e4':
-                    driver = 'broadcom '
-                elif 'pae' in manufacturerId:
-                    driver = 'pae '
-                if driver:
-                    arguments.append("{} {}".format(option, driver))
-
-            # Get the next in line
-            itr = model.iter_next(itr)
+        # Save selected hardware in an install plan for the ddm backend
+        from installplan import InstallPlan
+        plan = InstallPlan(test=self.test)
+
+        # Compare the current selection of each row with the state of its device at scan time
+        # This decides whether we should install or purge the drivers
+        for row in self.tvDDM.get_model():
+            hw = self.hardwareByKey.get(row[3])
+            if hw is None or row[0] == hw[0]:
+                continue
+            action = 'purge' if hw[0] else 'install'
+            manufacturerId = hw[4]
+            self.log.write("{}: {} ({} {})".format(action, hw[2], manufacturerId, hw[6]), 'on_btnSave_clicked')
+
+            driver = hw[3]
+            package = ''
+            if manufacturerId == '1002':
+                package = self.scanner.atiClassifier.classify(hw[2]).driver
+            elif manufacturerId == '10de':
+                # nvidia-detect can recommend a package from backports: package/suite
+                package = driver.split('/')[0]
+                # If nvidia-detect needs a drivers from the backports repository
+                # and the user didn't select the backports check box,
+                # force the use of backports to install the appropriate drivers
+                if 'backports' in driver:
+                    plan.backports = True
+            elif manufacturerId == 'pae':
+                package = 'linux-image-686-pae'
+            plan.add(action, manufacturerId, hw[6], hw[5], driver, package)
 
         # Execute the command
-        if arguments:
-            if '-i' in arguments and not hasInternetConnection():
+        if plan.actions:
+            if any(a.action == 'install' for a in plan.actions) and not hasInternetConnection():
                 title = _("No internet connection")
                 msg = _("You need an internet connection to install the additional software.\n"
                         "Please, connect to the internet and try again.")
@@ -191,13 +180,11 @@ class DDM(object):
                     if not answer:
                         self.chkBackports.set_active(False)
                         return True
-                    arguments.append("-b")
-
-                # Testing
-                if self.test:
-                    arguments.append("-t")
+                    plan.backports = True
 
-                command = "ddm {}".format(" ".join(arguments))
+                planPath = plan.save()
+                self.log.write("Install plan: {}".format(plan.to_dict()), 'on_btnSave_clicked')
+                command = "ddm -P {}".format(planPath)
                 self.log.write("Command to execute: {}".format(command), 'on_btnSave_clicked')
                 self.exec_command("%s -g" % command)
 
@@ -206,34 +193,31 @@ class DDM(object):
 
     def on_btnHelp_clicked(self, widget):
         # Open the help file as the real user (not root)
-        shell_exec("%s/open-as-user \"%s\"" % (self.scriptDir, self.helpFile))
+        self.runner.start("%s/open-as-user \"%s\"" % (self.scriptDir, self.helpFile))
 
     def on_btnLog_clicked(self, widget):
-        # Open the log file as the real user (not root)
-        if exists('/var/log/ddm.log'):
-            shell_exec("%s/open-as-user /var/log/ddm.log" % self.scriptDir)
-
-    def get_supported_hardware(self):
-        # Fill self.hardware
-        self.hardware = []
-
-        # First row are column names
-        self.hardware.append([_("Install"), '', _("Device"), 'driver', 'manid', 'deviceid'])
-
-        # Get hardware information
-        self.get_ati()
-        self.get_nvidia()
-        self.get_broadcom()
-        self.get_pae()
+        # Show the log in the log viewer: it follows the log during an install
+        logPath = self.log.logPath or '/var/log/ddm.log'
+        if self.logViewer is not None and not self.logViewer.closed:
+            self.logViewer.present()
+        elif exists(logPath):
+            # Only imported when the log is shown
+            from logviewer import LogViewer
+            self.logViewer = LogViewer(logPath, self.window)
 
     # This method is fired by the TreeView.checkbox-toggled event
     def tv_checkbox_toggled(self, obj, path, colNr, toggleValue):
         path = int(path)
         model = self.tvDDM.get_model()
         itr = model.get_iter(path)
-        description = model[itr][2].lower()
 
-        if 'pae' in description and not toggleValue and self.paeBooted:
+        # The driver of this device is not known yet
+        key = model[itr][3]
+        if key in self.scanning:
+            model[itr][0] = not toggleValue
+            return
+
+        if key == 'pae' and not toggleValue and self.paeBooted:
             title = _("Remove kernel")
             msg = _("You cannot remove a booted kernel.\nPlease, boot another kernel and try again.")
             self.log.write(msg, 'tv_checkbox_toggled')
@@ -241,50 +225,154 @@ class DDM(object):
             model[itr][0] = True
 
     def fill_treeview_ddm(self):
-        # Fill a list with supported hardware
-        self.get_supported_hardware()
+        self.hardware = []
+        self.set_buttons_state(False)
+        self.chkBackports.hide()
 
-        # columns: checkbox, image (logo), device, driver
-        columnTypes = ['bool', 'GdkPixbuf.Pixbuf', 'str']
+        # First row are column names
+        header = [_("Install"), '', _("Device"), 'driver', 'manid', 'deviceid', 'slot']
+        self.hardware.append(header)
+
+        # columns: checkbox, image (logo), device and the device key (not shown)
+        # Create an empty list store: rows are added by handle_scan_event
+        columnTypes = ['bool', 'GdkPixbuf.Pixbuf', 'str', 'str']
+        self.tvDDMHandler.fillTreeview(contentList=[header[:3]], columnTypesList=columnTypes, firstItemIsColName=True, fontSize=12000)
+
+        # Pass the scan events to the main thread
+        GObject.timeout_add(100, self.pulse_scan)
+        self.scanner.set_listener(lambda *event: GLib.idle_add(self.handle_scan_event, *event))
+
+    def pulse_scan(self):
+        if self.scanner.done:
+            return False
+        self.pbDDM.pulse()
+        return True
+
+    # Insert a row in detector order, whatever order the detectors finish in
+    def insert_row(self, index, key, values):
+        model = self.tvDDM.get_model()
+        self.rowCount += 1
+        sortKey = (index, self.rowCount, key)
+        pos = bisect(self.rowOrder, sortKey)
+        self.rowOrder.insert(pos, sortKey)
+        itr = model.insert(pos, values + [key, 400, 12000])
+        self.rows[key] = Gtk.TreeRowReference.new(model, model.get_path(itr))
+
+    def remove_row(self, key):
+        ref = self.rows.pop(key, None)
+        self.scanning.discard(key)
+        if ref is None:
+            return
+        model = self.tvDDM.get_model()
+        if ref.valid():
+            model.remove(model.get_iter(ref.get_path()))
+        self.rowOrder = [k for k in self.rowOrder if k[2] != key]
 
-        # Keep some info from the user
-        showHw = []
-        for hw in self.hardware:
-            showHw.append([hw[0], hw[1], hw[2]])
+    # Called in the main thread for each event of the scanner
+    def handle_scan_event(self, event, index, key, data):
+        model = self.tvDDM.get_model()
+        if event == DEVICE_EVENT:
+            if key not in self.rows:
+                name, logo = data
+                self.insert_row(index, key, [False, ASSETS.get_pixbuf(logo), "{} ({})".format(name, _("scanning..."))])
+                self.scanning.add(key)
+        elif event == HARDWARE_EVENT:
+            values = [data[0], ASSETS.get_pixbuf(data[1]), data[2]]
+            self.scanning.discard(key)
+            if key in self.rows:
+                model[self.rows[key].get_path()] = values + [key, 400, 12000]
+            else:
+                self.insert_row(index, key, values)
+        elif event == REMOVE_EVENT:
+            self.remove_row(key)
+        elif event == DONE_EVENT:
+            self.scan_done(data)
+        return False
 
-        # Fill treeview
-        self.tvDDMHandler.fillTreeview(contentList=showHw, columnTypesList=columnTypes, firstItemIsColName=True, fontSize=12000)
+    def scan_done(self, scanner):
+        # Devices the detectors did not finish (a detector failed)
+        for key in list(self.scanning):
+            self.remove_row(key)
+        self.pbDDM.set_fraction(0)
+
+        self.hardware.extend(scanner.hardware)
+        self.hardwareByKey = dict((hw[6], hw) for hw in scanner.hardware)
+        self.notSupported = scanner.notSupported
+        self.warnings = scanner.warnings
+        self.paeBooted = scanner.paeBooted
+        self.log.write("Scan done: {} device(s)".format(len(self.hardware) - 1), 'scan_done')
+
+        # Show the warnings of the detectors
+        for title, msg in self.warnings:
+            WarningDialog(title, msg)
 
         # Show message if nothing is found or hardware is not supported
         title = _("Hardware scan")
+        if len(self.hardware) > 1:
+            self.set_buttons_state(True)
         if self.notSupported:
-            if len(self.hardware) < 2:
-                self.set_buttons_state(False)
             msg = _("There are no available drivers for your hardware:")
             msg = "{}\n\n{}".format(msg, '\n'.join(self.notSupported))
-            self.log.write(msg, 'fill_treeview_ddm')
+            self.log.write(msg, 'scan_done')
             WarningDialog(title, msg)
         elif len(self.hardware) < 2:
-            self.set_buttons_state(False)
             msg = _("DDM did not find any supported hardware.")
-            self.log.write(msg, 'fill_treeview_ddm')
+            self.log.write(msg, 'scan_done')
             MessageDialog(title, msg)
 
+        # Check backports
+        if len(self.hardware) > 1 and self.backports != '':
+            self.chkBackports.show()
+
     def exec_command(self, command):
         try:
-            # Run the command in a separate thread
-            self.set_buttons_state(False)
-            name = 'cmd'
-            t = ExecuteThreadedCommands([command], self.queue)
-            self.threads[name] = t
-            t.daemon = True
-            t.start()
-            self.queue.join()
-            GObject.timeout_add(250, self.check_thread, name)
+            # The install button cancels the command
+            self.btnSave.set_label(_("Cancel"))
+
+            # The backend writes its progress events to the pipe: read them in the main loop
+            readFd, writeFd = os.pipe()
+            self.eventReader = EventReader()
+            self.tracker = ProgressTracker()
+            self.eventWatch = GLib.io_add_watch(readFd, GLib.PRIORITY_DEFAULT,
+                                                GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self.on_backend_events)
+            command = "{} -e {}".format(command, writeFd)
+
+            # The runner hands the write end over to the backend and calls command_done on the main loop
+            self.job = self.runner.start(command, self.command_done, passFds=(writeFd,), name='ddm')
 
         except Exception as detail:
+            self.btnSave.set_label(_("Install"))
             ErrorDialog(self.btnSave.get_label(), detail)
 
+    def cancel_command(self):
+        answer = QuestionDialog(_("Cancel"),
+                                _("Cancelling the installation can leave packages partly installed.\n\n"
+                                  "Are you sure you want to cancel?"))
+        if answer and self.job is not None:
+            self.log.write("Cancel: {}".format(self.job), 'cancel_command')
+            self.btnSave.set_sensitive(False)
+            self.lblStatus.set_text(_("Cancelling..."))
+            self.runner.cancel(self.job)
+
+    def command_done(self, job):
+        self.log.write("Command done: {}".format(job), 'command_done')
+        self.job = None
+        self.btnSave.set_label(_("Install"))
+        if job.error:
+            # The backend could not be started or did not finish in time
+            ErrorDialog(self.btnSave.get_label(), job.error)
+        elif job.cancelled:
+            msg = _("The installation was cancelled.\n"
+                    "Please, run 'sudo apt-get -f install' in a terminal.")
+            WarningDialog(self.btnSave.get_label(), msg)
+        else:
+            # An error reported by the backend is a failure, whatever the exit code
+            ret = job.returncode
+            if ret == 0 and self.tracker is not None:
+                ret = self.tracker.get_failure_code()
+            self.show_message(ret)
+        self.set_buttons_state(True)
+
     def set_buttons_state(self, enable):
         if not enable:
             # Disable buttons
@@ -293,30 +381,38 @@ class DDM(object):
             # Enable buttons and reset progress bar
             self.btnSave.set_sensitive(True)
             self.pbDDM.set_fraction(0)
-
-    def check_thread(self, name):
-        if self.threads[name].is_alive():
-            self.pbDDM.pulse()
-            if not self.queue.empty():
-                ret = self.queue.get()
-                self.log.write("Queue returns: {}".format(ret), 'check_thread')
-                self.queue.task_done()
-                self.show_message(ret)
+            self.lblStatus.set_text('')
+
+    # Called by the IO watch when the backend wrote events or closed the pipe
+    def on_backend_events(self, fd, condition):
+        data = os.read(fd, 65536) if condition & GLib.IO_IN else b''
+        for event in self.eventReader.feed(data):
+            if event['event'] in ('error', 'dpkg-error'):
+                self.log.write("Backend error: {}".format(event), 'on_backend_events')
+            if self.tracker.update(event):
+                self.pbDDM.set_fraction(self.tracker.fraction)
+                self.lblStatus.set_text(self.get_status_text())
+        if data:
             return True
-
-        # Thread is done
-        self.log.write(">> Thread is done", 'check_thread')
-        if not self.queue.empty():
-            ret = self.queue.get()
-            self.queue.task_done()
-            self.show_message(ret)
-        del self.threads[name]
-        self.set_buttons_state(True)
-
+        # All writers are gone
+        os.close(fd)
+        self.eventWatch = None
         return False
 
+    def get_status_text(self):
+        if self.tracker.status:
+            return self.tracker.status
+        phases = {'plan': _("Planning the installation"),
+                  'pre-hooks': _("Preparing the installation"),
+                  'update': _("Updating the package lists"),
+                  'transaction': _("Installing the drivers"),
+                  'post-hooks': _("Configuring the drivers")}
+        return phases.get(self.tracker.phase, '')
+
     # Close the gui
     def on_ddmWindow_destroy(self, widget):
+        for line in format_cache_stats():
+            self.log.write("Cache: {}".format(line), 'on_ddmWindow_destroy')
         # Close the app
         Gtk.main_quit()
 
@@ -324,272 +420,6 @@ class DDM(object):
     # Hardware functions
     # ===============================================
 
-    def get_ati(self):
-        # Debian Wiki: https://wiki.debian.org/ATIProprietary
-        # Supported devices 14.9 (Jessie): http://support.amd.com/en-us/kb-articles/Pages/AMDCatalyst14-9LINReleaseNotes.aspx
-
-        manufacturerId = '1002'
-        startSeries = 5000
-        deviceArray = self.get_lspci_info(manufacturerId, 'VGA')
-
-        amd9 = 'Cedar Redwood Juniper Cypress Hemlock Aruba Trinity Richland Barts Cayman Caicos Turks'
-
-        if self.test:
-            #deviceArray = [['Advanced Micro Devices [AMD] nee ATI Manhattan [Mobility Radeon HD 5400 Series]', manufacturerId, '68e0']]
-            #deviceArray = [['Advanced Micro Devices, Inc. [AMD/ATI] RV710 [Radeon HD 4350/4550]', manufacturerId, '68e0']]
-            #deviceArray = [['Advanced Micro Devices [AMD/ATI] RS880 [Radeon HD 4290]', manufacturerId, '68e0']]
-            deviceArray = [['Advanced Micro Devices, Inc. [AMD/ATI] Tonga PRO [Radeon R9 285]', manufacturerId, '6939']]
-            #deviceArray =[['Advanced Micro Devices, Inc. [AMD/ATI] RS780L [Radeon 3000]', manufacturerId, '9616']]
-            #deviceArray = [['Advanced Micro Devices, Inc. [AMD/ATI] Bonaire [FirePro W5100]', manufacturerId, '6649']]
-
-        if deviceArray:
-            self.log.write("Device(s): {}".format(deviceArray), 'get_ati')
-            # Check if fglrx is loaded
-            # If it is: checkbox is selected
-            loadedDrv = self.get_loaded_graphical_driver()
-            self.log.write("Loaded graphical driver: {}".format(loadedDrv), 'get_ati')
-
-            # Get the manufacturer's logo
-            logo = join(self.mediaDir, 'images/ati.png')
-
-            # Fill the hardware array
-            for device in deviceArray:
-                self.log.write("ATI device found: {}".format(device[0]), 'get_ati')
-                # Check for supported cards
-                ati_found = False
-                matchObj = re.search('radeon\s+[0-9a-z ]+|fire[a-z]+\s+[0-9a-z -]+', device[0], flags=re.IGNORECASE)
-                if matchObj:
-                    if 'fire' in matchObj.group(0).lower():
-                        title = _("ATI FirePro/Gl card found")
-                        msg = _("Installing the proprietary driver for an ATI FirePro/Gl card may render your system unbootable.\n\n"
-                                "Proceed at your own risk.")
-                        self.log.write(msg, 'get_ati')
-                        WarningDialog(title, msg)
-                        ati_found = True
-                    else:
-                        # Check if ATI series is above 5000
-                        matchObjSeries = re.search('[0-9]{4}', matchObj.group(0))
-                        if matchObjSeries:
-                            ati_found = True
-                            series = int(matchObjSeries.group(0))
-                            # Don't show older ATI Radeon HD cards
-                            if series < startSeries:
-                                self.notSupported.append(device[0])
-                                continue
-                        # Check for supported R-series
-                        matchObjRSeries = re.search(' R[3-9]{1} ', matchObj.group(0))
-                        if not matchObjRSeries:
-                            ati_found = True
-                            self.notSupported.append(device[0])
-                            continue
-
-                    # Additional check for Stretch
-                    if not ati_found and get_debian_version() >= 9:
-                        for nm in amd9.split(' '):
-                            if nm in device:
-                                self.notSupported.append(device[0])
-                                continue
-
-                self.log.write("ATI series: {}".format(matchObj.group(0)), 'get_ati')
-
-                # Check if the available driver is already loaded
-                selected = False
-                driver = 'fglrx'
-                if loadedDrv == driver:
-                    selected = True
-
-                # Fill self.hardware
-                #shortDevice = self.shorten_long_string(device[0], 100)
-                self.hardware.append([selected, logo, device[0], driver, device[1], device[2]])
-
-    def get_nvidia(self):
-        manufacturerId = '10de'
-        deviceArray = self.get_lspci_info(manufacturerId, 'VGA')
-
-        if self.test:
-            #deviceArray = [['NVIDIA Corporation GT218 [GeForce G210M]', manufacturerId, '0a74']]
-            deviceArray = [['NVIDIA Corporation Device', manufacturerId, '1401']]
-            if self.test_optimus:
-                deviceArray = [['Intel Corporation Haswell-ULT Integrated Graphics Controller', '8086', '0a16'], \
-                                ['NVIDIA Corporation GK107M [GeForce GT 750M]', manufacturerId, '0fe4']]
-
-        if deviceArray:
-            optimus = False
-            devices = []
-
-            self.log.write("Device(s): {}".format(deviceArray), 'get_nvidia')
-
-            # Check if nvidia is loaded
-            # If it is: checkbox is selected
-            loadedDrv = self.get_loaded_graphical_driver()
-            self.log.write("Loaded graphical driver: {}".format(loadedDrv), 'get_nvidia')
-
-            # Get the manufacturer's logo
-            logo = join(self.mediaDir, 'images/nvidia.png')
-
-            # Fill the hardware array
-            for device in deviceArray:
-                if device[1] == '8086':
-                    optimus = True
-                else:
-                    devices.append(device)
-
-            for device in devices:
-                self.log.write("Nvidia device found: {}".format(device[0]), 'get_nvidia')
-                optimusString = ""
-                if optimus:
-                    optimusString = "(Optimus) "
-
-                # Check if the available driver is already loaded
-                selected = False
-                if optimus:
-                    if loadedDrv == 'nvidia' or loadedDrv == 'intel':
-                        bbversion = getPackageVersion("bumblebee-nvidia")
-                        self.log.write("bumblebee-nvidia version: {}".format(bbversion), 'get_nvidia')
-                        if bbversion != '':
-                            selected = True
-                elif loadedDrv == 'nvidia':
-                    selected = True
-
-                driver = ""
-                if optimus:
-                    driver = "bumblebee-nvidia"
-                else:
-                    if self.test:
-                        driver = 'nvidia-driver'
-                    else:
-                        # Install nvidia-detect from backports when available
-                        # This version will support newer models
-                        if has_newer_in_backports('nvidia-detect'):
-                            shell_exec("apt-get install -t %s %s nvidia-detect" % (self.backports, get_apt_options()))
-
-                        nv = getoutput("nvidia-detect | grep nvidia- | tr -d ' '")
-                        if nv:
-                            driver = nv[0]
-
-                self.log.write("Nvidia driver to use: {}".format(driver), 'get_nvidia')
-
-                # Fill self.hardware
-                if driver != "":
-                    #shortDevice = "{0}{1}".format(optimusString, self.shorten_long_string(device[0], 100))
-                    self.hardware.append([selected, logo, "{0}{1}".format(optimusString, device[0]), driver, device[1], device[2]])
-
-    def get_broadcom_ids(self, driver_name):
-        driver_name = driver_name.upper()
-        ids = getoutput("cat /usr/bin/ddm | grep '{}=' | cut -d'=' -f 2".format(driver_name))
-        if len(ids) > 0:
-            return ids[0].split('|')
-        return []
-
-    def get_broadcom(self):
-        ## Hardware list (device ids)
-        ## http://linuxwireless.org/en/users/Drivers/b43
-        deviceIds = {}
-        deviceIds['b43'] = self.get_broadcom_ids('b43')
-        deviceIds['b43legacy'] = self.get_broadcom_ids('b43legacy')
-        deviceIds['wldebian'] = self.get_broadcom_ids('wldebian')
-        deviceIds['brcmdebian'] = self.get_broadcom_ids('brcmdebian')
-        deviceIds['unknown'] = self.get_broadcom_ids('unknown')
-
-        self.log.write("Broadcom deviceIds = {}".format(deviceIds))
-
-        manufacturerId = '14e4'
-
-        deviceArray = self.get_lspci_info(manufacturerId)
-
-        if self.test:
-            deviceArray = [['Broadcom Corporation BCM43142 802.11a/b/g', manufacturerId, '4365']]
-
-        if deviceArray:
-            self.log.write("Device(s): {}".format(deviceArray), 'get_broadcom')
-            # Check if broadcom is loaded
-            # If it is: checkbox is selected
-            loadedDrv = self.get_loaded_wireless_driver()
-            self.log.write("Loaded wireless driver: {}".format(loadedDrv), 'get_broadcom')
-
-            # Get the manufacturer's logo
-            logo = join(self.mediaDir, 'images/broadcom.png')
-
-            # Fill the hardware array
-            for device in deviceArray:
-                self.log.write("Broadcom device found: {}".format(device[0]), 'get_broadcom')
-                driver = ''
-                for key, did in list(deviceIds.items()):
-                    #print(("{}:{} in {}:{}".format(device[0], device[2], key, did)))
-                    if device[2] in did:
-                        driver = key
-                        break
-
-                if driver != '':
-                    if driver == 'unknown':
-                        self.notSupported.append(device[0])
-                        self.log.write("Broadcom device not supported: {}".format(device[0]), 'get_broadcom')
-                    else:
-                        self.log.write("Broadcom driver to use: {}".format(driver), 'get_broadcom')
-                        # Check if the available driver is already loaded
-                        selected = False
-                        if loadedDrv == driver:
-                            selected = True
-
-                        # Fill self.hardware
-                        #shortDevice = self.shorten_long_string(device[0], 100)
-                        self.hardware.append([selected, logo, device[0], driver, device[1], device[2]])
-
-    def get_pae(self):
-        machine = getoutput('uname -m')[0]
-        release = getoutput('uname -r')[0]
-
-        if self.test:
-            machine = 'i686'
-            release = '3.16.0-4-586'
-
-        self.log.write("PAE check: machine={} / release={}".format(machine, release), 'get_pae')
-
-        if machine == 'i686':
-            # Check if PAE is installed and running
-            selected = False
-            if 'pae' in release:
-                self.paeBooted = True
-                selected = True
-            else:
-                if getPackageVersion('linux-image-686-pae') != '':
-                    selected = True
-
-            # Get the logo
-            logo = join(self.mediaDir, 'images/pae.png')
-
-            # Fill self.hardware
-            paeDescription = _("PAE capable system")
-            self.hardware.append([selected, logo, paeDescription, '', 'pae', ''])
-
-    def get_lspci_info(self, manufacturerId, filterString=''):
-        deviceArray = []
-        output = []
-
-        # Check for Optimus
-        if manufacturerId == '10de':
-            output = getoutput("lspci -vnn | grep '\[030[02]\]'")
-
-            if self.test_optimus:
-                output = ['00:02.0 VGA compatible controller [0300]: Intel Corporation Haswell-ULT Integrated Graphics Controller [8086:0a16] (rev 09) (prog-if 00 [VGA controller])', \
-                          '01:00.0 3D controller [0302]: NVIDIA Corporation GK107M [GeForce GT 750M] [10de:0fe4] (rev a1)']
-
-        # Optimus will return 2 devices
-        # If there are less than 2 devices, do regular check
-        if len(output) < 2:
-            if filterString != '':
-                filterString = " | grep {}".format(filterString)
-            output = getoutput("lspci -nn -d {}:{}".format(manufacturerId, filterString))
-
-        if output:
-            self.log.write("lspci output = {}".format(output), 'get_lspci_info')
-
-        for line in output:
-            matchObj = re.search(':\W(.*)\W\[(.+):(.+)\]', line)
-            if matchObj:
-                deviceArray.append([matchObj.group(1), matchObj.group(2), matchObj.group(3)])
-        return deviceArray
-
     def shorten_long_string(self, longString, charLen, breakOnWord=True):
         tmpArr = []
         if breakOnWord:
@@ -608,70 +438,12 @@ class DDM(object):
                 tmpArr.append(longString)
         return ' '.join(tmpArr)
 
-    # Return graphics module used by X.org
-    # TODO: is lsmod an alternative?
-    def get_loaded_graphical_driver(self):
-        # sort on the most recent X.org log
-        module = ''
-        log = ''
-        logDir = '/var/log/'
-        logPath = None
-        logs = glob(os.path.join(logDir, 'Xorg.*.log*'))
-        logs.sort()
-
-        for logPath in logs:
-            # Search for "depth" in each line and check the used module
-            # Sometimes these logs are saved as binary: open as read-only binary
-            # When opening as ascii, read() will throw error: "UnicodeDecodeError: 'utf-8' codec can't decode byte 0x80"
-            with open(logPath, 'rb') as f:
-                # replace utf-8 binary read errors (with ?)
-                log = f.read().decode(encoding='utf-8', errors='replace')
-                #print((log))
-
-            matchObj = re.search('([a-zA-Z]*)\(\d+\):\s+depth.*framebuffer', log, flags=re.IGNORECASE)
-            if matchObj:
-                module = matchObj.group(1).lower()
-                self.log.write("Log module={}".format(module))
-                break
-
-        return module
-
-    # Return used wireless driver
-    def get_loaded_wireless_driver(self):
-        driver = ''
-        logDir = '/var/log/'
-        for logPath in glob(os.path.join(logDir, 'syslog*')):
-            if driver == '' and not 'gz' in logPath:
-                # Open the log file
-                lines = []
-                with open(logPath, 'rb') as f:
-                    log = f.read().decode(encoding='utf-8', errors='replace')
-                    lines = list(log.splitlines())
-
-                for line in reversed(lines):
-                    # First check for Network Manager entry
-                    # Search for wlan0 in each line and get the listed driver
-                    matchObj = re.search('\(wlan\d\):.*driver:\s*\'([a-zA-Z0-9\-]*)', line, flags=re.IGNORECASE)
-                    if matchObj:
-                        driver = matchObj.group(1)
-                        self.log.write("Network Manager driver={}".format(driver))
-                        break
-                    else:
-                        # Wicd
-                        # Search for ieee in each line and get the listed driver
-                        matchObj = re.search('ieee.*implement', line, flags=re.IGNORECASE)
-                        if matchObj:
-                            driver = matchObj.group(0)
-                            self.log.write("Wicd driver={}".format(driver))
-                            break
-
-        return driver
-
     def show_message(self, cmdOutput):
         try:
             self.log.write("Command output: {}".format(cmdOutput), 'show_message')
             ret = int(cmdOutput)
-            if ret > 1 and ret != 255:
+            # Negative: killed by a signal
+            if ret < 0 or (ret > 0 and ret != 255):
                 if ret == 1:
                     ErrorDialog(self.btnSave.get_label(), _("Run as root."))
                 elif ret == 2:
@@ -681,7 +453,8 @@ class DDM(object):
                 elif ret == 4:
                     ErrorDialog(self.btnSave.get_label(), _("The driver cannot be found in repository."))
                 elif ret == 5:
-                    ErrorDialog(self.btnSave.get_label(), _("Download error.\nCheck your internet connection."))
+                    ErrorDialog(self.btnSave.get_label(), _("The drivers could not be downloaded or installed.\n"
+                                                             "Check your internet connection and run 'sudo apt-get -f install' in a terminal."))
                 elif ret == 6:
                     ErrorDialog(self.btnSave.get_label(), _("DDM cannot purge the driver."))
                 elif ret == 7:
@@ -690,6 +463,8 @@ class DDM(object):
                     ErrorDialog(self.btnSave.get_label(), _("Cannot get the Debian version from /etc/debian_version.\nPlease install the base-files package."))
                 elif ret == 9:
                     ErrorDialog(self.btnSave.get_label(), _("Could not configure Nvidia Bumblebee."))
+                elif ret == 10:
+                    ErrorDialog(self.btnSave.get_label(), _("The hardware changed since the scan.\nPlease, restart DDM to scan the hardware again."))
                 else:
                     msg = _("There was an error during the installation.\n"
                     "Please, run 'sudo apt-get -f install' in a terminal.\n"
@@ -0,0 +1,231 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import argparse
+import tempfile
+from os.path import join, exists, abspath, dirname
+
+# Defaults (see ddm.conf)
+DEB_CACHE = '/var/cache/ddm/debs'
+DEB_CACHE_MAX_MB = 2048
+APT_ARCHIVES = '/var/cache/apt/archives'
+DDM_CONF = join(abspath(dirname(__file__)), '../../share/ddm/ddm.conf')
+
+# apt-get --print-uris hash names
+HASHES = {'SHA512': 'sha512', 'SHA256': 'sha256', 'SHA1': 'sha1', 'MD5Sum': 'md5', 'MD5': 'md5'}
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class DebFile(object):
+
+    def __init__(self, uri, filename, size, hashType='', hashValue=''):
+        self.uri = uri
+        self.filename = filename
+        self.size = size
+        self.hashType = hashType
+        self.hashValue = hashValue
+
+    def __repr__(self):
+        return "DebFile({} {})".format(self.filename, self.size)
+
+
+# Parse the output of apt-get --print-uris:
+# 'http://deb.debian.org/debian/pool/main/b/bash/bash_4.4-5_amd64.deb' bash_4.4-5_amd64.deb 1418638 SHA256:4f2a...
+def parse_print_uris(lines):
+    debs = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 3 or not fields[0].startswith("'") or not fields[1].endswith('.deb'):
+            continue
+        hashType, hashValue = '', ''
+        if len(fields) > 3 and ':' in fields[3]:
+            hashType, hashValue = fields[3].split(':', 1)
+        size = int(fields[2]) if fields[2].isdigit() else 0
+        debs.append(DebFile(fields[0].strip("'"), fields[1], size, hashType, hashValue.lower()))
+    return debs
+
+
+# Check size and checksum of a package file
+def verify(path, deb):
+    try:
+        if deb.size and os.path.getsize(path) != deb.size:
+            return False
+        algorithm = HASHES.get(deb.hashType)
+        if algorithm is None:
+            # Without a checksum only the size can be checked
+            return deb.size > 0
+        h = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                h.update(block)
+        return h.hexdigest() == deb.hashValue
+    except (IOError, OSError):
+        return False
+
+
+# Copy through a temporary file in the same directory: never leave a partial package
+def copy_file(src, dstDir, filename):
+    fd, tmpPath = tempfile.mkstemp(prefix='.partial-', dir=dstDir)
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmpPath)
+        os.chmod(tmpPath, 0o644)
+        os.replace(tmpPath, join(dstDir, filename))
+    except Exception:
+        os.remove(tmpPath)
+        raise
+
+
+class DebCache(object):
+    """ Persistent, size bounded package cache.
+
+    Packages are looked up in the cache and the local directories (live
+    media, mirrors), verified against the checksums APT expects and
+    copied into the APT archives. After the installation the downloaded
+    packages are stored. The least recently used packages are evicted.
+    The cache directory can be shared: the index is updated under a lock.
+    """
+    def __init__(self, cacheDir=DEB_CACHE, maxSizeMB=DEB_CACHE_MAX_MB, localDirs=(), archives=APT_ARCHIVES):
+        self.cacheDir = cacheDir
+        self.maxSize = int(maxSizeMB) * 1024 * 1024
+        self.localDirs = [d for d in localDirs if d]
+        self.archives = archives
+        self.indexPath = join(cacheDir, 'index.json')
+        self.localFiles = None
+
+    # Package files in the local directories (pool directories are searched recursively)
+    def get_local_files(self):
+        if self.localFiles is None:
+            self.localFiles = {}
+            for localDir in self.localDirs:
+                for root, dirs, files in os.walk(localDir):
+                    for name in files:
+                        if name.endswith('.deb'):
+                            self.localFiles.setdefault(name, []).append(join(root, name))
+        return self.localFiles
+
+    def lock(self):
+        if not os.path.isdir(self.cacheDir):
+            os.makedirs(self.cacheDir)
+        f = open(join(self.cacheDir, '.lock'), 'w')
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def load_index(self):
+        try:
+            with open(self.indexPath) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save_index(self, index):
+        fd, tmpPath = tempfile.mkstemp(prefix='.index-', dir=self.cacheDir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmpPath, self.indexPath)
+
+    # Copy the verified packages into the APT archives
+    # Return the source of each package: archives, cache, local or network
+    def prime(self, debs):
+        sources = {}
+        with self.lock():
+            index = self.load_index()
+            for deb in debs:
+                source = 'network'
+                if verify(join(self.archives, deb.filename), deb):
+                    source = 'archives'
+                else:
+                    candidates = [('cache', join(self.cacheDir, deb.filename))]
+                    candidates += [('local', path) for path in self.get_local_files().get(deb.filename, [])]
+                    for name, path in candidates:
+                        if exists(path) and verify(path, deb):
+                            copy_file(path, self.archives, deb.filename)
+                            source = name
+                            break
+                if deb.filename in index and source in ('archives', 'cache'):
+                    index[deb.filename]['used'] = time.time()
+                sources[deb.filename] = source
+            self.save_index(index)
+        return sources
+
+    # Store the packages of the APT archives and evict the least recently used
+    def store(self, debs):
+        stored = []
+        with self.lock():
+            index = self.load_index()
+            for deb in debs:
+                path = join(self.archives, deb.filename)
+                if deb.filename not in index and verify(path, deb):
+                    copy_file(path, self.cacheDir, deb.filename)
+                    stored.append(deb.filename)
+                if deb.filename in index or deb.filename in stored:
+                    index[deb.filename] = {'size': deb.size, 'used': time.time()}
+            self.evict(index)
+            self.save_index(index)
+        return stored
+
+    def evict(self, index):
+        # Drop entries of files that were removed
+        for filename in list(index):
+            if not exists(join(self.cacheDir, filename)):
+                del index[filename]
+        total = sum(entry['size'] for entry in index.values())
+        for filename in sorted(index, key=lambda f: index[f]['used']):
+            if total <= self.maxSize:
+                break
+            total -= index[filename]['size']
+            del index[filename]
+            try:
+                os.remove(join(self.cacheDir, filename))
+            except OSError:
+                pass
+
+
+# Bytes apt-get downloads after prime: the packages that were not found
+def get_download_bytes(debs, sources):
+    return sum(deb.size for deb in debs if sources.get(deb.filename) == 'network')
+
+
+def get_config():
+    from utils import get_config_dict
+    try:
+        return get_config_dict(DDM_CONF)
+    except (IOError, OSError):
+        return {}
+
+
+# Used by the ddm backend around the APT transaction:
+#   apt-get install --print-uris -qq ... | debcache.py prime
+#   apt-get install ...
+#   apt-get install --print-uris -qq ... | debcache.py store
+if __name__ == '__main__':
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Verified package cache")
+    parser.add_argument('action', choices=['prime', 'store'])
+    parser.add_argument('--cache-dir', default=config.get('DEB_CACHE', DEB_CACHE))
+    parser.add_argument('--max-size-mb', type=int, default=int(config.get('DEB_CACHE_MAX_MB', DEB_CACHE_MAX_MB)))
+    parser.add_argument('--dirs', default=config.get('DEB_DIRS', ''), help='Space separated local directories')
+    parser.add_argument('--archives', default=APT_ARCHIVES)
+    args = parser.parse_args()
+
+    cache = DebCache(args.cache_dir, args.max_size_mb, args.dirs.split(), args.archives)
+    debs = parse_print_uris(sys.stdin)
+    if args.action == 'prime':
+        sources = cache.prime(debs)
+        for filename, source in sorted(sources.items()):
+            print("{}: {}".format(filename, source))
+        counts = dict((s, list(sources.values()).count(s)) for s in ('archives', 'cache', 'local', 'network'))
+        print("[debcache] {} packages: {archives} in archives, {cache} from cache, {local} from local directories, "
+              "{network} to download".format(len(debs), **counts))
+        print("[debcache] {} bytes to download".format(get_download_bytes(debs, sources)))
+    else:
+        stored = cache.store(debs)
+        print("[debcache] {} packages stored in {}".format(len(stored), args.cache_dir))
+    sys.exit(0)
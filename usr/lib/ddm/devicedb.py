@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+
+import re
+import sys
+from os.path import join, abspath, dirname
+
+# Default location of the device database
+DEVICE_DB = join(abspath(dirname(__file__)), '../../share/ddm/devices.db')
+
+# Supported database format
+DB_VERSION = 1
+FAMILIES = ['b43', 'b43legacy', 'wldebian', 'brcmdebian', 'unknown']
+STATUSES = ['supported', 'unsupported']
+
+ID_PATTERN = re.compile('^[0-9a-f]{4}:[0-9a-f]{4}$')
+
+
+class DeviceEntry(object):
+
+    def __init__(self, vendorId, deviceId, family, status):
+        self.vendorId = vendorId
+        self.deviceId = deviceId
+        self.family = family
+        self.status = status
+
+    def is_supported(self):
+        return self.status == 'supported'
+
+    def __repr__(self):
+        return "DeviceEntry({}:{} {} {})".format(self.vendorId, self.deviceId, self.family, self.status)
+
+
+# vendor:device -> driver family and support status
+class DeviceDatabase(object):
+
+    def __init__(self, path=DEVICE_DB):
+        self.path = path
+        self.version = None
+        self.entries = {}
+        self.errors = []
+        self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            for nr, line in enumerate(f, 1):
+                line = line.strip()
+                if line == '' or line[:1] == '#':
+                    continue
+                fields = line.split()
+                if fields[0] == 'version':
+                    self.version = int(fields[1]) if len(fields) == 2 and fields[1].isdigit() else None
+                    if self.version != DB_VERSION:
+                        self.errors.append("{}: unsupported version: {}".format(nr, line))
+                    continue
+                if len(fields) != 3:
+                    self.errors.append("{}: expected 'vendor:device family status': {}".format(nr, line))
+                    continue
+                pciId, family, status = fields
+                pciId = pciId.lower()
+                if not ID_PATTERN.match(pciId):
+                    self.errors.append("{}: invalid device id: {}".format(nr, pciId))
+                elif family not in FAMILIES:
+                    self.errors.append("{}: unknown driver family: {}".format(nr, family))
+                elif status not in STATUSES:
+                    self.errors.append("{}: unknown status: {}".format(nr, status))
+                elif pciId in self.entries:
+                    self.errors.append("{}: duplicate device id: {}".format(nr, pciId))
+                else:
+                    vendorId, deviceId = pciId.split(':')
+                    self.entries[pciId] = DeviceEntry(vendorId, deviceId, family, status)
+        if self.version is None:
+            self.errors.append("missing version line")
+
+    def lookup(self, vendorId, deviceId):
+        return self.entries.get("{}:{}".format(vendorId, deviceId).lower())
+
+    # Return the device ids of a driver family
+    def get_device_ids(self, family, vendorId=None):
+        return [e.deviceId for e in self.entries.values()
+                if e.family == family and (vendorId is None or e.vendorId == vendorId)]
+
+
+# Validate the database: devicedb.py [path]
+if __name__ == '__main__':
+    db = DeviceDatabase(sys.argv[1] if len(sys.argv) > 1 else DEVICE_DB)
+    for error in db.errors:
+        print("{}:{}".format(db.path, error))
+    if db.errors:
+        sys.exit(1)
+    print("{}: version {}, {} devices".format(db.path, db.version, len(db.entries)))
@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import mmap
+import argparse
+import threading
+from glob import glob
+from fnmatch import fnmatchcase
+from os.path import join
+
+# dpkg database: status, its backup and the journal of unprocessed updates
+DPKG_DIR = '/var/lib/dpkg'
+
+FIELDS = (b'Package', b'Status', b'Version', b'Architecture')
+
+
+class PackageStatus(object):
+
+    def __init__(self, name, status='', version='', arch=''):
+        self.name = name
+        # want flag state, e.g.: install ok installed
+        self.status = status
+        self.version = version
+        self.arch = arch
+
+    def is_installed(self):
+        # Configured, or unpacked but not (yet) configured
+        return self.status.split(' ')[-1] in ('installed', 'unpacked', 'half-configured',
+                                              'triggers-awaited', 'triggers-pending')
+
+    def __repr__(self):
+        return "PackageStatus({}:{} {} ({}))".format(self.name, self.arch, self.version, self.status)
+
+
+# Parse the stanzas of a dpkg status file without reading it into memory
+def parse_status_file(path):
+    packages = []
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return packages
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            size = len(mm)
+            while pos < size:
+                end = mm.find(b'\n\n', pos)
+                if end < 0:
+                    end = size
+                fields = {}
+                for line in mm[pos:end].split(b'\n'):
+                    # Skip continuation lines (Description, Conffiles)
+                    if line[:1] in (b' ', b'\t') or b':' not in line:
+                        continue
+                    key, value = line.split(b':', 1)
+                    if key in FIELDS:
+                        fields[key] = value.strip().decode('utf-8', errors='replace')
+                        if len(fields) == len(FIELDS):
+                            break
+                if b'Package' in fields:
+                    packages.append(PackageStatus(fields[b'Package'], fields.get(b'Status', ''),
+                                                  fields.get(b'Version', ''), fields.get(b'Architecture', '')))
+                pos = end + 2
+    return packages
+
+
+def get_native_arch(dpkgDir=DPKG_DIR):
+    # dpkg keeps the native architecture in its database since 1.16.2
+    try:
+        with open(join(dpkgDir, 'arch')) as f:
+            return f.readline().strip()
+    except (IOError, OSError):
+        return {'x86_64': 'amd64', 'i686': 'i386', 'i586': 'i386'}.get(os.uname()[4], '')
+
+
+class DpkgStatus(object):
+    """ Index of the dpkg database: package -> (status, version, architecture).
+
+    The index is built once and rebuilt when status or one of the
+    update files changes. Queries never start a process.
+    """
+    def __init__(self, dpkgDir=DPKG_DIR):
+        self.dpkgDir = dpkgDir
+        self.statusPath = join(dpkgDir, 'status')
+        self.nativeArch = get_native_arch(dpkgDir)
+        # Packages by name:arch and by name
+        self.packages = {}
+        self.byName = {}
+        self.state = None
+        self.lock = threading.Lock()
+
+    def get_state(self):
+        state = []
+        for path in [self.statusPath] + sorted(glob(join(self.dpkgDir, 'updates', '[0-9]*'))):
+            try:
+                st = os.stat(path)
+                state.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                state.append((path, None, None))
+        return tuple(state)
+
+    def load(self):
+        state = self.get_state()
+        with self.lock:
+            if state == self.state:
+                return
+            try:
+                packages = parse_status_file(self.statusPath)
+            except (IOError, OSError, ValueError):
+                # dpkg is replacing the status file: use the backup
+                try:
+                    packages = parse_status_file(join(self.dpkgDir, 'status-old'))
+                except (IOError, OSError, ValueError):
+                    packages = []
+
+            # The updates journal overrides the status file, in numeric order
+            updates = glob(join(self.dpkgDir, 'updates', '[0-9]*'))
+            for path in sorted(updates, key=lambda p: int(os.path.basename(p)) if os.path.basename(p).isdigit() else -1):
+                try:
+                    packages.extend(parse_status_file(path))
+                except (IOError, OSError, ValueError):
+                    continue
+
+            self.packages = {}
+            self.byName = {}
+            for package in packages:
+                self.packages["{}:{}".format(package.name, package.arch)] = package
+            for package in self.packages.values():
+                self.byName.setdefault(package.name, []).append(package)
+            self.state = state
+
+    # Return the package status: name or name:arch, native architecture first
+    def get(self, name):
+        self.load()
+        if ':' in name:
+            return self.packages.get(name)
+        packages = self.byName.get(name, [])
+        for package in packages:
+            if package.arch in (self.nativeArch, 'all') and package.is_installed():
+                return package
+        for package in packages:
+            if package.is_installed():
+                return package
+        return packages[0] if packages else None
+
+    def get_version(self, name):
+        package = self.get(name)
+        if package is None or not package.is_installed():
+            return ''
+        return package.version
+
+    def is_installed(self, name):
+        return self.get_version(name) != ''
+
+    # Batch query: name -> installed version ('' if not installed)
+    def get_versions(self, names):
+        return dict((name, self.get_version(name)) for name in names)
+
+    # Return the installed packages matching one of the glob patterns, e.g. *-pae, nvidia*, primus*:i386
+    # Packages of a foreign architecture are returned as name:arch
+    def match(self, patterns, exclude=(), installed=True):
+        self.load()
+        found = []
+        for key, package in sorted(self.packages.items()):
+            if installed and not package.is_installed():
+                continue
+            names = [package.name, key]
+            if any(fnmatchcase(n, p) for p in patterns for n in names) and \
+               not any(fnmatchcase(n, p) for p in exclude for n in names):
+                found.append(package)
+        return found
+
+    def get_package_name(self, package):
+        if package.arch in (self.nativeArch, 'all', ''):
+            return package.name
+        return "{}:{}".format(package.name, package.arch)
+
+
+# Shared index
+DPKG_STATUS = DpkgStatus()
+
+
+# Query the dpkg database from the ddm backend
+#   dpkgstatus.py --version package...   installed version per package (empty line if not installed)
+#   dpkgstatus.py [-x pattern] pattern...  installed packages matching the glob patterns
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query installed packages")
+    parser.add_argument('-v', '--version', action='store_true', help='Print the installed version of each package')
+    parser.add_argument('-x', '--exclude', action='append', default=[], help='Exclude packages matching this pattern')
+    parser.add_argument('--dpkg-dir', default=DPKG_DIR)
+    parser.add_argument('patterns', nargs='+')
+    args = parser.parse_args()
+    dpkg = DpkgStatus(args.dpkg_dir)
+    if args.version:
+        for name in args.patterns:
+            print(dpkg.get_version(name))
+    else:
+        for package in dpkg.match(args.patterns, args.exclude):
+            print(dpkg.get_package_name(package))
+    sys.exit(0)
@@ -0,0 +1,158 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from os.path import join, isdir
+
+PLAN_VERSION = 1
+ACTIONS = ['install', 'purge']
+
+# Driver family by manufacturer id (the PAE kernel has no device)
+FAMILIES = {'1002': 'ati', '10de': 'nvidia', '14e4': 'broadcom', 'pae': 'pae'}
+
+
+class PlanError(Exception):
+    pass
+
+
+class PlanAction(object):
+
+    def __init__(self, action, family, slot='', vendorId='', deviceId='', driver='', package=''):
+        self.action = action
+        self.family = family
+        self.slot = slot
+        self.vendorId = vendorId
+        self.deviceId = deviceId
+        # Driver found by the scan (X.org module, package or Broadcom family) and package to install
+        self.driver = driver
+        self.package = package
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return "PlanAction({} {} {} {}:{} {})".format(self.action, self.family, self.slot,
+                                                     self.vendorId, self.deviceId, self.package)
+
+
+# Installs and purges selected in the GUI, with the hardware they were chosen for
+class InstallPlan(object):
+
+    def __init__(self, actions=None, backports=False, test=False):
+        self.actions = actions or []
+        self.backports = backports
+        self.test = test
+        self.created = time.time()
+
+    def add(self, action, vendorId, slot='', deviceId='', driver='', package=''):
+        family = FAMILIES.get(vendorId)
+        if family is None:
+            raise PlanError("No driver family for manufacturer: {}".format(vendorId))
+        self.actions.append(PlanAction(action, family, slot, vendorId, deviceId, driver, package))
+
+    def to_dict(self):
+        return {'version': PLAN_VERSION, 'created': self.created, 'backports': self.backports,
+                'test': self.test, 'actions': [a.to_dict() for a in self.actions]}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict) or data.get('version') != PLAN_VERSION:
+            raise PlanError("Unsupported plan version: {}".format(data.get('version') if isinstance(data, dict) else data))
+        plan = cls(backports=bool(data.get('backports')), test=bool(data.get('test')))
+        plan.created = data.get('created', 0)
+        for a in data.get('actions', []):
+            try:
+                action = PlanAction(**a)
+            except TypeError as detail:
+                raise PlanError("Invalid action: {} ({})".format(a, detail))
+            if action.action not in ACTIONS or action.family not in FAMILIES.values():
+                raise PlanError("Invalid action: {}".format(a))
+            plan.actions.append(action)
+        return plan
+
+    # Write to a new file that only root can read and return the path
+    def save(self, directory=None):
+        fd, path = tempfile.mkstemp(prefix='ddm-plan-', suffix='.json', dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                return cls.from_dict(json.load(f))
+        except (IOError, OSError, ValueError) as detail:
+            raise PlanError("Cannot read plan {}: {}".format(path, detail))
+
+    # Check the plan against the hardware: only the sysfs ids of the planned devices are read
+    # Without sysfs, the scan used lspci: the plan is checked against lspci as well
+    def validate(self, sysfsRoot='/sys'):
+        errors = []
+        devicesDir = join(sysfsRoot, 'bus/pci/devices')
+        lspciIds = None
+        for a in self.actions:
+            if self.test or a.action == 'purge':
+                continue
+            if a.family == 'pae':
+                if os.uname()[4] != 'i686':
+                    errors.append("PAE kernel planned on a {} machine".format(os.uname()[4]))
+                continue
+            if isdir(devicesDir):
+                ids = read_sysfs_ids(join(devicesDir, a.slot))
+            else:
+                if lspciIds is None:
+                    lspciIds = get_lspci_ids()
+                ids = lspciIds.get(a.slot)
+            if ids is None:
+                errors.append("Device not found: {}".format(a.slot))
+                continue
+            if ids != [a.vendorId, a.deviceId]:
+                errors.append("Device {} is {}:{}, planned for {}:{}".format(a.slot, ids[0], ids[1], a.vendorId, a.deviceId))
+        return errors
+
+
+# Vendor and device id of a sysfs device directory (None if it does not exist)
+def read_sysfs_ids(devDir):
+    try:
+        ids = []
+        for name in ('vendor', 'device'):
+            with open(join(devDir, name)) as f:
+                ids.append(f.read().strip().lower().replace('0x', ''))
+        return ids
+    except (IOError, OSError):
+        return None
+
+
+# Vendor and device ids by slot from lspci (imported here: the backend only needs it without sysfs)
+def get_lspci_ids():
+    from pci import LspciPciBackend
+    return dict((d.slot, [d.vendorId, d.deviceId]) for d in LspciPciBackend().enumerate())
+
+
+# Validate a plan for the ddm backend and print one line per action:
+#   action<tab>family<tab>device id<tab>package (empty fields: -)
+# The first line has the options: options<tab>backports<tab>test
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validate a DDM install plan")
+    parser.add_argument('plan')
+    parser.add_argument('--sysfs', default='/sys')
+    args = parser.parse_args()
+    try:
+        plan = InstallPlan.load(args.plan)
+    except PlanError as detail:
+        print(detail, file=sys.stderr)
+        sys.exit(1)
+    errors = plan.validate(args.sysfs)
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        sys.exit(1)
+    print('\t'.join(['options', str(plan.backports).lower(), str(plan.test).lower()]))
+    for a in plan.actions:
+        print('\t'.join([f or '-' for f in (a.action, a.family, a.deviceId, a.package)]))
+    sys.exit(0)
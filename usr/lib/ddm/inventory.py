@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+
+import os
+from pci import VGA_CLASS, DISPLAY_3D_CLASS, get_loaded_modules
+
+
+# Snapshot of the hardware, built once per scan and shared by all detectors
+class HardwareInventory(object):
+
+    def __init__(self, devices, modules=None, machine=None, release=None):
+        uname = os.uname()
+        self.machine = machine or uname[4]
+        self.release = release or uname[2]
+        self.devices = list(devices)
+        self.modules = set(modules or [])
+
+        # Indexes: vendor id, PCI class and slot
+        self.byVendor = {}
+        self.byClass = {}
+        self.bySlot = {}
+        for device in self.devices:
+            self.byVendor.setdefault(device.vendorId, []).append(device)
+            self.byClass.setdefault(device.classId, []).append(device)
+            self.bySlot[device.slot] = device
+
+    @classmethod
+    def scan(cls, backend, procRoot='/proc'):
+        return cls(backend.enumerate(), get_loaded_modules(procRoot))
+
+    def get_device(self, slot):
+        return self.bySlot.get(slot)
+
+    # Return devices of a vendor and/or one of the given PCI classes
+    def get_devices(self, vendorId=None, classIds=None):
+        if vendorId is not None:
+            devices = self.byVendor.get(vendorId, [])
+            if classIds is None:
+                return list(devices)
+            return [d for d in devices if d.classId in classIds]
+        if classIds is None:
+            return list(self.devices)
+        devices = []
+        for classId in classIds:
+            devices.extend(self.byClass.get(classId, []))
+        return sorted(devices, key=lambda d: d.slot)
+
+    # Optimus: an integrated VGA controller next to an Nvidia (3D) controller
+    def get_optimus_devices(self):
+        devices = self.get_devices(classIds=[VGA_CLASS, DISPLAY_3D_CLASS])
+        if len(devices) > 1 and any(d.vendorId == '10de' for d in devices):
+            return devices
+        return []
+
+    # Module names in /proc/modules use underscores
+    def is_module_loaded(self, module):
+        return module.replace('-', '_') in self.modules
+
+    # Kernel driver of the display devices, the boot VGA device first
+    def get_display_driver(self):
+        devices = self.get_devices(classIds=[VGA_CLASS, DISPLAY_3D_CLASS])
+        for device in sorted(devices, key=lambda d: not d.bootVga):
+            if device.driver:
+                return device.driver
+        return ''
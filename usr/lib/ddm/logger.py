@@ -5,10 +5,20 @@ import pwd
 import logging
 import re
 import sys
+import time
+import queue
+import atexit
+import threading
+from logging.handlers import QueueHandler
 from shutil import move
+from logwriter import BatchFileHandler, BatchStreamHandler, LogWriter, MAX_QUEUE
+from gi.repository import GLib
 from dialogs import ErrorDialog
 from treeview import TreeViewHandler
 
+# Minimum milliseconds between two updates of the return object (label, treeview, statusbar)
+UI_INTERVAL_MS = 200
+
 
 class Logger():
 
@@ -25,9 +35,22 @@ class Logger():
         self.parent = parent
         self.maxSizeKB = maxSizeKB
 
+        # Messages for the return object, shown by the main loop at most every UI_INTERVAL_MS
+        self.uiMessages = []
+        self.uiLock = threading.Lock()
+        self.uiScheduled = False
+        self.uiUpdates = 0
+        # Messages and seconds spent in write by the callers (the time counter of the logging)
+        self.messages = 0
+        self.seconds = 0
+        self.statsLock = threading.Lock()
+
+        handlers = []
         if self.logPath == '':
             # Log only to console
-            logging.basicConfig(level=self.defaultLevel, format='%(levelname)-10s%(message)s')
+            console = BatchStreamHandler(sys.stdout)
+            console.setFormatter(logging.Formatter('%(levelname)-10s%(message)s'))
+            handlers.append(console)
         else:
             if os.path.exists(self.logPath) and self.maxSizeKB is not None:
                 b = os.path.getsize(self.logPath)
@@ -44,18 +67,29 @@ class Logger():
                 dateFmtStr = '%d-%m-%Y %H:%M:%S'
 
             # Log to file
-            logging.basicConfig(filename=self.logPath, level=self.defaultLevel, format=formatStr, datefmt=dateFmtStr)
+            logFile = BatchFileHandler(self.logPath)
+            logFile.setFormatter(logging.Formatter(formatStr, dateFmtStr))
+            handlers.append(logFile)
 
             # Define a Handler which writes INFO messages or higher to the console
             # Debug messages are written to a specified log file
-            console = logging.StreamHandler()
+            console = BatchStreamHandler(sys.stdout)
             console.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(levelname)-10s%(message)s')
-            console.setFormatter(formatter)
-            logging.getLogger('').addHandler(console)
+            console.setFormatter(logging.Formatter('%(levelname)-10s%(message)s'))
+            handlers.append(console)
+
+        # The loggers only queue the records: the writer thread writes them
+        self.queue = queue.Queue(MAX_QUEUE)
+        rootLogger = logging.getLogger('')
+        rootLogger.setLevel(self.defaultLevel)
+        rootLogger.addHandler(QueueHandler(self.queue))
+        self.writer = LogWriter(self.queue, handlers)
+        self.writer.start()
+        atexit.register(self.close)
 
     # Write message
     def write(self, message, loggerName='log', logLevel='debug', showErrorDialog=True):
+        start = time.time()
         message = str(message).strip()
         if message != '':
             logLevel = logLevel.lower()
@@ -72,33 +106,78 @@ class Logger():
                 myLogger.error(message)
                 self.rtobjectWrite(message)
                 if showErrorDialog:
-                    ErrorDialog('Error', message)
+                    GLib.idle_add(self.showErrorDialog, 'Error', message)
             elif logLevel == 'critical':
                 myLogger.critical(message)
                 self.rtobjectWrite(message)
                 if showErrorDialog:
-                    ErrorDialog('Critical', message)
+                    GLib.idle_add(self.showErrorDialog, 'Critical', message)
             elif logLevel == 'exception':
                 myLogger.exception(message)
                 self.rtobjectWrite(message)
                 if showErrorDialog:
-                    ErrorDialog('Exception', message)
-            # Flush now
-            sys.stdout.flush()
+                    GLib.idle_add(self.showErrorDialog, 'Exception', message)
+        with self.statsLock:
+            if message != '':
+                self.messages += 1
+            self.seconds += time.time() - start
+
+    # Dialogs are created by the main loop, whatever thread logs the error
+    def showErrorDialog(self, title, message):
+        ErrorDialog(title, message)
+        return False
+
+    # Wait for the writer thread to write all queued messages and stop it
+    def close(self):
+        if self.writer.is_alive():
+            if __debug__:
+                # Only in debug runs (ddm --debug): the counters are noise in the user's log
+                self.write('; '.join(self.format_stats()), 'logger', 'debug')
+            self.writer.stop(5)
 
-    # Return messge to given object
+    def get_stats(self):
+        with self.statsLock:
+            messages, seconds = self.messages, self.seconds
+        return {'messages': messages, 'seconds': seconds,
+                'batches': self.writer.batches, 'written': self.writer.records,
+                'writerSeconds': self.writer.seconds, 'uiUpdates': self.uiUpdates}
+
+    def format_stats(self):
+        stats = self.get_stats()
+        return ["{} messages in {:.3f}s".format(stats['messages'], stats['seconds']),
+                "{} records written in {} batches in {:.3f}s".format(stats['written'], stats['batches'], stats['writerSeconds']),
+                "{} return object updates".format(stats['uiUpdates'])]
+
+    # Return messge to given object: from any thread, shown by the main loop
     def rtobjectWrite(self, message):
         if self.rtobject is not None and self.typeString != '':
-            if 'label' in self.typeString.lower():
-                self.rtobject.set_text(message)
-            elif 'treeview' in self.typeString.lower():
-                tvHandler = TreeViewHandler(self.rtobject)
-                tvHandler.fillTreeview([message], ['str'], [-1], 0, 400, False, True, True, fontSize=10000)
-            elif 'statusbar' in self.typeString.lower():
-                self.pushMessage(message)
-            else:
-                # For obvious reasons: do not log this...
-                print(('Return object type not implemented: %s' % self.typeString))
+            with self.uiLock:
+                self.uiMessages.append(message)
+                if self.uiScheduled:
+                    return
+                self.uiScheduled = True
+            GLib.timeout_add(UI_INTERVAL_MS, self.flushRtobject)
+
+    # Show all messages since the last update at once
+    def flushRtobject(self):
+        with self.uiLock:
+            messages = self.uiMessages
+            self.uiMessages = []
+            self.uiScheduled = False
+        self.uiUpdates += 1
+        if 'label' in self.typeString.lower():
+            self.rtobject.set_text(messages[-1])
+        elif 'treeview' in self.typeString.lower():
+            # Newest message on top
+            tvHandler = TreeViewHandler(self.rtobject)
+            appendToExisting = self.rtobject.get_model() is not None
+            tvHandler.fillTreeview(messages, ['str'], -1, 400, False, appendToExisting, True, fontSize=10000)
+        elif 'statusbar' in self.typeString.lower():
+            self.pushMessage(messages[-1])
+        else:
+            # For obvious reasons: do not log this...
+            print(('Return object type not implemented: %s' % self.typeString))
+        return False
 
     # Return the type string of a object
     def getTypeString(self, object):
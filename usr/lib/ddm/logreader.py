@@ -0,0 +1,213 @@
+#! /usr/bin/env python3
+
+import os
+import re
+import gzip
+import mmap
+from array import array
+from glob import glob
+
+# Bytes read at a time: peak memory does not depend on the log size
+BLOCK_SIZE = 64 * 1024
+
+
+# Yield the lines of a file from last to first
+def reverse_lines(path, blockSize=BLOCK_SIZE):
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b''
+        while pos > 0:
+            size = min(blockSize, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + rest).split(b'\n')
+            # The first line can continue in the previous block
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode(encoding='utf-8', errors='replace')
+        if rest:
+            yield rest.decode(encoding='utf-8', errors='replace')
+
+
+# Yield the lines of a (gzip compressed) file from first to last
+def forward_lines(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        for line in f:
+            yield line.rstrip(b'\n').decode(encoding='utf-8', errors='replace')
+
+
+# Return the log and its rotations, newest first: syslog, syslog.1, syslog.2.gz, ...
+def get_rotated_logs(logPath):
+    def rotation(path):
+        nr = path[len(logPath):].lstrip('.').split('.')[0]
+        return int(nr) if nr.isdigit() else 0
+    logs = [p for p in glob(logPath + '*') if p == logPath or re.match(r'\.\d+(\.gz)?$', p[len(logPath):])]
+    return sorted(logs, key=rotation)
+
+
+# Return the match object of the most recent line matching one of the patterns
+# Plain files are read backwards and the search stops at the first match,
+# gzip compressed rotations are decompressed as a stream
+def find_last_match(logPaths, patterns):
+    patterns = [re.compile(p, flags=re.IGNORECASE) if isinstance(p, str) else p for p in patterns]
+
+    def match(line):
+        for pattern in patterns:
+            matchObj = pattern.search(line)
+            if matchObj:
+                return matchObj
+        return None
+
+    for logPath in logPaths:
+        try:
+            if logPath.endswith('.gz'):
+                lastMatch = None
+                for line in forward_lines(logPath):
+                    lastMatch = match(line) or lastMatch
+                if lastMatch:
+                    return lastMatch
+            else:
+                for line in reverse_lines(logPath):
+                    matchObj = match(line)
+                    if matchObj:
+                        return matchObj
+        except (IOError, OSError, EOFError):
+            continue
+    return None
+
+
+# Filters of the log view: lines of the ddm backend ([section], <<ERROR>>) and of the GUI logger (name LEVEL message)
+LEVEL_PATTERNS = {'error': rb'<<ERROR>>| ERROR | CRITICAL ',
+                  'warning': rb'<<ERROR>>| ERROR | CRITICAL | WARNING '}
+SECTION_PATTERN = re.compile(rb'^(?:\[([\w-]+)\]|([\w.-]+) +(?:DEBUG|INFO|WARNING|ERROR|CRITICAL) )', re.MULTILINE)
+
+# Bytes indexed at a time by the log view
+INDEX_CHUNK = 1024 * 1024
+
+
+# Return the patterns of the filters: a pattern to find candidate lines and one to check them
+# (level: error or warning). Without filters every complete line matches.
+def make_filters(level=None, section=None):
+    if section:
+        name = re.escape(section.encode())
+        needle = re.compile(rb'^(?:\[' + name + rb'\]|' + name + rb' +[A-Z]+ )', re.MULTILINE)
+        check = re.compile(LEVEL_PATTERNS[level]) if level else None
+        return needle, check
+    if level:
+        return re.compile(LEVEL_PATTERNS[level]), None
+    return None, None
+
+
+class LogIndex(object):
+    """ Offsets of the lines of a growing log file.
+
+    The file is mapped, not read, and indexed in chunks: update only
+    scans the bytes that were added since the last call, so a view can
+    index a large log in idle time and follow it while it grows. With
+    filters, only the offsets of the matching lines are kept. A file
+    that was truncated or rotated is indexed again.
+    """
+    def __init__(self, path, level=None, section=None):
+        self.path = path
+        self.needle, self.check = make_filters(level, section)
+        # Start of each (matching) line and the first byte that is not indexed
+        self.offsets = array('Q')
+        self.end = 0
+        self.size = None
+        self.inode = None
+        # [section] and logger names found in the log
+        self.sections = set()
+        self.map = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def reset(self):
+        self.close()
+        self.offsets = array('Q')
+        self.end = 0
+        self.sections = set()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    # Index at most maxBytes of new data and return the number of new lines
+    def update(self, maxBytes=None):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.reset()
+            self.size = 0
+            return 0
+        if st.st_ino != self.inode or st.st_size < self.end:
+            self.reset()
+            self.inode = st.st_ino
+        if st.st_size != self.size:
+            # Map the file again when it grew
+            self.close()
+            self.size = st.st_size
+        if self.size == 0 or self.end >= self.size:
+            return 0
+        if self.map is None:
+            with open(self.path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+
+        stop = self.size if maxBytes is None else min(self.size, self.end + maxBytes)
+        # Only complete lines: the last line can still be written
+        stop = self.map.rfind(b'\n', self.end, stop) + 1
+        if stop <= self.end:
+            if maxBytes is not None and self.end + maxBytes < self.size:
+                # A line longer than a chunk
+                stop = self.map.find(b'\n', self.end) + 1
+            if stop <= self.end:
+                return 0
+        count = len(self.offsets)
+        self.offsets.extend(self.find_lines(self.end, stop))
+        for m in SECTION_PATTERN.finditer(self.map, self.end, stop):
+            self.sections.add((m.group(1) or m.group(2)).decode('utf-8', errors='replace'))
+        self.end = stop
+        return len(self.offsets) - count
+
+    # Yield the start of the matching lines between two line starts
+    def find_lines(self, start, stop):
+        mm = self.map
+        if self.needle is None:
+            yield start
+            pos = mm.find(b'\n', start, stop) + 1
+            while 0 < pos < stop:
+                yield pos
+                pos = mm.find(b'\n', pos, stop) + 1
+            return
+        lineStart = -1
+        for m in self.needle.finditer(mm, start, stop):
+            if m.start() < lineStart:
+                continue
+            lineStart = mm.rfind(b'\n', start, m.start()) + 1 or start
+            lineEnd = mm.find(b'\n', m.start(), stop)
+            if self.check is None or self.check.search(mm, lineStart, lineEnd):
+                yield lineStart
+            # Skip the other matches on this line
+            lineStart = lineEnd
+
+    # All complete lines are indexed
+    def is_done(self):
+        if self.size is None:
+            # Not updated yet
+            return False
+        if self.end >= self.size:
+            return True
+        return self.map is not None and self.map.find(b'\n', self.end) < 0
+
+    # Return the lines start to start + count of the index
+    def get_lines(self, start, count):
+        lines = []
+        if self.map is None:
+            return lines
+        for offset in self.offsets[max(start, 0):start + count]:
+            end = self.map.find(b'\n', offset)
+            lines.append(self.map[offset:end].decode('utf-8', errors='replace'))
+        return lines
@@ -0,0 +1,245 @@
+#! /usr/bin/env python3
+
+# Make sure the right Gtk version is loaded
+import gi
+gi.require_version('Gtk', '3.0')
+
+from gi.repository import Gtk, Gdk, Gio, GLib
+from os.path import basename
+from logreader import LogIndex, INDEX_CHUNK
+
+# i18n: http://docs.python.org/3/library/gettext.html
+import gettext
+from gettext import gettext as _
+gettext.textdomain('ddm')
+
+# Minimum milliseconds between two updates of a growing log
+TAIL_RATE_MS = 250
+
+# Rows moved by one step of the mouse wheel
+SCROLL_ROWS = 3
+
+
+class LogViewer(object):
+    """ Window with the lines of a log.
+
+    Only the rows that fit in the window are in the list store: the
+    scroll bar moves over the line index (logreader.LogIndex), which is
+    built in idle time, so opening a large log is as fast as opening a
+    small one. While Follow is active, the view shows the end of the log
+    as it grows.
+    """
+    def __init__(self, logPath, parent=None):
+        self.logPath = logPath
+        self.index = None
+        self.indexId = 0
+        self.pageId = 0
+        self.visibleRows = 1
+        self.rowHeight = 0
+        self.sections = set()
+        self.closed = False
+        # Set while the view moves the scroll bar itself
+        self.scrolling = False
+
+        self.window = Gtk.Window(title="{} - {}".format(_("Log"), basename(logPath)))
+        self.window.set_default_size(900, 500)
+        if parent is not None:
+            self.window.set_transient_for(parent)
+            self.window.set_icon(parent.get_icon())
+        self.window.connect('destroy', self.on_destroy)
+
+        # Filters
+        self.cmbLevel = Gtk.ComboBoxText()
+        self.cmbLevel.append('', _("All messages"))
+        self.cmbLevel.append('warning', _("Warnings and errors"))
+        self.cmbLevel.append('error', _("Errors"))
+        self.cmbLevel.set_active_id('')
+        self.cmbSection = Gtk.ComboBoxText()
+        self.cmbSection.append('', _("All sections"))
+        self.cmbSection.set_active_id('')
+        self.chkFollow = Gtk.CheckButton(label=_("Follow"))
+        self.chkFollow.set_active(True)
+        self.chkFollow.connect('toggled', self.on_chkFollow_toggled)
+        self.lblLines = Gtk.Label()
+        self.cmbLevel.connect('changed', self.on_filter_changed)
+        self.cmbSection.connect('changed', self.on_filter_changed)
+
+        toolbar = Gtk.Box(spacing=10, margin=5)
+        toolbar.pack_start(self.cmbLevel, False, False, 0)
+        toolbar.pack_start(self.cmbSection, False, False, 0)
+        toolbar.pack_start(self.chkFollow, False, False, 0)
+        toolbar.pack_end(self.lblLines, False, False, 0)
+
+        # The rows in view: the scroll bar is not part of the scrolled window
+        self.store = Gtk.ListStore(str)
+        self.tvLog = Gtk.TreeView(model=self.store)
+        self.tvLog.set_headers_visible(False)
+        self.tvLog.set_enable_search(False)
+        self.renderer = Gtk.CellRendererText(family='monospace')
+        self.tvLog.append_column(Gtk.TreeViewColumn('', self.renderer, text=0))
+        self.tvLog.connect('size-allocate', self.on_size_allocate)
+        self.tvLog.connect('scroll-event', self.on_scroll)
+        self.tvLog.connect('key-press-event', self.on_key_press)
+        swLog = Gtk.ScrolledWindow()
+        swLog.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.EXTERNAL)
+        swLog.add(self.tvLog)
+
+        self.adjustment = Gtk.Adjustment(value=0, lower=0, upper=0, step_increment=1, page_increment=1, page_size=1)
+        self.adjustment.connect('value-changed', self.on_value_changed)
+        scrollbar = Gtk.Scrollbar(orientation=Gtk.Orientation.VERTICAL, adjustment=self.adjustment)
+
+        view = Gtk.Box()
+        view.pack_start(swLog, True, True, 0)
+        view.pack_start(scrollbar, False, False, 0)
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.pack_start(toolbar, False, False, 0)
+        box.pack_start(view, True, True, 0)
+        self.window.add(box)
+
+        # Follow the log: changes are reported by the file monitor
+        self.monitor = Gio.File.new_for_path(logPath).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self.monitor.set_rate_limit(TAIL_RATE_MS)
+        self.monitor.connect('changed', self.on_log_changed)
+
+        self.window.show_all()
+        self.start_index()
+
+    def present(self):
+        self.window.present()
+
+    # ===============================================
+    # Index
+    # ===============================================
+
+    def start_index(self):
+        self.stop_index()
+        if self.index is not None:
+            self.index.close()
+        level = self.cmbLevel.get_active_id() or None
+        section = self.cmbSection.get_active_id() or None
+        self.index = LogIndex(self.logPath, level, section)
+        self.indexId = GLib.idle_add(self.index_chunk)
+
+    def stop_index(self):
+        if self.indexId:
+            GLib.source_remove(self.indexId)
+            self.indexId = 0
+
+    # Index the next chunk of the log: one chunk per main loop iteration
+    def index_chunk(self):
+        end = self.index.end
+        self.index.update(INDEX_CHUNK)
+        self.update_view()
+        if self.index.is_done() or self.index.end == end:
+            self.indexId = 0
+            return False
+        return True
+
+    def on_log_changed(self, monitor, file, otherFile, eventType):
+        if not self.indexId and not self.closed:
+            self.indexId = GLib.idle_add(self.index_chunk)
+
+    # ===============================================
+    # View
+    # ===============================================
+
+    def update_view(self):
+        lines = len(self.index)
+        self.scrolling = True
+        self.adjustment.set_upper(lines)
+        self.adjustment.set_page_size(min(self.visibleRows, lines))
+        self.adjustment.set_page_increment(self.visibleRows)
+        if self.chkFollow.get_active():
+            self.adjustment.set_value(max(0, lines - self.visibleRows))
+        self.scrolling = False
+        self.load_page()
+        self.lblLines.set_text(_("{} lines").format(lines))
+
+        # Sections found in the new part of the log
+        for section in sorted(self.index.sections - self.sections):
+            self.cmbSection.append(section, section)
+        self.sections |= self.index.sections
+
+    # Put the visible lines in the list store
+    def load_page(self):
+        start = int(self.adjustment.get_value())
+        lines = self.index.get_lines(start, self.visibleRows)
+        self.tvLog.freeze_child_notify()
+        self.store.clear()
+        for line in lines:
+            self.store.append([line])
+        self.tvLog.thaw_child_notify()
+
+    def get_row_height(self):
+        if not self.rowHeight:
+            self.renderer.set_property('text', 'X')
+            height = self.renderer.get_preferred_height(self.tvLog)[1]
+            self.rowHeight = height + self.tvLog.style_get_property('vertical-separator')
+        return self.rowHeight
+
+    def on_size_allocate(self, widget, allocation):
+        rows = max(1, allocation.height // max(1, self.get_row_height()))
+        if rows != self.visibleRows:
+            self.visibleRows = rows
+            # Do not change the store while Gtk allocates sizes
+            if not self.pageId:
+                self.pageId = GLib.idle_add(self.on_page_size_changed)
+
+    def on_page_size_changed(self):
+        self.pageId = 0
+        if self.index is not None:
+            self.update_view()
+        return False
+
+    def scroll_to(self, value):
+        upper = self.adjustment.get_upper() - self.adjustment.get_page_size()
+        self.adjustment.set_value(min(max(0, value), max(0, upper)))
+
+    def on_scroll(self, widget, event):
+        value = self.adjustment.get_value()
+        if event.direction == Gdk.ScrollDirection.UP:
+            self.scroll_to(value - SCROLL_ROWS)
+        elif event.direction == Gdk.ScrollDirection.DOWN:
+            self.scroll_to(value + SCROLL_ROWS)
+        elif event.direction == Gdk.ScrollDirection.SMOOTH:
+            self.scroll_to(value + event.delta_y * SCROLL_ROWS)
+        return True
+
+    def on_key_press(self, widget, event):
+        value = self.adjustment.get_value()
+        steps = {Gdk.KEY_Up: -1, Gdk.KEY_Down: 1,
+                 Gdk.KEY_Page_Up: -self.visibleRows, Gdk.KEY_Page_Down: self.visibleRows}
+        if event.keyval in steps:
+            self.scroll_to(value + steps[event.keyval])
+        elif event.keyval == Gdk.KEY_Home:
+            self.scroll_to(0)
+        elif event.keyval == Gdk.KEY_End:
+            self.scroll_to(self.adjustment.get_upper())
+        else:
+            return False
+        return True
+
+    def on_value_changed(self, adjustment):
+        if self.scrolling or self.index is None:
+            return
+        # Scrolling up stops following the log, scrolling to the end follows it again
+        atEnd = adjustment.get_value() + adjustment.get_page_size() >= adjustment.get_upper()
+        if self.chkFollow.get_active() != atEnd:
+            self.chkFollow.set_active(atEnd)
+        self.load_page()
+
+    def on_chkFollow_toggled(self, widget):
+        if widget.get_active() and self.index is not None:
+            self.update_view()
+
+    def on_filter_changed(self, widget):
+        self.start_index()
+
+    def on_destroy(self, widget):
+        self.closed = True
+        self.stop_index()
+        if self.pageId:
+            GLib.source_remove(self.pageId)
+        self.monitor.cancel()
+        if self.index is not None:
+            self.index.close()
@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+
+import time
+import queue
+import logging
+import threading
+
+# Records written by the writer thread at once
+MAX_BATCH = 500
+
+# Queued records before write blocks the caller
+MAX_QUEUE = 10000
+
+# Tells the writer thread to stop
+STOP = None
+
+
+# Write a list of records with one write and one flush
+class BatchMixin(object):
+
+    def handle_batch(self, records):
+        lines = []
+        for record in records:
+            if record.levelno >= self.level and self.filter(record):
+                try:
+                    lines.append(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+        if not lines:
+            return
+        self.acquire()
+        try:
+            self.stream.write(''.join(lines))
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class BatchFileHandler(BatchMixin, logging.FileHandler):
+    pass
+
+
+class BatchStreamHandler(BatchMixin, logging.StreamHandler):
+    pass
+
+
+class LogWriter(threading.Thread):
+    """ Drain the log queue in batches.
+
+    The callers only put records in the queue; the file and console are
+    written here, one write per handler for all records that are queued.
+    """
+    def __init__(self, logQueue, handlers, maxBatch=MAX_BATCH):
+        super(LogWriter, self).__init__(name='log-writer')
+        self.daemon = True
+        self.queue = logQueue
+        self.handlers = handlers
+        self.maxBatch = maxBatch
+        self.batches = 0
+        self.records = 0
+        self.seconds = 0
+
+    def run(self):
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.maxBatch:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            start = time.time()
+            stop = STOP in records
+            records = [r for r in records if r is not STOP]
+            if records:
+                for handler in self.handlers:
+                    handler.handle_batch(records)
+                self.batches += 1
+                self.records += len(records)
+                self.seconds += time.time() - start
+            if stop:
+                break
+
+    # Write the queued records and stop: waits at most timeout seconds
+    def stop(self, timeout=None):
+        self.queue.put(STOP)
+        self.join(timeout)
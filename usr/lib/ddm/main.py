@@ -1,39 +1,39 @@
 #! /usr/bin/env python3 -OO
 
-# Make sure the right Gtk version is loaded
-import gi
-gi.require_version('Gtk', '3.0')
-
 import sys
-sys.path.insert(1, '/usr/lib/ddm')
-from dialogs import MessageDialog, ErrorDialog, WarningDialog
-from gi.repository import Gtk, GObject
-from ddm import DDM
 import os
 import argparse
+sys.path.insert(1, '/usr/lib/ddm')
+from profiler import PROFILER
 
 
-# i18n: http://docs.python.org/3/library/gettext.html
-import gettext
-from gettext import gettext as _
-gettext.textdomain('ddm')
-
-
-# Handle arguments
+# Handle arguments: before the other imports, so --profile-startup can time them
 parser = argparse.ArgumentParser(description="DDM")
 parser.add_argument('-t', action="store_true", help='Testing only: install drivers for pre-defined hardware')
 parser.add_argument('-f', action="store_true", help='Force DDM to start even in a live environment')
+parser.add_argument('--rescan', action="store_true", help='Scan the hardware, even if a cached scan is available')
+parser.add_argument('--profile-startup', nargs='?', const='-', metavar='FILE',
+                    help='Print the startup timeline when the window is shown, or write it to FILE as JSON')
 args, extra = parser.parse_known_args()
 test = args.t
 force = args.f
+rescan = args.rescan
+if args.profile_startup:
+    PROFILER.enable(args.profile_startup)
 
+# Make sure the right Gtk version is loaded
+with PROFILER.span('import Gtk'):
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk, GObject
+with PROFILER.span('import dialogs'):
+    from dialogs import MessageDialog, ErrorDialog, WarningDialog
 
-# Warn for the use of proprietary drivers
-title = _("Device Driver Manager")
-msg = _("Device Driver Manager helps to install proprietary drivers for your hardware.\n"
-        "Only install proprietary drivers if you are sure you really need them.\n"
-        "Usually open drivers are enough.")
-WarningDialog(title, msg, None, None, True, 'ddm')
+
+# i18n: http://docs.python.org/3/library/gettext.html
+import gettext
+from gettext import gettext as _
+gettext.textdomain('ddm')
 
 
 # Set variables
@@ -52,12 +52,38 @@ def isRunningLive():
 
 # Do not run in live environment
 if isRunningLive():
+    title = _("Device Driver Manager")
     msg = _("Device Driver Manager cannot be started in a live environment\n"
             "You can use the --force argument to start DDM in a live environment")
     MessageDialog(title, msg, None, None, True, 'ddm')
     sys.exit()
 
 
+# Start the hardware scan: it runs while the user reads the warning
+logger = PROFILER.import_module('logger')
+utils = PROFILER.import_module('utils')
+scanner = PROFILER.import_module('scanner')
+mediaDir = os.path.join(scriptDir, '../../share/ddm')
+config = utils.get_config_dict(os.path.join(mediaDir, 'ddm.conf'))
+log = logger.Logger(config['LOG'], addLogTime=False, maxSizeKB=int(config['MAX_SIZE_KB']))
+# Spans of the GUI and the backend runs it starts (ddm --stats)
+tracing = PROFILER.import_module('tracing')
+tracing.TRACER.configure(config.get('TRACE', ''))
+hardwareScanner = scanner.HardwareScanner(mediaDir, log, test, rescan)
+hardwareScanner.start()
+PROFILER.mark('scan started')
+
+
+# Warn for the use of proprietary drivers
+title = _("Device Driver Manager")
+msg = _("Device Driver Manager helps to install proprietary drivers for your hardware.\n"
+        "Only install proprietary drivers if you are sure you really need them.\n"
+        "Usually open drivers are enough.")
+with PROFILER.span('warning dialog'):
+    WarningDialog(title, msg, None, None, True, 'ddm')
+
+
+
 def uncaught_excepthook(*args):
     sys.__excepthook__(*args)
     if __debug__:
@@ -97,7 +123,12 @@ if __name__ == "__main__":
         # Debian Jessie: 3.4.2
         GObject.threads_init()
 
-        DDM(test)
+        # The window and its modules are not needed before the warning is closed
+        with PROFILER.span('import ddm'):
+            from ddm import DDM
+        with PROFILER.span('create window'):
+            app = DDM(hardwareScanner)
+        PROFILER.watch_first_paint(app.window)
         Gtk.main()
     except KeyboardInterrupt:
         pass
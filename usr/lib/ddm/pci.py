@@ -0,0 +1,182 @@
+#! /usr/bin/env python3
+
+import os
+import re
+import gzip
+from os.path import join, isdir, exists
+from utils import getoutput
+
+# PCI classes (class + subclass)
+VGA_CLASS = '0300'
+DISPLAY_3D_CLASS = '0302'
+
+# Possible locations of the PCI ID database (used for device names)
+PCI_IDS_PATHS = ['/usr/share/misc/pci.ids',
+                 '/usr/share/hwdata/pci.ids',
+                 '/usr/share/misc/pci.ids.gz']
+
+
+class PciDevice(object):
+
+    def __init__(self, slot, vendorId, deviceId, classId,
+                 subVendorId='', subDeviceId='', bootVga=False, name='', driver=''):
+        self.slot = slot
+        self.vendorId = vendorId
+        self.deviceId = deviceId
+        self.classId = classId
+        self.subVendorId = subVendorId
+        self.subDeviceId = subDeviceId
+        self.bootVga = bootVga
+        self.name = name
+        # Kernel driver bound to the device
+        self.driver = driver
+
+    def __repr__(self):
+        return "PciDevice({} [{}]: {} [{}:{}])".format(self.slot, self.classId, self.name, self.vendorId, self.deviceId)
+
+
+class PciIds(object):
+
+    def __init__(self, paths=PCI_IDS_PATHS):
+        self.path = next((p for p in paths if exists(p)), None)
+        self.vendors = {}
+        self.devices = {}
+
+    # Load the names of the given vendors only
+    # pci.ids format: "vvvv  Vendor name" followed by "\tdddd  Device name"
+    def load(self, vendorIds):
+        vendorIds = set(vendorIds) - set(self.vendors)
+        if not vendorIds or self.path is None:
+            return
+        opener = gzip.open if self.path.endswith('.gz') else open
+        vendorId = None
+        with opener(self.path, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if line[:1] == '#' or line.strip() == '':
+                    continue
+                if line[:1] != '\t':
+                    # Device classes are listed after the vendors
+                    if line[:2] == 'C ':
+                        break
+                    vendorId = line[:4].lower()
+                    if vendorId in vendorIds:
+                        self.vendors[vendorId] = line[4:].strip()
+                        vendorIds.discard(vendorId)
+                    elif not vendorIds:
+                        break
+                    else:
+                        vendorId = None
+                elif vendorId is not None and line[1:2] != '\t':
+                    self.devices[(vendorId, line[1:5].lower())] = line[5:].strip()
+
+    # Return the name the way lspci shows it
+    def get_name(self, vendorId, deviceId):
+        vendor = self.vendors.get(vendorId, "Vendor {}".format(vendorId))
+        device = self.devices.get((vendorId, deviceId), "Device {}".format(deviceId))
+        return "{} {}".format(vendor, device)
+
+
+# PCI backends: enumerate() returns a list of PciDevice objects
+class SysfsPciBackend(object):
+
+    def __init__(self, sysfsRoot='/sys', pciIds=None):
+        self.devicesDir = join(sysfsRoot, 'bus/pci/devices')
+        self.pciIds = pciIds or PciIds()
+
+    def available(self):
+        return isdir(self.devicesDir)
+
+    def read_attr(self, devDir, attr):
+        try:
+            with open(join(devDir, attr)) as f:
+                return f.read().strip()
+        except (IOError, OSError):
+            return ''
+
+    def read_driver(self, devDir):
+        # The driver attribute is a symlink to /sys/bus/pci/drivers/<driver>
+        try:
+            return os.path.basename(os.readlink(join(devDir, 'driver')))
+        except (IOError, OSError):
+            return ''
+
+    def read_id(self, devDir, attr, length=4):
+        # Attributes are hex strings: 0x10de or 0x030000
+        value = self.read_attr(devDir, attr).lower()
+        if value.startswith('0x'):
+            value = value[2:]
+        return value[:length]
+
+    def enumerate(self):
+        devices = []
+        for slot in sorted(os.listdir(self.devicesDir)):
+            devDir = join(self.devicesDir, slot)
+            devices.append(PciDevice(slot=slot,
+                                     vendorId=self.read_id(devDir, 'vendor'),
+                                     deviceId=self.read_id(devDir, 'device'),
+                                     classId=self.read_id(devDir, 'class'),
+                                     subVendorId=self.read_id(devDir, 'subsystem_vendor'),
+                                     subDeviceId=self.read_id(devDir, 'subsystem_device'),
+                                     bootVga=self.read_attr(devDir, 'boot_vga') == '1',
+                                     driver=self.read_driver(devDir)))
+
+        # Names are only needed for the vendors that are present
+        self.pciIds.load([d.vendorId for d in devices])
+        for d in devices:
+            d.name = self.pciIds.get_name(d.vendorId, d.deviceId)
+        return devices
+
+
+class LspciPciBackend(object):
+
+    # Machine readable lspci output: one "Tag:<tab>Value [id]" line per field
+    def enumerate(self):
+        devices = []
+        record = {}
+        for line in getoutput(['lspci', '-Dvmmnnk']) + ['']:
+            if line.strip() == '':
+                if 'Slot' in record:
+                    devices.append(self.to_device(record))
+                record = {}
+                continue
+            key, _, value = line.partition(':')
+            record[key.strip()] = value.strip()
+        return devices
+
+    def split_id(self, value):
+        matchObj = re.search(r'^(.*?)\s*\[([0-9a-fA-F]{4})\]$', value)
+        if matchObj:
+            return matchObj.group(1), matchObj.group(2).lower()
+        return value, ''
+
+    def to_device(self, record):
+        vendor, vendorId = self.split_id(record.get('Vendor', ''))
+        device, deviceId = self.split_id(record.get('Device', ''))
+        return PciDevice(slot=record['Slot'],
+                         vendorId=vendorId,
+                         deviceId=deviceId,
+                         classId=self.split_id(record.get('Class', ''))[1],
+                         subVendorId=self.split_id(record.get('SVendor', ''))[1],
+                         subDeviceId=self.split_id(record.get('SDevice', ''))[1],
+                         name="{} {}".format(vendor, device),
+                         driver=record.get('Driver', ''))
+
+
+# Walk sysfs when available and fall back to lspci
+def get_pci_backend(sysfsRoot='/sys'):
+    backend = SysfsPciBackend(sysfsRoot)
+    if backend.available():
+        return backend
+    return LspciPciBackend()
+
+
+# Return the names of the loaded kernel modules
+def get_loaded_modules(procRoot='/proc'):
+    modules = set()
+    try:
+        with open(join(procRoot, 'modules')) as f:
+            for line in f:
+                modules.add(line.split(' ', 1)[0])
+    except (IOError, OSError):
+        pass
+    return modules
@@ -0,0 +1,99 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import threading
+import importlib
+from contextlib import contextmanager
+
+
+# Seconds since the process started (0 when /proc is not available)
+def get_process_age():
+    try:
+        with open('/proc/self/stat') as f:
+            # The name can contain spaces: the fields after it are space separated
+            startTicks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - startTicks / os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupProfiler(object):
+    """ Timeline of the start of DDM (main.py --profile-startup).
+
+    Spans and marks are recorded in seconds since the process started,
+    from any thread. Until enable is called they are not recorded.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.output = '-'
+        self.origin = time.time() - get_process_age()
+        # name, start, end, thread name
+        self.events = []
+        self.lock = threading.Lock()
+
+    def enable(self, output='-'):
+        self.enabled = True
+        self.output = output
+        # Interpreter start and the imports before the arguments were parsed
+        self.add('interpreter start', self.origin, time.time())
+
+    def add(self, name, start, end):
+        if self.enabled:
+            with self.lock:
+                self.events.append((name, start - self.origin, end - self.origin, threading.current_thread().name))
+
+    @contextmanager
+    def span(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.time())
+
+    def mark(self, name):
+        now = time.time()
+        self.add(name, now, now)
+
+    def import_module(self, name):
+        with self.span("import {}".format(name)):
+            return importlib.import_module(name)
+
+    # Mark the first time the window is drawn and write the timeline
+    def watch_first_paint(self, window):
+        if not self.enabled:
+            return
+
+        def on_draw(widget, cr):
+            window.disconnect(handlerId)
+            self.mark('first paint')
+            self.dump()
+            return False
+        handlerId = window.connect('draw', on_draw)
+
+    def report(self):
+        with self.lock:
+            events = sorted(self.events, key=lambda e: e[1])
+        lines = ["{:>8} {:>8}  {}".format('start', 'duration', 'phase')]
+        for name, start, end, thread in events:
+            threadName = '' if thread == 'MainThread' else " [{}]".format(thread)
+            lines.append("{:7.3f}s {:7.3f}s  {}{}".format(start, end - start, name, threadName))
+        return lines
+
+    # Print the timeline ('-') or write it as JSON
+    def dump(self):
+        if self.output == '-':
+            print('\n'.join(self.report()), file=sys.stderr)
+            return
+        with self.lock:
+            events = [{'name': n, 'start': round(s, 6), 'end': round(e, 6), 'thread': t} for n, s, e, t in self.events]
+        with open(self.output, 'w') as f:
+            json.dump({'origin': self.origin, 'events': events}, f, indent=1)
+
+
+# Shared profiler
+PROFILER = StartupProfiler()
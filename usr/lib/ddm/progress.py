@@ -0,0 +1,207 @@
+#! /usr/bin/env python3
+
+import sys
+import json
+import time
+import argparse
+
+# Progress events of the ddm backend, one JSON object per line on the event fd (ddm -e fd):
+#   {"event": "phase", "phase": "update", "state": "start"}      phases: plan, pre-hooks, update, transaction, post-hooks
+#   {"event": "status", "message": "Install drivers for: nvidia"}
+#   {"event": "download", "phase": "transaction", "percent": 42.5, "bytes": 1048576, "total": 2467430, "message": "..."}
+#   {"event": "dpkg", "package": "nvidia-driver", "step": "unpack", "percent": 61.2, "message": "..."}
+#   {"event": "dpkg-error", "package": "nvidia-driver", "message": "..."}
+#   {"event": "error", "code": 100, "message": "apt-get failed"}
+#   {"event": "exit", "code": 0}
+# The download and dpkg events are converted from APT's Status-Fd by this module.
+# The error and exit events carry the (non-zero) exit code of apt-get or ddm.
+
+# Part of the progress bar per phase
+PHASE_RANGES = {'plan': (0.0, 0.02),
+                'pre-hooks': (0.02, 0.05),
+                'update': (0.05, 0.15),
+                'download': (0.15, 0.5),
+                'dpkg': (0.5, 0.95),
+                'post-hooks': (0.95, 1.0)}
+
+# dpkg steps by the first word of APT's pmstatus message (ddm runs apt-get in the C locale)
+DPKG_STEPS = {'Preparing': 'prepare', 'Unpacking': 'unpack', 'Installing': 'install', 'Installed': 'install',
+              'Configuring': 'configure', 'Removing': 'remove', 'Removed': 'remove',
+              'Purging': 'purge', 'Completely': 'purge', 'Running': 'trigger'}
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+# Convert one line of APT's Status-Fd to an event (None for lines without progress)
+#   dlstatus:<item>:<percent>:<description>
+#   pmstatus:<package>:<percent>:<description>
+#   pmerror:<package>:<percent>:<error>
+def parse_apt_status(line, phase='', downloadBytes=0):
+    fields = line.rstrip('\n').split(':', 3)
+    if len(fields) < 4:
+        return None
+    kind, item, percent, message = fields
+    percent = min(max(to_float(percent), 0.0), 100.0)
+    if kind == 'dlstatus':
+        return {'event': 'download', 'phase': phase, 'percent': percent,
+                'bytes': int(downloadBytes * percent / 100), 'total': downloadBytes, 'message': message}
+    if kind == 'pmstatus':
+        step = DPKG_STEPS.get(message.split(' ')[0], 'dpkg')
+        return {'event': 'dpkg', 'package': item, 'step': step, 'percent': percent, 'message': message}
+    if kind == 'pmerror':
+        return {'event': 'dpkg-error', 'package': item, 'message': message}
+    return None
+
+
+# Split the data read from the event fd in events: lines can arrive in parts
+class EventReader(object):
+
+    def __init__(self):
+        self.buffer = b''
+
+    def feed(self, data):
+        self.buffer += data
+        lines = self.buffer.split(b'\n')
+        self.buffer = lines.pop()
+        events = []
+        for line in lines:
+            try:
+                event = json.loads(line.decode('utf-8', errors='replace'))
+            except ValueError:
+                continue
+            if isinstance(event, dict) and 'event' in event:
+                events.append(event)
+        return events
+
+
+# Fraction (0 - 1) of the backend run and the current status, from its events
+class ProgressTracker(object):
+
+    def __init__(self):
+        self.fraction = 0.0
+        self.phase = ''
+        self.status = ''
+        self.errors = []
+        self.dpkgErrors = []
+        self.exitCode = None
+
+    def set_fraction(self, rangeName, percent):
+        start, end = PHASE_RANGES[rangeName]
+        # Never move back: the dpkg percentage restarts for each package in old APT versions
+        self.fraction = max(self.fraction, start + (end - start) * percent / 100)
+
+    # Update with an event and return True when the status changed
+    def update(self, event):
+        kind = event.get('event')
+        if kind == 'phase':
+            self.phase = event.get('phase', '')
+            if self.phase in PHASE_RANGES:
+                self.set_fraction(self.phase, 100 if event.get('state') == 'end' else 0)
+            self.status = ''
+        elif kind == 'status':
+            self.status = event.get('message', '')
+        elif kind == 'download':
+            self.set_fraction('update' if event.get('phase') == 'update' else 'download', event.get('percent', 0))
+            self.status = event.get('message', '')
+        elif kind == 'dpkg':
+            self.set_fraction('download', 100)
+            self.set_fraction('dpkg', event.get('percent', 0))
+            self.status = event.get('message', '')
+        elif kind == 'dpkg-error':
+            self.dpkgErrors.append(event)
+            self.status = event.get('message', '')
+        elif kind == 'error':
+            self.errors.append(event)
+            self.status = event.get('message', '')
+        elif kind == 'exit':
+            self.exitCode = event.get('code')
+            self.fraction = 1.0
+        else:
+            return False
+        return True
+
+    # Exit code of a failed run (0: success): the exit event or the first error with a code
+    def get_failure_code(self):
+        if self.exitCode:
+            return self.exitCode
+        for error in self.errors:
+            if error.get('code'):
+                return error['code']
+        return 0
+
+
+# Spans of an apt-get run for the trace file (tracing.py): the download, the dpkg run,
+# each dpkg step of a package (from its status line to the next one) and the DKMS builds
+class AptSpans(object):
+
+    def __init__(self, tracer, phase=''):
+        self.tracer = tracer
+        self.phase = phase
+        self.start = time.time()
+        self.dpkgStart = None
+        # Current dpkg step: step, package, start
+        self.step = None
+
+    def update(self, event, now=None):
+        if event.get('event') != 'dpkg':
+            return
+        now = now or time.time()
+        if self.dpkgStart is None:
+            self.dpkgStart = now
+            self.end_download(now)
+        self.end_step(now)
+        # Without the architecture: nvidia-kernel-dkms:amd64
+        self.step = (event['step'], event['package'].split(':')[0], now)
+
+    def end_download(self, now):
+        # The downloads of apt-get update are package lists: the backend traces the update
+        if self.phase != 'update':
+            self.tracer.add('apt download', self.start, now, phase=self.phase)
+
+    def end_step(self, now):
+        if self.step is None:
+            return
+        step, package, start = self.step
+        self.tracer.add('dpkg ' + step, start, now, package=package)
+        # The DKMS modules are built by the postinst of the -dkms package
+        if step == 'configure' and package.endswith('-dkms'):
+            self.tracer.add('dkms build', start, now, package=package)
+        self.step = None
+
+    def close(self, now=None):
+        now = now or time.time()
+        self.end_step(now)
+        if self.dpkgStart is not None:
+            self.tracer.add('dpkg', self.dpkgStart, now)
+        else:
+            self.end_download(now)
+
+
+# Used by the ddm backend: convert the Status-Fd lines of apt-get on stdin to events on stdout
+#   apt-get -o APT::Status-Fd=3 ... 3>&1 | progress.py --phase transaction --download-bytes 123456
+# With --trace, the spans of the run are appended to the trace file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert APT status lines to DDM progress events")
+    parser.add_argument('--phase', default='')
+    parser.add_argument('--download-bytes', type=int, default=0)
+    parser.add_argument('--trace', default='', help='Trace file')
+    args = parser.parse_args()
+    spans = None
+    if args.trace:
+        from tracing import Tracer
+        spans = AptSpans(Tracer(args.trace, source='ddm'), args.phase)
+    for line in sys.stdin:
+        event = parse_apt_status(line, args.phase, args.download_bytes)
+        if event is not None:
+            sys.stdout.write(json.dumps(event) + '\n')
+            sys.stdout.flush()
+            if spans is not None:
+                spans.update(event)
+    if spans is not None:
+        spans.close()
+    sys.exit(0)
@@ -0,0 +1,169 @@
+#! /usr/bin/env python3
+
+import os
+import time
+import signal
+import subprocess
+from collections import deque
+from gi.repository import GLib
+from utils import get_argv
+from command import record_latency
+from tracing import TRACER
+
+# Seconds between SIGTERM and SIGKILL when a command is cancelled
+KILL_DELAY = 10
+
+# Commands running at the same time, the others wait in line
+MAX_JOBS = 2
+
+
+class Job(object):
+
+    def __init__(self, argv, callback, timeout=None, passFds=(), name=''):
+        self.argv = argv
+        self.callback = callback
+        self.timeout = timeout
+        self.passFds = passFds
+        self.name = name or os.path.basename(argv[0])
+        self.proc = None
+        self.returncode = None
+        self.started = 0
+        self.seconds = 0
+        self.cancelled = False
+        self.timedOut = False
+        # Why the command did not run or did not finish (spawn failure, timeout)
+        self.error = ''
+        # GLib source ids of the timeout and the SIGKILL
+        self.timeoutId = 0
+        self.killId = 0
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc is not None else None
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.cancelled
+
+    def __repr__(self):
+        return "Job({}: {}{}{})".format(' '.join(self.argv), self.returncode,
+                                        ' cancelled' if self.cancelled else '',
+                                        ' timed out' if self.timedOut else '')
+
+
+class CommandRunner(object):
+    """ Run commands without blocking the GLib main loop.
+
+    The end of a command is reported by a GLib child watch: the callback
+    runs on the main loop with the finished Job, nothing is polled. Each
+    command runs in its own process group, so a cancel (SIGTERM, then
+    SIGKILL after KILL_DELAY seconds) reaches its child processes too.
+    The file descriptors in passFds are handed over to the command: they
+    are closed in this process once the command started. Spawn failures
+    and timeouts are logged and set job.error; the logger shows them in a
+    dialog when the job has no callback to handle them.
+    """
+    def __init__(self, maxJobs=MAX_JOBS, killDelay=KILL_DELAY, loggerObject=None):
+        self.maxJobs = maxJobs
+        self.killDelay = killDelay
+        self.log = loggerObject
+        self.running = []
+        self.waiting = deque()
+
+    def start(self, command, callback=None, timeout=None, passFds=(), name=''):
+        job = Job(get_argv(command), callback, timeout, tuple(passFds), name)
+        self.waiting.append(job)
+        self.start_waiting()
+        return job
+
+    def start_waiting(self):
+        while self.waiting and len(self.running) < self.maxJobs:
+            job = self.waiting.popleft()
+            job.started = time.time()
+            try:
+                job.proc = subprocess.Popen(job.argv, pass_fds=job.passFds, start_new_session=True)
+            except OSError as detail:
+                # Command not found or not executable: report it like a finished command
+                self.report_error(job, "Cannot start {}: {}".format(job.argv[0], detail))
+                job.returncode = 127
+                self.close_fds(job)
+                GLib.idle_add(self.notify, job)
+                continue
+            self.close_fds(job)
+            self.running.append(job)
+            GLib.child_watch_add(GLib.PRIORITY_DEFAULT, job.proc.pid, self.on_child_exit, job)
+            if job.timeout:
+                job.timeoutId = GLib.timeout_add_seconds(job.timeout, self.on_timeout, job)
+
+    def close_fds(self, job):
+        for fd in job.passFds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def on_child_exit(self, pid, status, job):
+        # The child watch reaped the process: tell Popen
+        if os.WIFEXITED(status):
+            job.returncode = os.WEXITSTATUS(status)
+        else:
+            job.returncode = -os.WTERMSIG(status)
+        job.proc.returncode = job.returncode
+        end = time.time()
+        job.seconds = end - job.started
+        record_latency(job.name, job.seconds, job.timedOut)
+        TRACER.add("job {}".format(job.name), job.started, end, code=job.returncode, cancelled=job.cancelled)
+        for sourceId in (job.timeoutId, job.killId):
+            if sourceId:
+                GLib.source_remove(sourceId)
+        job.timeoutId = job.killId = 0
+        self.running.remove(job)
+        self.notify(job)
+        self.start_waiting()
+
+    def notify(self, job):
+        if job.callback is not None:
+            job.callback(job)
+        return False
+
+    def on_timeout(self, job):
+        job.timeoutId = 0
+        job.timedOut = True
+        self.report_error(job, "Timeout after {}s: {}".format(job.timeout, ' '.join(job.argv)))
+        self.cancel(job)
+        return False
+
+    def report_error(self, job, message):
+        job.error = message
+        if self.log:
+            self.log.write(message, 'runner', 'error', showErrorDialog=job.callback is None)
+
+    # Stop a command: a waiting command is never started
+    def cancel(self, job):
+        if job.returncode is not None or job.cancelled:
+            return
+        job.cancelled = True
+        if job in self.waiting:
+            self.waiting.remove(job)
+            self.close_fds(job)
+            job.returncode = -signal.SIGTERM
+            GLib.idle_add(self.notify, job)
+            return
+        self.send_signal(job, signal.SIGTERM)
+        job.killId = GLib.timeout_add_seconds(self.killDelay, self.on_kill, job)
+
+    def on_kill(self, job):
+        job.killId = 0
+        self.send_signal(job, signal.SIGKILL)
+        return False
+
+    def send_signal(self, job, sig):
+        try:
+            os.killpg(job.proc.pid, sig)
+        except OSError:
+            # Already gone
+            pass
+
+    def cancel_all(self):
+        for job in list(self.waiting) + list(self.running):
+            self.cancel(job)
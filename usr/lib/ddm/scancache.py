@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+
+import os
+import json
+import hashlib
+import tempfile
+from os.path import dirname
+
+# Default location of the persistent scan result
+SCAN_CACHE = '/var/cache/ddm/scan.json'
+CACHE_VERSION = 2
+
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+# The key changes with the PCI topology, the running kernel,
+# the installed packages and the available packages
+def get_scan_key(inventory, dpkgStatus='/var/lib/dpkg/status', aptLists='/var/lib/apt/lists'):
+    h = hashlib.sha256()
+    for d in inventory.devices:
+        h.update("{} {}:{} {} {}:{} {}\n".format(d.slot, d.vendorId, d.deviceId, d.classId,
+                                                 d.subVendorId, d.subDeviceId, d.driver).encode())
+    h.update("{} {}\n".format(inventory.machine, inventory.release).encode())
+    h.update("{} {}\n".format(get_mtime(dpkgStatus), get_mtime(aptLists)).encode())
+    return h.hexdigest()
+
+
+class ScanCache(object):
+
+    def __init__(self, path=SCAN_CACHE):
+        self.path = path
+
+    # Return the cached scan result if it was saved with the same key
+    def load(self, key):
+        try:
+            with open(self.path) as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION or cache.get('key') != key:
+            return None
+        return cache.get('data')
+
+    # Write to a temporary file and rename: readers never see a partial file
+    def save(self, key, data):
+        cacheDir = dirname(self.path)
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        fd, tmpPath = tempfile.mkstemp(prefix='.scan-', dir=cacheDir)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'key': key, 'data': data}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpPath, self.path)
+        except Exception:
+            os.remove(tmpPath)
+            raise
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,481 @@
+#! /usr/bin/env python3
+
+import time
+import threading
+from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+from utils import getPackageVersion, get_backports, shell_exec, \
+                  get_nvidia_detect_driver, has_newer_in_backports, get_apt_options, get_debian_version, \
+                  get_xorg_log_driver, get_syslog_wireless_driver
+from pci import PciDevice, get_pci_backend, VGA_CLASS, DISPLAY_3D_CLASS
+from inventory import HardwareInventory
+from devicedb import DeviceDatabase
+from aticlassifier import AtiClassifier, PROPRIETARY
+from scancache import ScanCache, get_scan_key
+from command import format_latency_stats
+from profiler import PROFILER
+from tracing import TRACER
+
+# i18n: http://docs.python.org/3/library/gettext.html
+import gettext
+from gettext import gettext as _
+gettext.textdomain('ddm')
+
+# X.org driver names of the kernel display drivers
+XORG_DRIVERS = {'i915': 'intel', 'nvidia': 'nvidia', 'fglrx': 'fglrx',
+                'radeon': 'radeon', 'amdgpu': 'amdgpu', 'nouveau': 'nouveau'}
+
+# Kernel modules of the Broadcom driver families
+BROADCOM_MODULES = {'b43': 'b43', 'b43legacy': 'b43legacy',
+                    'wldebian': 'wl', 'brcmdebian': 'brcmsmac'}
+
+# Maximum number of detectors that run at the same time
+MAX_DETECTOR_WORKERS = 4
+
+# Scan events passed to the listener: (event, detector index, key, data)
+#   device:      a device is being classified (data: name, logo)
+#   hardware:    a supported device (data: hardware row)
+#   remove:      the device has no driver or is not supported (data: None)
+#   done:        the scan is finished (data: the scanner itself)
+DEVICE_EVENT = 'device'
+HARDWARE_EVENT = 'hardware'
+REMOVE_EVENT = 'remove'
+DONE_EVENT = 'done'
+
+
+# Hardware found by a single detector
+class DetectorResult(object):
+
+    def __init__(self, name, index, emit):
+        self.name = name
+        self.index = index
+        self.emit = emit
+        self.hardware = []
+        self.notSupported = []
+        self.warnings = []
+        self.paeBooted = False
+        self.seconds = 0
+
+    def add_devices(self, devices, logo):
+        for device in devices:
+            self.emit(DEVICE_EVENT, self.index, device.slot, (device.name, logo))
+
+    def add_hardware(self, key, row):
+        self.hardware.append(row)
+        self.emit(HARDWARE_EVENT, self.index, key, row)
+
+    def add_not_supported(self, key, name):
+        self.notSupported.append(name)
+        self.remove_device(key)
+
+    def remove_device(self, key):
+        self.emit(REMOVE_EVENT, self.index, key, None)
+
+
+# Scan the hardware in a background thread
+# Hardware rows: [selected, logo, description, driver, manufacturer id, device id, slot]
+class HardwareScanner(object):
+
+    def __init__(self, mediaDir, log, test=False, rescan=False):
+        # Testing
+        self.test = test
+        # Ignore the cached scan result
+        self.rescan = rescan
+        # Set to true for testing Optimus
+        self.test_optimus = False
+
+        self.mediaDir = mediaDir
+        self.log = log
+        self.hardware = []
+        self.notSupported = []
+        self.warnings = []
+        self.paeBooted = False
+        self.done = False
+        self.deviceDb = DeviceDatabase(join(self.mediaDir, 'devices.db'))
+        self.atiClassifier = AtiClassifier(get_debian_version())
+        self.pciBackend = get_pci_backend()
+        self.inventory = None
+        self.scanCache = ScanCache()
+        self.backports = get_backports()
+        self.graphicalDriver = None
+        self.wirelessDriver = None
+        self.graphicalLock = threading.Lock()
+        self.wirelessLock = threading.Lock()
+
+        # Events are kept until a listener is set
+        self.events = []
+        self.listener = None
+        self.eventLock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.scan)
+        thread.daemon = True
+        thread.start()
+
+    # The listener is called from the scanner thread,
+    # starting with the events that were emitted before
+    def set_listener(self, listener):
+        with self.eventLock:
+            for event in self.events:
+                listener(*event)
+            self.events = []
+            self.listener = listener
+
+    def emit(self, event, index, key, data):
+        with self.eventLock:
+            if self.listener is None:
+                self.events.append((event, index, key, data))
+            else:
+                self.listener(event, index, key, data)
+
+    def scan(self):
+        try:
+            self.get_supported_hardware()
+        finally:
+            self.done = True
+            self.emit(DONE_EVENT, None, None, self)
+
+    def get_supported_hardware(self):
+        # Fill self.hardware
+        self.hardware = []
+        self.notSupported = []
+        self.warnings = []
+        self.paeBooted = False
+
+        # Take one snapshot of the hardware for all detectors
+        self.inventory = HardwareInventory.scan(self.pciBackend)
+        self.graphicalDriver = None
+        self.wirelessDriver = None
+
+        # Use the previous scan if hardware and packages did not change
+        scanKey = get_scan_key(self.inventory)
+        if not self.test and not self.rescan:
+            data = self.scanCache.load(scanKey)
+            if data is not None:
+                self.log.write("Use cached scan: {}".format(self.scanCache.path), 'get_supported_hardware')
+                for row in data['hardware']:
+                    self.hardware.append(row)
+                    self.emit(HARDWARE_EVENT, 0, row[6], row)
+                self.notSupported = data['notSupported']
+                self.warnings = data['warnings']
+                self.paeBooted = data['paeBooted']
+                return
+
+        # Get hardware information
+        self.install_detector_packages()
+        self.run_detectors([self.get_ati, self.get_nvidia, self.get_broadcom, self.get_pae])
+
+        if not self.test:
+            data = {'hardware': self.hardware,
+                    'notSupported': self.notSupported,
+                    'warnings': self.warnings,
+                    'paeBooted': self.paeBooted}
+            try:
+                self.scanCache.save(scanKey, data)
+            except (IOError, OSError) as detail:
+                self.log.write("Cannot save scan: {}".format(detail), 'get_supported_hardware', 'warning')
+
+    # Packages the detectors need are installed before the detectors run, one at a time:
+    # apt-get takes the dpkg lock and must not run while the detectors query dpkg
+    def install_detector_packages(self):
+        if self.test:
+            return
+        devices = self.get_lspci_info('10de', [VGA_CLASS])
+        # Optimus uses bumblebee-nvidia: nvidia-detect is not needed
+        if devices and not any(device.vendorId == '8086' for device in devices):
+            # Install nvidia-detect from backports when available
+            # This version will support newer models
+            if has_newer_in_backports('nvidia-detect'):
+                shell_exec(['apt-get', 'install', '-t', self.backports] + get_apt_options().split() + ['nvidia-detect'])
+
+    # Run the detectors concurrently and merge the results in the given order
+    def run_detectors(self, detectors):
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=MAX_DETECTOR_WORKERS) as executor:
+            futures = [executor.submit(self.run_detector, detector, index) for index, detector in enumerate(detectors)]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            self.hardware.extend(result.hardware)
+            self.notSupported.extend(result.notSupported)
+            self.warnings.extend(result.warnings)
+            self.paeBooted = self.paeBooted or result.paeBooted
+        end = time.time()
+        PROFILER.add('detectors', start, end)
+        TRACER.add('detectors', start, end)
+        self.log.write("Detectors done in {:.3f}s".format(end - start), 'run_detectors')
+        for line in format_latency_stats():
+            self.log.write("Command latency: {}".format(line), 'run_detectors')
+
+    def run_detector(self, detector, index):
+        result = DetectorResult(detector.__name__, index, self.emit)
+        start = time.time()
+        detector(result)
+        end = time.time()
+        result.seconds = end - start
+        PROFILER.add("detector {}".format(result.name), start, end)
+        TRACER.add(result.name, start, end, devices=len(result.hardware))
+        self.log.write("{} done in {:.3f}s".format(result.name, result.seconds), 'run_detectors')
+        return result
+
+    # ===============================================
+    # Hardware functions
+    # ===============================================
+
+    def get_ati(self, result):
+        # Debian Wiki: https://wiki.debian.org/ATIProprietary
+        # Supported devices 14.9 (Jessie): http://support.amd.com/en-us/kb-articles/Pages/AMDCatalyst14-9LINReleaseNotes.aspx
+
+        # Classification rules: aticlassifier.py (shared with the ddm backend)
+        manufacturerId = '1002'
+        deviceArray = self.get_lspci_info(manufacturerId, [VGA_CLASS])
+
+        if self.test:
+            #deviceArray = [PciDevice('0000:04:00.0', manufacturerId, '68e0', VGA_CLASS, name='Advanced Micro Devices [AMD] nee ATI Manhattan [Mobility Radeon HD 5400 Series]')]
+            #deviceArray = [PciDevice('0000:04:00.0', manufacturerId, '68e0', VGA_CLASS, name='Advanced Micro Devices, Inc. [AMD/ATI] RV710 [Radeon HD 4350/4550]')]
+            #deviceArray = [PciDevice('0000:04:00.0', manufacturerId, '68e0', VGA_CLASS, name='Advanced Micro Devices [AMD/ATI] RS880 [Radeon HD 4290]')]
+            deviceArray = [PciDevice('0000:04:00.0', manufacturerId, '6939', VGA_CLASS, name='Advanced Micro Devices, Inc. [AMD/ATI] Tonga PRO [Radeon R9 285]')]
+            #deviceArray = [PciDevice('0000:04:00.0', manufacturerId, '9616', VGA_CLASS, name='Advanced Micro Devices, Inc. [AMD/ATI] RS780L [Radeon 3000]')]
+            #deviceArray = [PciDevice('0000:04:00.0', manufacturerId, '6649', VGA_CLASS, name='Advanced Micro Devices, Inc. [AMD/ATI] Bonaire [FirePro W5100]')]
+
+        if deviceArray:
+            self.log.write("Device(s): {}".format(deviceArray), 'get_ati')
+            # Check if fglrx is loaded
+            # If it is: checkbox is selected
+            loadedDrv = self.get_loaded_graphical_driver()
+            self.log.write("Loaded graphical driver: {}".format(loadedDrv), 'get_ati')
+
+            # Get the manufacturer's logo
+            logo = join(self.mediaDir, 'images/ati.png')
+            result.add_devices(deviceArray, logo)
+
+            # Fill the hardware array
+            cards = self.atiClassifier.classify_many([device.name for device in deviceArray])
+            for device, card in zip(deviceArray, cards):
+                self.log.write("ATI device found: {} ({}: {})".format(device.name, card.status, card.rule), 'get_ati')
+                # Don't show older ATI Radeon cards
+                if card.status != PROPRIETARY:
+                    result.add_not_supported(device.slot, device.name)
+                    continue
+
+                if card.is_fire():
+                    title = _("ATI FirePro/Gl card found")
+                    msg = _("Installing the proprietary driver for an ATI FirePro/Gl card may render your system unbootable.\n\n"
+                            "Proceed at your own risk.")
+                    self.log.write(msg, 'get_ati')
+                    result.warnings.append([title, msg])
+
+                self.log.write("ATI series: {}".format(card.card), 'get_ati')
+
+                # Check if the available driver is already loaded
+                selected = False
+                driver = card.module
+                if loadedDrv == driver:
+                    selected = True
+
+                # Fill result.hardware
+                #shortDevice = self.shorten_long_string(device.name, 100)
+                result.add_hardware(device.slot, [selected, logo, device.name, driver, device.vendorId, device.deviceId, device.slot])
+
+    def get_nvidia(self, result):
+        manufacturerId = '10de'
+        deviceArray = self.get_lspci_info(manufacturerId, [VGA_CLASS])
+
+        if self.test:
+            #deviceArray = [PciDevice('0000:01:00.0', manufacturerId, '0a74', VGA_CLASS, name='NVIDIA Corporation GT218 [GeForce G210M]')]
+            deviceArray = [PciDevice('0000:01:00.0', manufacturerId, '1401', VGA_CLASS, name='NVIDIA Corporation Device')]
+            if self.test_optimus:
+                deviceArray = self.get_lspci_info(manufacturerId, [VGA_CLASS])
+
+        if deviceArray:
+            optimus = False
+            devices = []
+
+            self.log.write("Device(s): {}".format(deviceArray), 'get_nvidia')
+
+            # Check if nvidia is loaded
+            # If it is: checkbox is selected
+            loadedDrv = self.get_loaded_graphical_driver()
+            self.log.write("Loaded graphical driver: {}".format(loadedDrv), 'get_nvidia')
+
+            # Get the manufacturer's logo
+            logo = join(self.mediaDir, 'images/nvidia.png')
+
+            # Fill the hardware array
+            for device in deviceArray:
+                if device.vendorId == '8086':
+                    optimus = True
+                elif device.vendorId == manufacturerId:
+                    devices.append(device)
+
+            result.add_devices(devices, logo)
+            for device in devices:
+                self.log.write("Nvidia device found: {}".format(device.name), 'get_nvidia')
+                optimusString = ""
+                if optimus:
+                    optimusString = "(Optimus) "
+
+                # Check if the available driver is already loaded
+                selected = False
+                if optimus:
+                    if loadedDrv == 'nvidia' or loadedDrv == 'intel':
+                        bbversion = getPackageVersion("bumblebee-nvidia")
+                        self.log.write("bumblebee-nvidia version: {}".format(bbversion), 'get_nvidia')
+                        if bbversion != '':
+                            selected = True
+                elif loadedDrv == 'nvidia':
+                    selected = True
+
+                driver = ""
+                if optimus:
+                    driver = "bumblebee-nvidia"
+                else:
+                    if self.test:
+                        driver = 'nvidia-driver'
+                    else:
+                        # nvidia-detect is updated by install_detector_packages
+                        driver = get_nvidia_detect_driver()
+
+                self.log.write("Nvidia driver to use: {}".format(driver), 'get_nvidia')
+
+                # Fill result.hardware
+                if driver == "":
+                    result.remove_device(device.slot)
+                else:
+                    #shortDevice = "{0}{1}".format(optimusString, self.shorten_long_string(device.name, 100))
+                    result.add_hardware(device.slot, [selected, logo, "{0}{1}".format(optimusString, device.name), driver, device.vendorId, device.deviceId, device.slot])
+
+    def get_broadcom(self, result):
+        ## Hardware list (device ids): /usr/share/ddm/devices.db
+        ## http://linuxwireless.org/en/users/Drivers/b43
+        manufacturerId = '14e4'
+
+        deviceArray = self.get_lspci_info(manufacturerId)
+
+        if self.test:
+            deviceArray = [PciDevice('0000:02:00.0', manufacturerId, '4365', '0280', name='Broadcom Corporation BCM43142 802.11a/b/g')]
+
+        if deviceArray:
+            self.log.write("Device(s): {}".format(deviceArray), 'get_broadcom')
+            # Check if broadcom is loaded
+            # If it is: checkbox is selected
+            loadedDrv = self.get_loaded_wireless_driver()
+            self.log.write("Loaded wireless driver: {}".format(loadedDrv), 'get_broadcom')
+
+            # Get the manufacturer's logo
+            logo = join(self.mediaDir, 'images/broadcom.png')
+            result.add_devices(deviceArray, logo)
+
+            # Fill the hardware array
+            for device in deviceArray:
+                self.log.write("Broadcom device found: {}".format(device.name), 'get_broadcom')
+                entry = self.deviceDb.lookup(device.vendorId, device.deviceId)
+
+                if entry is None:
+                    result.remove_device(device.slot)
+                else:
+                    driver = entry.family
+                    if not entry.is_supported():
+                        result.add_not_supported(device.slot, device.name)
+                        self.log.write("Broadcom device not supported: {}".format(device.name), 'get_broadcom')
+                    else:
+                        self.log.write("Broadcom driver to use: {}".format(driver), 'get_broadcom')
+                        # Check if the available driver is already loaded
+                        selected = False
+                        if loadedDrv == BROADCOM_MODULES.get(driver):
+                            selected = True
+
+                        # Fill result.hardware
+                        #shortDevice = self.shorten_long_string(device.name, 100)
+                        result.add_hardware(device.slot, [selected, logo, device.name, driver, device.vendorId, device.deviceId, device.slot])
+
+    def get_pae(self, result):
+        machine = self.inventory.machine
+        release = self.inventory.release
+
+        if self.test:
+            machine = 'i686'
+            release = '3.16.0-4-586'
+
+        self.log.write("PAE check: machine={} / release={}".format(machine, release), 'get_pae')
+
+        if machine == 'i686':
+            # Check if PAE is installed and running
+            selected = False
+            if 'pae' in release:
+                result.paeBooted = True
+                selected = True
+            else:
+                if getPackageVersion('linux-image-686-pae') != '':
+                    selected = True
+
+            # Get the logo
+            logo = join(self.mediaDir, 'images/pae.png')
+
+            # Fill result.hardware
+            paeDescription = _("PAE capable system")
+            result.add_hardware('pae', [selected, logo, paeDescription, '', 'pae', '', 'pae'])
+
+    def get_lspci_info(self, manufacturerId, classIds=None):
+        devices = []
+
+        # Check for Optimus
+        if manufacturerId == '10de':
+            devices = self.inventory.get_optimus_devices()
+
+            if self.test_optimus:
+                devices = [PciDevice('0000:00:02.0', '8086', '0a16', VGA_CLASS, bootVga=True,
+                                     name='Intel Corporation Haswell-ULT Integrated Graphics Controller'),
+                           PciDevice('0000:01:00.0', '10de', '0fe4', DISPLAY_3D_CLASS,
+                                     name='NVIDIA Corporation GK107M [GeForce GT 750M]')]
+
+        # Optimus will return 2 devices
+        # If there are less than 2 devices, do regular check
+        if len(devices) < 2:
+            devices = self.inventory.get_devices(vendorId=manufacturerId, classIds=classIds)
+
+        if devices:
+            self.log.write("PCI devices = {}".format(devices), 'get_lspci_info')
+
+        return devices
+
+    # Return graphics module used by X.org
+    # The kernel driver of the display device is checked first, the X.org logs last
+    def get_loaded_graphical_driver(self):
+        with self.graphicalLock:
+            if self.graphicalDriver is None:
+                module = XORG_DRIVERS.get(self.inventory.get_display_driver(), '')
+                if module == '':
+                    # Proprietary modules that are loaded but not (yet) bound
+                    for driver in ('nvidia', 'fglrx'):
+                        if self.inventory.is_module_loaded(driver):
+                            module = driver
+                            break
+                if module == '':
+                    module = get_xorg_log_driver()
+                self.log.write("Loaded graphical driver={}".format(module))
+                self.graphicalDriver = module
+        return self.graphicalDriver
+
+    # Return used wireless driver
+    # The kernel driver of the Broadcom device is checked first, the system logs last
+    def get_loaded_wireless_driver(self):
+        with self.wirelessLock:
+            if self.wirelessDriver is None:
+                driver = ''
+                modules = list(BROADCOM_MODULES.values())
+                for device in self.inventory.get_devices(vendorId='14e4'):
+                    if device.driver in modules:
+                        driver = device.driver
+                        break
+                if driver == '':
+                    # b43 and brcmsmac bind to a bridge driver (ssb, bcma)
+                    for module in modules:
+                        if self.inventory.is_module_loaded(module):
+                            driver = module
+                            break
+                if driver == '':
+                    driver = get_syslog_wireless_driver()
+                self.log.write("Loaded wireless driver={}".format(driver))
+                self.wirelessDriver = driver
+        return self.wirelessDriver
@@ -0,0 +1,201 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import argparse
+import threading
+from contextlib import contextmanager
+from os.path import join, abspath, dirname, exists, getsize
+
+# Spans of the GUI and the ddm backend, one JSON object per line in the trace file:
+#   {"run": "1700000000-4242", "src": "gui", "name": "get_nvidia", "start": 1700000000.123456, "dur": 0.250311, "attrs": {}}
+#   {"run": "1700000000-4242", "src": "ddm", "name": "apt-get update", "start": 1700000012.5, "dur": 8.2, "attrs": {"code": 0}}
+# The backend started by the GUI gets the run id of the GUI (DDM_TRACE_RUN).
+# ddm --stats summarises the spans of recent runs (format_span_stats).
+
+DDM_CONF = join(abspath(dirname(__file__)), '../../share/ddm/ddm.conf')
+TRACE_FILE = '/var/log/ddm.trace'
+
+# The trace file is moved to TRACE_FILE.old when it is larger
+MAX_TRACE_KB = 2048
+
+# Spans kept in memory before they are written
+FLUSH_SPANS = 100
+
+# Runs summarised by --stats
+RECENT_RUNS = 20
+
+RUN_VARIABLE = 'DDM_TRACE_RUN'
+
+
+def new_run_id():
+    return "{}-{}".format(int(time.time()), os.getpid())
+
+
+class Tracer(object):
+    """ Record named spans (start, duration and attributes) in the trace file.
+
+    Spans can be recorded from any thread. They are appended to the file
+    in batches (one write per FLUSH_SPANS spans and at exit), so a span
+    costs a dict and a list append. Without write access to the trace
+    file (not root), the spans are dropped.
+    """
+    def __init__(self, path=TRACE_FILE, source='gui'):
+        self.path = path
+        self.source = source
+        self.runId = None
+        self.spans = []
+        self.lock = threading.Lock()
+        atexit.register(self.flush)
+
+    # The run id is set on first use: the child processes (ddm backend) inherit it
+    def get_run(self):
+        with self.lock:
+            if self.runId is None:
+                self.runId = os.environ.get(RUN_VARIABLE) or new_run_id()
+                os.environ[RUN_VARIABLE] = self.runId
+        return self.runId
+
+    # Set the trace file (empty: do not trace) and rotate it when it is too large
+    def configure(self, path, maxSizeKB=MAX_TRACE_KB):
+        self.path = path
+        if path:
+            # Before the backend is started
+            self.get_run()
+            if exists(path) and getsize(path) > maxSizeKB * 1024:
+                try:
+                    os.replace(path, path + '.old')
+                except OSError:
+                    pass
+
+    def add(self, name, start, end, **attrs):
+        if not self.path:
+            return
+        span = {'run': self.get_run(), 'src': self.source, 'name': name,
+                'start': round(start, 6), 'dur': round(end - start, 6), 'attrs': attrs}
+        with self.lock:
+            self.spans.append(span)
+            if len(self.spans) < FLUSH_SPANS:
+                return
+        self.flush()
+
+    # The attributes dict can be extended in the with block
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.time()
+        try:
+            yield attrs
+        finally:
+            self.add(name, start, time.time(), **attrs)
+
+    def flush(self):
+        with self.lock:
+            spans = self.spans
+            self.spans = []
+        if not spans or not self.path:
+            return
+        data = ''.join(json.dumps(span, separators=(',', ':')) + '\n' for span in spans)
+        try:
+            # One appending write: the lines of the backend are not split
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data.encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError:
+            self.path = ''
+
+
+# Read the spans of the trace files (oldest first), skipping damaged lines
+def read_spans(path):
+    for filePath in (path + '.old', path):
+        try:
+            with open(filePath, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    try:
+                        span = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(span, dict) and 'name' in span and 'dur' in span:
+                        yield span
+        except (IOError, OSError):
+            continue
+
+
+# Nearest rank percentile of sorted values
+def percentile(values, p):
+    if not values:
+        return 0
+    rank = max(0, min(len(values), math.ceil(p / 100 * len(values))) - 1)
+    return values[rank]
+
+
+# Durations by span name of the last runs: count, p50, p95, max and total
+def get_span_stats(spans, runs=RECENT_RUNS):
+    durations = {}
+    runIds = []
+    for span in spans:
+        run = span.get('run')
+        if run not in durations:
+            durations[run] = {}
+            runIds.append(run)
+        durations[run].setdefault(span['name'], []).append(float(span['dur']))
+
+    byName = {}
+    for run in runIds[-runs:] if runs else runIds:
+        for name, values in durations[run].items():
+            byName.setdefault(name, []).extend(values)
+
+    stats = {}
+    for name, values in byName.items():
+        values.sort()
+        stats[name] = {'count': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                       'max': values[-1], 'total': sum(values)}
+    return stats, min(len(runIds), runs or len(runIds))
+
+
+# One line per span name, the span with the largest total first
+def format_span_stats(stats, runCount):
+    lines = ["Spans of the last {} runs".format(runCount),
+             "{:<40} {:>6} {:>9} {:>9} {:>9} {:>10}".format('span', 'count', 'p50', 'p95', 'max', 'total')]
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]['total']):
+        lines.append("{:<40} {:>6} {:>8.3f}s {:>8.3f}s {:>8.3f}s {:>9.3f}s".format(
+                     name[:40], s['count'], s['p50'], s['p95'], s['max'], s['total']))
+    return lines
+
+
+def get_config():
+    from utils import get_config_dict
+    try:
+        return get_config_dict(DDM_CONF)
+    except (IOError, OSError):
+        return {}
+
+
+# Shared tracer of the GUI
+TRACER = Tracer()
+
+
+# Used by ddm --stats
+if __name__ == '__main__':
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Summarise the DDM trace spans of recent runs")
+    parser.add_argument('--stats', action='store_true', help='Print p50/p95 per span (default)')
+    parser.add_argument('--runs', type=int, default=RECENT_RUNS, help='Number of recent runs (0: all)')
+    parser.add_argument('--file', default=config.get('TRACE') or TRACE_FILE)
+    parser.add_argument('--json', action='store_true', help='Print the statistics as JSON')
+    args = parser.parse_args()
+
+    stats, runCount = get_span_stats(read_spans(args.file), args.runs)
+    if not stats:
+        print("No spans in {}".format(args.file))
+        sys.exit(0)
+    if args.json:
+        print(json.dumps({'runs': runCount, 'spans': stats}, indent=1, sort_keys=True))
+    else:
+        print('\n'.join(format_span_stats(stats, runCount)))
+    sys.exit(0)
@@ -4,8 +4,8 @@
 import gi
 gi.require_version('Gtk', '3.0')
 
-import os
 from gi.repository import Gtk, GObject, GdkPixbuf
+from assets import ASSETS
 
 # Treeview needs subclassing of gobject
 # http://www.pygtk.org/articles/subclassing-gobject/sub-classing-gobject-in-python.htm
@@ -36,6 +36,7 @@ class TreeViewHandler(GObject.GObject):
 
     # General function to fill a treeview
     # Set setCursorWeight to 400 if you don't want bold font
+    # Columns without a name in the first item (firstItemIsColName) are stored, not shown
     def fillTreeview(self, contentList, columnTypesList, setCursor=0, setCursorWeight=400, firstItemIsColName=False, appendToExisting=False, appendToTop=False, fontSize=10000, fixedImgHeight=None):
         # Check if this is a multi-dimensional array
         multiCols = self.isListOfLists(contentList)
@@ -47,178 +48,62 @@ class TreeViewHandler(GObject.GObject):
 
         liststore = self.treeview.get_model()
         if liststore is None or not appendToExisting:
-            # Dirty but need to dynamically create a list store
             for col in self.treeview.get_columns():
                 self.treeview.remove_column(col)
-            dynListStore = 'Gtk.ListStore('
-            for i in range(len(columnTypesList)):
-                dynListStore += str(columnTypesList[i]) + ', '
-            dynListStore += 'int, int)'
-            msg = "Create list store eval string: %(eval)s" % { "eval": dynListStore }
-            print(msg)
-            if self.log:
-                self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-            liststore = eval(dynListStore)
+            # Column types, weight and font size
+            liststore = Gtk.ListStore(*([get_column_type(t) for t in columnTypesList] + [int, int]))
 
         # Create list with column names
         if not appendToExisting:
+            if firstItemIsColName and len(contentList) > 0:
+                colNameList = list(contentList[0]) if multiCols else [contentList[0]]
+            else:
+                colNameList = ['Column ' + str(i) for i in range(len(columnTypesList))]
             if multiCols:
-                #for i in range(len(contentList[0])):
-                for i in range(len(columnTypesList)):
-                    if firstItemIsColName and len(contentList) > 0:
-                        msg = "First item is column name (multi-column list): %(iscolname)s" % { "iscolname": contentList[0][i] }
-                        print(msg)
-                        if self.log:
-                            self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                        colNameList.append(contentList[0][i])
-                    else:
-                        colNameList.append('Column ' + str(i))
+                colNameList = colNameList[:len(columnTypesList)]
+
+        # Detach the model while adding rows: the view does not handle a signal per row
+        self.treeview.set_model(None)
+        rows = contentList[1:] if firstItemIsColName else contentList
+        columns = list(range(len(columnTypesList) + 2))
+        position = 0 if appendToTop else -1
+        weightRow = setCursor
+        for i, row in enumerate(rows):
+            weight = setCursorWeight if i == weightRow else 400
+            if multiCols:
+                values = [get_column_value(t, v, fixedImgHeight) for t, v in zip(columnTypesList, row)]
             else:
-                if firstItemIsColName and len(contentList) > 0:
-                    msg = "First item is column name (single-column list): %(iscolname)s" % { "iscolname": contentList[0] }
-                    print(msg)
-                    if self.log:
-                        self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                    colNameList.append(contentList[0])
-                else:
-                    colNameList.append('Column 0')
-
-            msg = "Create column names: %(cols)s" % { "cols": str(colNameList) }
-            print(msg)
-            if self.log:
-                self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-
-        # Add data to the list store
-        for i in range(len(contentList)):
-            # Skip first row if that is a column name
-            skip = False
-            if firstItemIsColName and i == 0:
-                msg = "First item is column name: skip first item"
-                print(msg)
-                if self.log:
-                    self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                skip = True
-
-            if not skip:
-                weight = 400
-                weightRow = setCursor
-                if firstItemIsColName:
-                    weightRow += 1
-                if i == weightRow:
-                    weight = setCursorWeight
-                if multiCols:
-                    # Dynamically add data for multi-column list store
-                    if appendToTop:
-                        dynListStoreAppend = 'liststore.insert(0, ['
-                    else:
-                        dynListStoreAppend = 'liststore.append(['
-                    for j in range(len(contentList[i])):
-                        val = str(contentList[i][j]).strip()
-                        if str(columnTypesList[j]) == 'str':
-                            # Make sure it's a single line
-                            val = '"' + val.replace('\n', ' ').replace('\r', '').replace('"', '\\"') + '"'
-                        if str(columnTypesList[j]) == 'GdkPixbuf.Pixbuf':
-                            if os.path.isfile(val):
-                                if fixedImgHeight:
-                                    pb = GdkPixbuf.Pixbuf.new_from_file(val)
-                                    nw = pb.get_width() * (fixedImgHeight / pb.get_height())
-                                    val = 'GdkPixbuf.Pixbuf.new_from_file("%(val)s").scale_simple(%(width)s, %(height)s, GdkPixbuf.InterpType.BILINEAR)' % { "val": val, "width": nw, "height": fixedImgHeight }
-                                else:
-                                    val = 'GdkPixbuf.Pixbuf.new_from_file("%(val)s")' % { "val": val }
-                            else:
-                                val = None
-                        dynListStoreAppend += '%s, ' % val
-                    dynListStoreAppend += '%s, %s])' % (str(weight), fontSize)
-
-                    msg = "Add data to list store: %(data)s" % { "data": dynListStoreAppend }
-                    #print(msg)
-                    if self.log:
-                        self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                    eval(dynListStoreAppend)
-                else:
-                    if appendToTop:
-                        msg = "Add data to top of list store: %(totop)s" % { "totop": str(contentList[i]) }
-                        #print(msg)
-                        if self.log:
-                            self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                        liststore.insert(0, [contentList[i], weight, fontSize])
-                    else:
-                        msg = "Add data to bottom of list store: %(tobottom)s" % { "tobottom": str(contentList[i]) }
-                        #print(msg)
-                        if self.log:
-                            self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                        liststore.append([contentList[i], weight, fontSize])
+                values = [row]
+            liststore.insert_with_valuesv(position, columns, values + [weight, fontSize])
 
         # Create columns
         if not appendToExisting:
-            for i in range(len(colNameList)):
+            existing = [col.get_title() for col in self.treeview.get_columns()]
+            for i, colName in enumerate(colNameList):
                 # Create a column only if it does not exist
-                colFound = ''
-                cols = self.treeview.get_columns()
-                for col in cols:
-                    if col.get_title() == colNameList[i]:
-                        colFound = col.get_title()
-                        break
-
-                if colFound == '':
-                    # Build renderer and attributes to define the column
-                    # Possible attributes for text: text, foreground, background, weight
-                    attr = ', text=' + str(i) + ', weight=' + str(len(colNameList)) + ', size=' + str(len(colNameList) + 1)
-                    renderer = 'Gtk.CellRendererText()'  # an object that renders text into a Gtk.TreeView cell
-                    if str(columnTypesList[i]) == 'bool':
-                        renderer = 'Gtk.CellRendererToggle()'  # an object that renders a toggle button into a TreeView cell
-                        attr = ', active=' + str(i)
-                    if str(columnTypesList[i]) == 'GdkPixbuf.Pixbuf':
-                        renderer = 'Gtk.CellRendererPixbuf()'  # an object that renders a pixbuf into a Gtk.TreeView cell
-                        attr = ', pixbuf=' + str(i)
-                    dynCol = 'Gtk.TreeViewColumn("' + str(colNameList[i]) + '", ' + renderer + attr + ')'
-
-                    msg = "Create column: %(col)s" % { "col": dynCol }
-                    print(msg)
-                    if self.log:
-                        self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                    col = eval(dynCol)
-
-                    # Get the renderer of the column and add type specific properties
-                    rend = col.get_cells()[0]
-                    #if str(columnTypesList[i]) == 'str':
-                        # TODO: Right align text in column - add parameter to function
-                        #rend.set_property('xalign', 1.0)
-                    if str(columnTypesList[i]) == 'bool':
-                        # If checkbox column, add toggle function
-                        msg = "Check box found: add toggle function"
-                        #print(msg)
-                        if self.log:
-                            self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                        rend.connect('toggled', self.tvchk_on_toggle, liststore, i)
-
-                    # Let the last colum fill the treeview
-                    if i == len(colNameList):
-                        msg = "Last column fills treeview: %(colnr)d" % { "colnr": i }
-                        #print(msg)
-                        if self.log:
-                            self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
-                        col.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
-
-                    # Finally add the column
-                    self.treeview.append_column(col)
-                    msg = "Column added: %(col)s" % { "col": col.get_title() }
-                    print(msg)
-                    if self.log:
-                        self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
+                if colName in existing:
+                    continue
+                colType = str(columnTypesList[i])
+                if colType == 'bool':
+                    # Check box column with toggle function
+                    renderer = Gtk.CellRendererToggle()
+                    renderer.connect('toggled', self.tvchk_on_toggle, i)
+                    col = Gtk.TreeViewColumn(str(colName), renderer, active=i)
+                elif colType == 'GdkPixbuf.Pixbuf':
+                    col = Gtk.TreeViewColumn(str(colName), Gtk.CellRendererPixbuf(), pixbuf=i)
                 else:
-                    msg = "Column already exists: %(col)s" % { "col": colFound }
-                    print(msg)
-                    if self.log:
-                        self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
+                    # Possible attributes for text: text, foreground, background, weight
+                    col = Gtk.TreeViewColumn(str(colName), Gtk.CellRendererText(), text=i,
+                                             weight=len(columnTypesList), size=len(columnTypesList) + 1)
+                self.treeview.append_column(col)
 
         # Add liststore, set cursor and set the headers
         self.treeview.set_model(liststore)
-        if setCursor >= 0:
+        if setCursor >= 0 and len(liststore) > setCursor:
             self.treeview.set_cursor(setCursor)
         self.treeview.set_headers_visible(firstItemIsColName)
         if self.log:
-            self.log.write("Add Liststore to Treeview", 'self.treeview.fillTreeview', 'debug')
+            self.log.write("Filled treeview: {} rows, columns: {}".format(len(rows), columnTypesList), 'self.treeview.fillTreeview', 'debug')
 
         # Scroll to selected cursor
         selection = self.treeview.get_selection()
@@ -226,13 +111,10 @@ class TreeViewHandler(GObject.GObject):
         if treeIter:
             path = tm.get_path(treeIter)
             self.treeview.scroll_to_cell(path)
-            msg = "Scrolled to selected row: %(row)d" % { "row": setCursor }
-            #print(msg)
-            if self.log:
-                self.log.write(msg, 'self.treeview.fillTreeview', 'debug')
 
-    def tvchk_on_toggle(self, cell, path, liststore, colNr, *ignore):
+    def tvchk_on_toggle(self, cell, path, colNr, *ignore):
         if path is not None:
+            liststore = self.treeview.get_model()
             itr = liststore.get_iter(path)
             toggled = liststore[itr][colNr]
             liststore[itr][colNr] = not toggled
@@ -371,6 +253,34 @@ class TreeViewHandler(GObject.GObject):
 GObject.type_register(TreeViewHandler)
 
 
+# Column types of fillTreeview: name or type
+COLUMN_TYPES = {'str': str, 'bool': bool, 'int': int, 'float': float, 'GdkPixbuf.Pixbuf': GdkPixbuf.Pixbuf}
+
+
+def get_column_type(columnType):
+    return COLUMN_TYPES.get(columnType, columnType)
+
+
+# Convert a value of contentList to the type of its column
+# Pixbuf columns take a pixbuf or an image path (decoded once, see assets.py)
+def get_column_value(columnType, value, fixedImgHeight=None):
+    columnType = str(columnType)
+    if columnType == 'str':
+        # Make sure it's a single line
+        return str(value).strip().replace('\n', ' ').replace('\r', '')
+    if columnType == 'bool':
+        if isinstance(value, str):
+            return value.strip() == 'True'
+        return bool(value)
+    if columnType == 'GdkPixbuf.Pixbuf':
+        if value is None or isinstance(value, GdkPixbuf.Pixbuf):
+            return value
+        return ASSETS.get_pixbuf(str(value).strip(), fixedImgHeight)
+    if columnType in ('int', 'float'):
+        return COLUMN_TYPES[columnType](value)
+    return value
+
+
 # TODO - implement clickable image in TreeViewHandler
 # http://www.daa.com.au/pipermail/pygtk/2010-March/018355.html
 #class CellRendererPixbufXt(Gtk.CellRendererPixbuf):
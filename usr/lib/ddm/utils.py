@@ -1,62 +1,150 @@
 #! /usr/bin/env python3
 
-import subprocess
-import urllib.request
-import urllib.error
+import os
+import shlex
 import re
+import logging
 import threading
+import time
+import functools
+from collections import OrderedDict
+from glob import glob, has_magic
+from logreader import find_last_match, get_rotated_logs
+from command import run, run_many, DEFAULT_TIMEOUT
+from dpkgstatus import DPKG_STATUS
+from aptlists import APT_LISTS_INDEX, get_backports_suites
 
+# Commands are argv lists or strings that are split like a shell would,
+# but they never run in a shell: no pipes, redirections or globs
 
-def shell_exec_popen(command, kwargs={}):
-    print(('Executing:', command))
-    return subprocess.Popen(command, shell=True,
-                            stdout=subprocess.PIPE, **kwargs)
+
+def get_argv(command):
+    if isinstance(command, str):
+        return shlex.split(command)
+    return list(command)
 
 
-def shell_exec(command):
+# Run a command with its output on stdout and return the exit code
+def shell_exec(command, timeout=None):
     print(('Executing:', command))
-    return subprocess.call(command, shell=True)
+    return run(get_argv(command), timeout, capture=False).returncode
 
 
-def getoutput(command):
-    #return shell_exec(command).stdout.read().strip()
-    try:
-        output = subprocess.check_output(command, shell=True).decode('utf-8').strip().split('\n')
-    except:
-        output = []
-    return output
+# Return the output lines of a command, also when it fails: the exit code is logged
+# Without output (not found, timed out) the list is empty
+def getoutput(command, timeout=DEFAULT_TIMEOUT, env=None):
+    result = run(get_argv(command), timeout, env)
+    if not result.ok:
+        logging.getLogger('utils.getoutput').warning("{}: exit code {}{}".format(
+            ' '.join(result.argv), result.returncode, ' (timed out)' if result.timedOut else ''))
+        if not result.stdout.strip():
+            return []
+    return result.stdout.strip().split('\n')
 
 
 def chroot_exec(command):
-    command = command.replace('"', "'").strip()  # FIXME
-    return shell_exec('chroot /target/ /bin/sh -c "%s"' % command)
+    return shell_exec(['chroot', '/target/', '/bin/sh', '-c', command.strip()])
 
 
-def memoize(func):
-    """ Caches expensive function calls.
+class FileCache(object):
+    """ Bounded LRU cache with optional time-to-live.
+
+    Entries are invalidated as soon as one of the source files changes
+    (mtime, inode or size). Files can be glob patterns: a file that is added
+    or removed also invalidates the entries.
+    """
+    def __init__(self, name, maxSize=128, ttl=None, files=()):
+        self.name = name
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.files = files
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_files_state(self):
+        state = []
+        for pattern in self.files:
+            paths = sorted(glob(pattern)) if has_magic(pattern) else [pattern]
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                    state.append((path, st.st_mtime_ns, st.st_ino, st.st_size))
+                except OSError:
+                    state.append((path, None, None, None))
+        return tuple(state)
+
+    def get(self, key, func, *args, **kwargs):
+        filesState = self.get_files_state()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, created, state = entry
+                if state == filesState and (self.ttl is None or time.time() - created < self.ttl):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+        value = func(*args, **kwargs)
+        with self.lock:
+            self.entries[key] = (value, time.time(), filesState)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.entries)}
+
+
+# All caches by name
+CACHES = {}
+
+
+def cached(maxSize=128, ttl=None, files=()):
+    """ Caches function calls in a FileCache.
+
+    Use as a decorator:
+
+        @cached(files=['/etc/debian_version'])
+        def get_debian_version():
+            [...]
 
-    Use as:
+    The cache is available as the cache attribute of the decorated function.
+    """
+    def decorator(func):
+        cache = CACHES[func.__name__] = FileCache(func.__name__, maxSize, ttl, files)
 
-        c = Cache(lambda arg: function_to_call_if_yet_uncached(arg))
-        c('some_arg')  # returns evaluated result
-        c('some_arg')  # returns *same* (non-evaluated) result
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = args + tuple(sorted(kwargs.items()))
+            return cache.get(key, func, *args, **kwargs)
+        wrapper.cache = cache
+        return wrapper
+    return decorator
 
-    or as a decorator:
 
-        @memoize
-        def some_expensive_function(args [, ...]):
-            [...]
+# Return hit/miss statistics of all caches
+def get_cache_stats():
+    return dict((name, cache.get_stats()) for name, cache in CACHES.items())
 
-    See also: http://en.wikipedia.org/wiki/Memoization
-    """
-    class memodict(dict):
-        def __call__(self, *args):
-            return self[args]
 
-        def __missing__(self, key):
-            ret = self[key] = func(*key)
-            return ret
-    return memodict()
+# One line per cache, e.g.: get_debian_version: 12 hits, 1 misses, 0 evictions, 1 entries
+def format_cache_stats():
+    lines = []
+    for name, stats in sorted(get_cache_stats().items()):
+        if stats['hits'] or stats['misses']:
+            lines.append("{}: {} hits, {} misses, {} evictions, {} entries".format(
+                         name, stats['hits'], stats['misses'], stats['evictions'], stats['size']))
+    return lines
 
 
 def get_config_dict(file, key_value=re.compile(r'^\s*(\w+)\s*=\s*["\']?(.*?)["\']?\s*(#.*)?$')):
@@ -75,6 +163,9 @@ def get_config_dict(file, key_value=re.compile(r'^\s*(\w+)\s*=\s*["\']?(.*?)["\'
 
 # Check for internet connection
 def hasInternetConnection(testUrl='http://google.com'):
+    # Not needed to start DDM: imported on first use
+    import urllib.request
+    import urllib.error
     try:
         urllib.request.urlopen(testUrl, timeout=1)
         return True
@@ -85,47 +176,36 @@ def hasInternetConnection(testUrl='http://google.com'):
 
 # Check if running in VB
 def runningInVirtualBox():
-    dmiBIOSVersion = getoutput("dmidecode -t0 | grep 'Version:' | awk -F ': ' '{print $2}'")
-    dmiSystemProduct = getoutput("dmidecode -t1 | grep 'Product Name:' | awk -F ': ' '{print $2}'")
-    dmiBoardProduct = getoutput("dmidecode -t2 | grep 'Product Name:' | awk -F ': ' '{print $2}'")
-    if dmiBIOSVersion != "VirtualBox" and dmiSystemProduct != "VirtualBox" and dmiBoardProduct != "VirtualBox":
-        return False
-    return True
+    keywords = ['bios-version', 'system-product-name', 'baseboard-product-name']
+    results = run_many([['dmidecode', '-s', keyword] for keyword in keywords])
+    for result in results:
+        if 'VirtualBox' in result.lines():
+            return True
+    return False
 
 
 # Check if is 64-bit system
 def isAmd64():
-    machine = getoutput("uname -m")[0]
-    if machine == "x86_64":
-        return True
-    return False
+    return os.uname()[4] == "x86_64"
+
 
+# Sources of the cached APT and dpkg information
+SOURCES_FILES = ['/etc/apt/sources.list', '/etc/apt/sources.list.d/*.list', '/etc/apt/sources.list.d/*.sources']
+APT_FILES = SOURCES_FILES + ['/var/lib/apt/lists', '/var/lib/dpkg/status']
 
-# Check for backports
+
+# Check for backports: return the first Debian backports suite of the sources
+@cached(files=SOURCES_FILES)
 def get_backports():
-    try:
-        bp = getoutput("grep backports /etc/apt/sources.list | grep debian | grep -v ^#")[0]
-    except:
-        bp = ''
-    if bp.strip() == "":
-        try:
-            bp = getoutput("grep backports /etc/apt/sources.list.d/*.list | grep debian | grep -v ^#")[0]
-        except:
-            bp = ''
-    bp = bp.strip()
-    return bp
+    suites = get_backports_suites()
+    return suites[0] if suites else ''
 
 
+@cached(files=APT_FILES)
 def has_newer_in_backports(package_name):
     bp = get_backports()
     if bp != '':
-        try:
-            out = getoutput("apt-cache madison %s | grep %s" % (package_name, bp))[0]
-            print((">> has_newer_in_backports =  %s" % out))
-            if out != '':
-                return True
-        except:
-            return False
+        return APT_LISTS_INDEX.has_newer(package_name, bp)
     return False
 
 
@@ -144,10 +224,17 @@ def str_to_nr(stringnr, toInt=False):
 
 
 # Get Debian's version number (float)
+@cached(files=['/etc/debian_version'])
 def get_debian_version():
-    return str_to_nr(getoutput("head -n 1 /etc/debian_version | sed 's/[a-zA-Z]/0/' 2>/dev/null || echo 0")[0])
+    try:
+        with open('/etc/debian_version') as f:
+            version = f.readline()
+    except (IOError, OSError):
+        return 0
+    return str_to_nr(re.sub('[a-zA-Z]', '0', version, count=1))
 
 
+@cached(files=['/etc/debian_version'])
 def get_apt_options():
     apt_options_8 = '--force-yes --assume-yes --quiet -o Dpkg::Options::=--force-confmiss -o Dpkg::Options::=--force-confnew '
     apt_options_9 = '--assume-yes --quiet --allow-downgrades --allow-remove-essential --allow-change-held-packages -o Dpkg::Options::=--force-confmiss -o Dpkg::Options::=--force-confnew'
@@ -157,37 +244,59 @@ def get_apt_options():
     return apt_options_9
 
 
+@cached(files=APT_FILES)
 def getPackageVersion(package, candidate=False):
-    cmd = "env LANG=C bash -c 'apt-cache policy %s | grep \"Installed:\"'" % package
+    # Installed versions come from the dpkg database, candidates from the package lists
     if candidate:
-        cmd = "env LANG=C bash -c 'apt-cache policy %s | grep \"Candidate:\"'" % package
-    lst = getoutput(cmd)[0].strip().split(' ')
-    version = lst[-1]
-    if 'none' in version:
-        version = ''
-    return version
-
-
-# Class to run commands in a thread and return the output in a queue
-class ExecuteThreadedCommands(threading.Thread):
-
-    def __init__(self, commandList, theQueue=None, returnOutput=False):
-        super(ExecuteThreadedCommands, self).__init__()
-        self.commands = commandList
-        self.queue = theQueue
-        self.returnOutput = returnOutput
-
-    def run(self):
-        if isinstance(self.commands, (list, tuple)):
-            for cmd in self.commands:
-                self.exec_cmd(cmd)
-        else:
-            self.exec_cmd(self.commands)
-
-    def exec_cmd(self, cmd):
-        if self.returnOutput:
-            ret = getoutput(cmd)
-        else:
-            ret = shell_exec(cmd)
-        if self.queue is not None:
-            self.queue.put(ret)
+        return APT_LISTS_INDEX.get_candidate(package)
+    return DPKG_STATUS.get_version(package)
+
+
+# Return the driver package nvidia-detect recommends
+def get_nvidia_detect_driver():
+    for line in getoutput(['nvidia-detect']):
+        if 'nvidia-' in line:
+            return line.replace(' ', '')
+    return ''
+
+
+# Return graphics module from the X.org logs
+@cached(files=['/var/log/Xorg.*.log*'])
+def get_xorg_log_driver():
+    # sort on the most recent X.org log
+    module = ''
+    log = ''
+    logs = glob('/var/log/Xorg.*.log*')
+    logs.sort()
+
+    for logPath in logs:
+        # Search for "depth" in each line and check the used module
+        # Sometimes these logs are saved as binary: open as read-only binary
+        # When opening as ascii, read() will throw error: "UnicodeDecodeError: 'utf-8' codec can't decode byte 0x80"
+        with open(logPath, 'rb') as f:
+            # replace utf-8 binary read errors (with ?)
+            log = f.read().decode(encoding='utf-8', errors='replace')
+
+        matchObj = re.search('([a-zA-Z]*)\(\d+\):\s+depth.*framebuffer', log, flags=re.IGNORECASE)
+        if matchObj:
+            module = matchObj.group(1).lower()
+            break
+
+    return module
+
+
+# Network Manager: "(wlan0): driver: 'wl'" and Wicd: "ieee... implement"
+NM_DRIVER_PATTERN = re.compile(r'\(wlan\d\):.*driver:\s*\'([a-zA-Z0-9\-]*)', flags=re.IGNORECASE)
+WICD_DRIVER_PATTERN = re.compile('ieee.*implement', flags=re.IGNORECASE)
+
+
+# Return used wireless driver from the system logs (newest first)
+@cached(files=['/var/log/syslog*'])
+def get_syslog_wireless_driver():
+    matchObj = find_last_match(get_rotated_logs('/var/log/syslog'),
+                               [NM_DRIVER_PATTERN, WICD_DRIVER_PATTERN])
+    if matchObj is None:
+        return ''
+    if matchObj.re is NM_DRIVER_PATTERN:
+        return matchObj.group(1)
+    return matchObj.group(0)